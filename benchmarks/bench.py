@@ -0,0 +1,188 @@
+"""
+Offline performance benchmarks, run against the local OpenWeatherMap stub server in
+tests/stub_server.py, which serves the recorded responses in tests/fixtures.
+
+Measured:
+    lookup_cold_ms: median time of WeatherAPI.get_weather for a location not in the cache.
+    lookup_warm_ms: median time of WeatherAPI.get_weather for a cached location.
+    bulk_locations_per_s: locations fetched per second by WeatherAPI.get_weather_many.
+    forecast_decode_us: time to decode the recorded forecast JSON.
+    forecast_parse_us: time of parse_forecast on the decoded forecast.
+    bulk_peak_memory_kib: peak memory allocated while fetching the bulk locations.
+
+Every run is saved as JSON under benchmarks/results, and can be compared against an
+earlier one to catch regressions.
+
+Usage:
+    python benchmarks/bench.py
+    python benchmarks/bench.py --latency 0.05 --locations 2000 --concurrency 32
+    python benchmarks/bench.py --baseline benchmarks/results/baseline.json
+"""
+import os
+import sys
+import json
+import time
+import timeit
+import argparse
+import platform
+import tempfile
+import statistics
+import tracemalloc
+from datetime import datetime, timezone
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+
+import weather.data
+from weather.api import WeatherAPI, parse_forecast
+from weather.cache import ResponseCache
+from weather.data import GeocodeCache
+from weather.icons import IconStore
+from weather.ratelimit import TokenBucket, RetryPolicy, CircuitBreaker, UsageCounter
+from weather.spatial import SpatialIndex
+from weather.providers import ProviderChain, OpenWeatherMapProvider
+from tests.stub_server import StubServer, load_fixtures
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+
+# Whether a larger value of each metric is better; the others are better smaller
+HIGHER_IS_BETTER = {"bulk_locations_per_s"}
+
+def isolate(directory):
+    """
+    Gives WeatherAPI fresh shared state, kept in a temporary directory, so runs do not
+    touch the user's caches or usage count, and are not slowed by the real rate limit.
+    """
+    WeatherAPI.icons = IconStore(directory=directory)
+    WeatherAPI.cache = ResponseCache()
+    WeatherAPI.nearby = SpatialIndex()
+    WeatherAPI.providers = ProviderChain([OpenWeatherMapProvider()])
+    WeatherAPI.rate_limiter = TokenBucket(rate=1e9, capacity=1e9)
+    WeatherAPI.retry_policy = RetryPolicy(base_delay=0.01)
+    WeatherAPI.circuit_breaker = CircuitBreaker(failure_threshold=1_000_000)
+    WeatherAPI.usage = UsageCounter(path=os.path.join(directory, "usage.json"))
+    weather.data.geocode_cache = GeocodeCache(path=os.path.join(directory, "geocode_cache.json"))
+
+def coordinates(count, offset=0):
+    """Returns count distinct coordinates, none of which share a cache key."""
+    return [((offset + index) % 1800 / 10 - 90, (offset + index) // 1800 / 10) for index in range(count)]
+
+def median_ms(fn, arguments):
+    """Calls fn once per argument tuple and returns the median time of a call, in milliseconds."""
+    timings = []
+    for args in arguments:
+        start = time.perf_counter()
+        fn(*args)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1000
+
+def bulk(api, locations, concurrency):
+    """Fetches every location and returns how many failed."""
+    return sum(
+        result.error is not None
+        for result in api.get_weather_many(locations, max_concurrency=concurrency, dedupe=False)
+    )
+
+def run(args):
+    """
+    Runs every benchmark against a stub server.
+
+    Returns:
+        dict: The metrics.
+    """
+    fixtures = load_fixtures()
+    forecast_data = json.loads(fixtures["forecast"])
+    metrics = {}
+
+    number = 2000
+    metrics["forecast_decode_us"] = min(timeit.repeat(
+        lambda: json.loads(fixtures["forecast"]), number=number, repeat=5)) / number * 1e6
+    metrics["forecast_parse_us"] = min(timeit.repeat(
+        lambda: parse_forecast(forecast_data), number=number, repeat=5)) / number * 1e6
+
+    stub = StubServer(latency=args.latency, error_rate=args.error_rate, rate_limit_rate=args.rate_limit_rate,
+                      retry_after=0, fixtures=fixtures, seed=0)
+    with stub, tempfile.TemporaryDirectory() as directory:
+        isolate(directory)
+        api = WeatherAPI(base_url=stub.url, icon_base_url=f"{stub.url}/img/wn", pool_size=args.concurrency)
+
+        metrics["lookup_cold_ms"] = median_ms(api.get_weather, coordinates(args.lookups))
+        metrics["lookup_warm_ms"] = median_ms(api.get_weather, [(0.5, 0.5)] * (args.lookups + 1))
+
+        locations = coordinates(args.locations, offset=args.lookups)
+        start = time.perf_counter()
+        failures = bulk(api, locations, args.concurrency)
+        metrics["bulk_locations_per_s"] = args.locations / (time.perf_counter() - start)
+        metrics["bulk_failures"] = failures
+
+        WeatherAPI.cache.clear()
+        tracemalloc.start()
+        bulk(api, locations, args.concurrency)
+        metrics["bulk_peak_memory_kib"] = tracemalloc.get_traced_memory()[1] / 1024
+        tracemalloc.stop()
+
+        metrics["upstream_requests"] = sum(stub.requests.values())
+        WeatherAPI.usage.flush()
+    return metrics
+
+def compare(metrics, baseline, tolerance):
+    """
+    Compares metrics against a baseline.
+
+    Returns:
+        list of str: The metrics that regressed by more than the tolerance.
+    """
+    regressions = []
+    for name, value in metrics.items():
+        previous = baseline.get(name)
+        if name in ("bulk_failures", "upstream_requests") or not previous:
+            continue
+        change = (value - previous) / previous
+        worse = -change if name in HIGHER_IS_BETTER else change
+        if worse > tolerance:
+            regressions.append(name)
+        print(f"{name:>22}: {previous:10.2f} -> {value:10.2f} ({change:+.1%}){'  REGRESSION' if worse > tolerance else ''}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark WeatherAPI against a local stub server.")
+    parser.add_argument("--latency", type=float, default=0.02, help="stub server latency in seconds")
+    parser.add_argument("--error-rate", type=float, default=0, help="share of requests answered with a 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0, help="share of requests answered with a 429")
+    parser.add_argument("--lookups", type=int, default=50, help="single lookups timed, cold and warm")
+    parser.add_argument("--locations", type=int, default=1000, help="locations in the bulk run")
+    parser.add_argument("--concurrency", type=int, default=32, help="concurrent bulk requests")
+    parser.add_argument("--output", help="where to save the results, a timestamped file in benchmarks/results by default")
+    parser.add_argument("--baseline", help="earlier results to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed regression, as a fraction")
+    args = parser.parse_args()
+
+    os.environ.setdefault("OPENWEATHER_API_KEY", "benchmark")
+    metrics = run(args)
+
+    result = {
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "parameters": {key: value for key, value in vars(args).items() if key not in ("output", "baseline", "tolerance")},
+        "metrics": metrics,
+    }
+    output = args.output
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ.json"))
+    with open(output, "w") as file:
+        json.dump(result, file, indent=2)
+
+    for name, value in metrics.items():
+        print(f"{name:>22}: {value:10.2f}")
+    print(f"Saved to {output}")
+
+    if args.baseline:
+        with open(args.baseline, "r") as file:
+            baseline = json.load(file)["metrics"]
+        if compare(metrics, baseline, args.tolerance):
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+"""
+Records fresh responses from the real OpenWeatherMap API into tests/fixtures, for the
+stub server to replay. Needs OPENWEATHER_API_KEY, and costs three API calls.
+
+Usage:
+    python benchmarks/record_fixtures.py
+    python benchmarks/record_fixtures.py --city Tokyo
+"""
+import os
+import sys
+import json
+import argparse
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+
+from weather.api import WeatherAPI
+from tests.stub_server import FIXTURES_DIR
+
+def main():
+    parser = argparse.ArgumentParser(description="Record OpenWeatherMap responses as test fixtures.")
+    parser.add_argument("--city", default="London", help="the city to record (default: London)")
+    args = parser.parse_args()
+
+    api = WeatherAPI()
+    geocode = api.request(f"{api.base_url}/geo/1.0/direct", {"q": args.city, "limit": 1, "appid": api.api_key}).json()
+    if not geocode:
+        parser.exit(1, f"Could not find the coordinates of {args.city}.\n")
+
+    params = {"lat": geocode[0]["lat"], "lon": geocode[0]["lon"], "appid": api.api_key, "units": "metric"}
+    responses = {
+        "geocode": geocode,
+        "weather": api.request(f"{api.base_url}/data/2.5/weather", params).json(),
+        "forecast": api.request(f"{api.base_url}/data/2.5/forecast", params).json(),
+    }
+    for name, data in responses.items():
+        path = os.path.join(FIXTURES_DIR, f"{name}.json")
+        with open(path, "w") as file:
+            json.dump(data, file, indent=2)
+            file.write("\n")
+        print(f"Recorded {path}")
+
+if __name__ == "__main__":
+    main()
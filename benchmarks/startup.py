@@ -0,0 +1,98 @@
+"""
+Measures how long the application takes to start, and fails if it got slower than
+the budget in startup_budget.json.
+
+Two things are timed, each as the median of several fresh processes:
+    import: importing weather.main, minus the start-up time of a bare interpreter.
+    window: running the app until its window is shown and ready. Needs a display.
+
+Usage:
+    python benchmarks/startup.py
+    python benchmarks/startup.py --runs 20
+    python benchmarks/startup.py --command dist/weather/weather
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+import subprocess
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+BUDGET_FILE = os.path.join(os.path.dirname(__file__), "startup_budget.json")
+
+def time_command(command, runs, env=None):
+    """
+    Runs a command several times and returns the median wall-clock time of a run.
+
+    Args:
+        command (list of str): The command and its arguments.
+        runs (int): The number of runs.
+        env (dict): Extra environment variables for the command.
+
+    Returns:
+        float: The median time in seconds.
+
+    Raises:
+        subprocess.CalledProcessError: If the command fails.
+    """
+    environment = dict(os.environ, **(env or {}))
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(command, cwd=ROOT, env=environment, check=True,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+def measure(runs, command=None):
+    """
+    Measures the start-up times.
+
+    Args:
+        runs (int): The number of runs per measurement.
+        command (list of str): A command that starts the app, such as a PyInstaller
+            bundle. The source tree is run with the current interpreter by default.
+
+    Returns:
+        dict: The "import" and "window" times in seconds; "window" is None without a display.
+    """
+    results = {}
+    baseline = time_command([sys.executable, "-c", "pass"], runs)
+    results["import"] = time_command([sys.executable, "-c", "import weather.main"], runs) - baseline
+
+    if os.environ.get("DISPLAY") or sys.platform in ("win32", "darwin"):
+        command = command or [sys.executable, "-m", "weather.main"]
+        results["window"] = time_command(command, runs, {"WEATHER_EXIT_AFTER_STARTUP": "1"})
+    else:
+        results["window"] = None
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the start-up time of the app.")
+    parser.add_argument("--runs", type=int, default=10, help="runs per measurement")
+    parser.add_argument("--command", nargs="+", help="command that starts the app, e.g. a bundle")
+    parser.add_argument("--budget", default=BUDGET_FILE, help="JSON file of maximum times in seconds")
+    args = parser.parse_args()
+
+    with open(args.budget, "r") as file:
+        budget = json.load(file)
+
+    results = measure(args.runs, args.command)
+    over_budget = False
+    for name, seconds in results.items():
+        if seconds is None:
+            print(f"{name:>8}: skipped, no display")
+            continue
+        limit = budget.get("bundle_window" if name == "window" and args.command else name)
+        status = ""
+        if limit is not None and seconds > limit:
+            status = f"  OVER BUDGET ({limit * 1000:.0f} ms)"
+            over_budget = True
+        print(f"{name:>8}: {seconds * 1000:7.1f} ms{status}")
+
+    sys.exit(1 if over_budget else 0)
+
+if __name__ == "__main__":
+    main()
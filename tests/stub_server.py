@@ -0,0 +1,199 @@
+"""
+A local stand-in for the OpenWeatherMap API, for tests that need a real HTTP server.
+"""
+import os
+import json
+import random
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), "fixtures")
+
+# A 1x1 transparent GIF, which Tk can decode without extra libraries
+ICON_DATA = b"GIF89a\x01\x00\x01\x00\x80\x00\x00\x00\x00\x00\xff\xff\xff!\xf9\x04\x01\x00\x00\x00\x00,\x00\x00\x00\x00\x01\x00\x01\x00\x00\x02\x02D\x01\x00;"
+
+def weather_response(latitude, longitude):
+    """
+    Build a /data/2.5/weather response for the given coordinates.
+    """
+    return {
+        "coord": {"lat": latitude, "lon": longitude},
+        "name": f"Stub {latitude},{longitude}",
+        "main": {"temp": 20.5, "humidity": 50},
+        "wind": {"speed": 3.5},
+        "weather": [{"description": "clear sky", "icon": "01d"}],
+        "dt": int(time.time()),
+    }
+
+def forecast_response(latitude, longitude, start=None):
+    """
+    Build a /data/2.5/forecast response with forty three-hourly entries.
+    """
+    start = int(time.time()) // 10800 * 10800 if start is None else start
+    return {
+        "city": {"name": f"Stub {latitude},{longitude}", "timezone": 0},
+        "list": [
+            {
+                "dt": start + index * 10800,
+                "main": {"temp": 10.0 + index % 8, "humidity": 60 + index % 5},
+                "wind": {"speed": 2.0 + index % 3},
+                "pop": (index % 4) / 4,
+                "weather": [{"description": "light rain" if index % 8 < 3 else "clear sky"}],
+            }
+            for index in range(40)
+        ],
+    }
+
+class _HTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # Enough for the concurrent connections of the benchmarks
+    request_queue_size = 128
+
+def load_fixtures(directory=FIXTURES_DIR):
+    """
+    Load the recorded weather, forecast and geocoding responses, as encoded bodies.
+    """
+    fixtures = {}
+    for name in ("weather", "forecast", "geocode"):
+        with open(os.path.join(directory, f"{name}.json"), "rb") as file:
+            fixtures[name] = file.read()
+    return fixtures
+
+FIXTURE_PATHS = {
+    "/data/2.5/weather": "weather",
+    "/data/2.5/forecast": "forecast",
+    "/geo/1.0/direct": "geocode",
+}
+
+class StubServer:
+    """
+    Serves the weather, forecast, geocoding and icon endpoints on a local port.
+
+    Faults can be injected: every request waits for the latency, then fails with a
+    500 with probability error_rate, or with a 429 and a Retry-After header with
+    probability rate_limit_rate.
+
+    Attributes:
+        url (str): The base URL of the server, such as "http://127.0.0.1:12345".
+        requests (Counter): The number of requests received per path.
+        unknown_cities (set of str): City names the geocoding endpoint does not know.
+        latency (float or tuple): Seconds to wait before answering, or a (min, max) range.
+        error_rate (float): The probability of answering with a 500.
+        rate_limit_rate (float): The probability of answering with a 429.
+        retry_after (int): The Retry-After value sent with a 429, in seconds.
+        fixtures (dict): Recorded response bodies served instead of the generated
+            ones, or None.
+    """
+    def __init__(self, latency=0, error_rate=0, rate_limit_rate=0, retry_after=1, fixtures=None, seed=None):
+        self.requests = Counter()
+        self.unknown_cities = {"Nowhere"}
+        self.latency = latency
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+        self.fixtures = fixtures
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = _HTTPServer(("127.0.0.1", 0), self._make_handler())
+        self.url = f"http://127.0.0.1:{self._server.server_address[1]}"
+        self._thread = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def start(self):
+        """
+        Serve requests on a background thread.
+        """
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stop serving and close the listening socket.
+        """
+        self._server.shutdown()
+        self._server.server_close()
+
+    def delay(self):
+        """
+        Return how long to wait before answering a request.
+        """
+        if isinstance(self.latency, tuple):
+            with self._lock:
+                return self._random.uniform(*self.latency)
+        return self.latency
+
+    def fault(self):
+        """
+        Return the injected error status for a request, or None to answer normally.
+        """
+        with self._lock:
+            draw = self._random.random()
+        if draw < self.error_rate:
+            return 500
+        if draw < self.error_rate + self.rate_limit_rate:
+            return 429
+        return None
+
+    def respond(self, path, query):
+        """
+        Return the status, content type and body for a request.
+        """
+        if self.fixtures is not None and path in FIXTURE_PATHS and query.get("q") not in self.unknown_cities:
+            return 200, "application/json", self.fixtures[FIXTURE_PATHS[path]]
+        if path == "/data/2.5/weather":
+            return 200, "application/json", weather_response(float(query["lat"]), float(query["lon"]))
+        if path == "/data/2.5/forecast":
+            return 200, "application/json", forecast_response(float(query["lat"]), float(query["lon"]))
+        if path == "/geo/1.0/direct":
+            city = query["q"]
+            if city in self.unknown_cities:
+                return 200, "application/json", []
+            return 200, "application/json", [{"name": city, "lat": 51.5074, "lon": -0.1278}]
+        if path.startswith("/img/wn/") and path.endswith(".png"):
+            return 200, "image/png", ICON_DATA
+        return 404, "application/json", {"cod": 404, "message": "Not found"}
+
+    def _make_handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Headers and body are written separately; without this, delayed ACKs add ~40 ms
+            disable_nagle_algorithm = True
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                query = {key: values[0] for key, values in parse_qs(url.query).items()}
+                with stub._lock:
+                    stub.requests[url.path] += 1
+                delay = stub.delay()
+                if delay:
+                    time.sleep(delay)
+                status = stub.fault()
+                if status is None:
+                    status, content_type, body = stub.respond(url.path, query)
+                else:
+                    content_type, body = "application/json", {"cod": status, "message": "Injected fault"}
+                if not isinstance(body, bytes):
+                    body = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                if status == 429:
+                    self.send_header("Retry-After", str(stub.retry_after))
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
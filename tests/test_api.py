@@ -2,25 +2,57 @@
 Unit tests for the WeatherAPI class.
 """
 import unittest
+import tempfile
+import requests
 from unittest.mock import patch, Mock
 from weather.api import WeatherAPI
+from weather.icons import IconStore
+from weather.cache import ResponseCache
+from weather.spatial import SpatialIndex
+from weather.providers import ProviderChain, OpenWeatherMapProvider
+from weather.ratelimit import TokenBucket, RetryPolicy, CircuitBreaker, UsageCounter, CircuitOpenError
+from tests.stub_server import StubServer, load_fixtures
 
 class TestWeatherAPI(unittest.TestCase):
     """
     Test cases for the WeatherAPI class.
     """
-    @patch("weather.api.requests.get")
+    def setUp(self):
+        """
+        Give each test its own copy of the state WeatherAPI instances share: an empty
+        response cache, an icon store and usage counter backed by a temporary directory,
+        an unlimited rate limiter, a closed circuit breaker and retries without delay.
+        """
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        shared_state = {
+            "icons": IconStore(directory=temp_dir.name),
+            "cache": ResponseCache(),
+            "nearby": SpatialIndex(),
+            "providers": ProviderChain([OpenWeatherMapProvider()]),
+            "rate_limiter": TokenBucket(rate=1000, capacity=1000),
+            "retry_policy": RetryPolicy(base_delay=0),
+            "circuit_breaker": CircuitBreaker(failure_threshold=3),
+            "usage": UsageCounter(path=f"{temp_dir.name}/usage.json"),
+        }
+        self.addCleanup(shared_state["usage"].flush)
+        for name, value in shared_state.items():
+            patcher = patch.object(WeatherAPI, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+    @patch("weather.api.requests.Session.get")
     def test_get_weather_success(self, mock_get):
         """
         Test the get_weather method with a successful API response.
         """
         # Simulate the API call's JSON response
-        mock_response = Mock()
+        mock_response = Mock(status_code=200)
         mock_response.json.return_value = {
             "name": "Sacramento",
             "main": {"temp": 19},
             "weather": [{"description": "clear sky", "icon": "01d"}]
         }
+        mock_response.content = b"icon"
         mock_get.return_value = mock_response
         
         api = WeatherAPI()
@@ -31,7 +63,7 @@ class TestWeatherAPI(unittest.TestCase):
         self.assertEqual(result[1], 19)
         self.assertEqual(result[2], "clear sky")
 
-    @patch("weather.api.requests.get")
+    @patch("weather.api.requests.Session.get")
     def test_get_weather_failure(self, mock_get):
         """
         Test the get_weather method with a failed API response.
@@ -43,5 +75,259 @@ class TestWeatherAPI(unittest.TestCase):
         
         self.assertIsNone(result)
 
+    @patch("weather.api.requests.Session.get")
+    def test_requests_use_timeout(self, mock_get):
+        """
+        Test that every request is sent with the configured timeout.
+        """
+        mock_response = Mock(status_code=200)
+        mock_response.json.return_value = {
+            "name": "Sacramento",
+            "main": {"temp": 19},
+            "weather": [{"description": "clear sky", "icon": "01d"}]
+        }
+        mock_response.content = b"icon"
+        mock_get.return_value = mock_response
+
+        api = WeatherAPI(timeout=(1, 2))
+        api.get_weather(0, 0)
+
+        self.assertEqual(mock_get.call_count, 2)
+        for call in mock_get.call_args_list:
+            self.assertEqual(call.kwargs["timeout"], (1, 2))
+
+    @patch("weather.api.requests.Session.get")
+    def test_get_weather_downloads_icon_once(self, mock_get):
+        """
+        Test that repeated lookups reuse the cached response and the stored weather icon.
+        """
+        mock_response = Mock(status_code=200)
+        mock_response.json.return_value = {
+            "name": "Sacramento",
+            "main": {"temp": 19},
+            "weather": [{"description": "clear sky", "icon": "01d"}]
+        }
+        mock_response.content = b"icon"
+        mock_get.return_value = mock_response
+
+        api = WeatherAPI()
+        first = api.get_weather(0, 0)
+        second = api.get_weather(0, 0)
+
+        self.assertEqual(first[3], b"icon")
+        self.assertEqual(second[3], b"icon")
+        self.assertEqual(mock_get.call_count, 2)
+
+    @patch("weather.api.requests.Session.get")
+    def test_get_forecast_cached_until_invalidated(self, mock_get):
+        """
+        Test that forecasts are served from the cache until the location is invalidated.
+        """
+        mock_response = Mock(status_code=200)
+        mock_response.json.return_value = {"list": []}
+        mock_response.content = b'{"list": []}'
+        mock_get.return_value = mock_response
+
+        api = WeatherAPI()
+        api.get_forecast(51.5, -0.12)
+        api.get_forecast(51.5, -0.12)
+        self.assertEqual(mock_get.call_count, 1)
+        self.assertEqual(api.cache.stats()["hits"], 1)
+
+        api.invalidate_cache(51.5, -0.12)
+        api.get_forecast(51.5, -0.12)
+        self.assertEqual(mock_get.call_count, 2)
+
+    @patch("weather.api.requests.Session.get")
+    def test_nearby_lookups_share_cached_response(self, mock_get):
+        """
+        Test that a lookup within the radius of a cached location is served from the
+        cache, one further away is not, and a radius of 0 turns the reuse off.
+        """
+        mock_response = Mock(status_code=200)
+        mock_response.json.return_value = {"name": "London", "main": {"temp": 12},
+                                           "weather": [{"description": "rain", "icon": "10d"}]}
+        mock_response.content = b"{}"
+        mock_get.return_value = mock_response
+
+        api = WeatherAPI()
+        api.fetch_weather(51.5074, -0.1278)
+        self.assertEqual(api.fetch_weather(51.5075, -0.1277)[0], "London")
+        self.assertEqual(mock_get.call_count, 1)
+
+        api.fetch_weather(51.6, -0.1278)
+        WeatherAPI(nearby_radius=0).fetch_weather(51.5076, -0.1276)
+        self.assertEqual(mock_get.call_count, 3)
+
+    def test_is_cached(self):
+        """
+        Test that a location counts as cached only once both its weather and forecast are.
+        """
+        api = WeatherAPI()
+        self.assertFalse(api.is_cached(51.5, -0.12))
+        api.cache.set(WeatherAPI.cache_key("weather", 51.5, -0.12), {}, ttl=60)
+        self.assertFalse(api.is_cached(51.5, -0.12))
+        api.cache.set(WeatherAPI.cache_key("forecast", 51.5, -0.12), {}, ttl=60)
+        self.assertTrue(api.is_cached(51.5, -0.12))
+
+    def test_stale_location_served_by_fresh_neighbour(self):
+        """
+        Test that a location whose own response is stale is served a fresh response
+        from within the radius, and one with a fresh response is served its own.
+        """
+        api = WeatherAPI()
+        api.cache.set(WeatherAPI.cache_key("weather", 51.5074, -0.1278), {"name": "Own"}, ttl=0, stale_ttl=60)
+        api.nearby.add("weather", 51.5074, -0.1278)
+        api.cache.set(WeatherAPI.cache_key("weather", 51.5080, -0.1280), {"name": "Neighbour"}, ttl=60)
+        api.nearby.add("weather", 51.5080, -0.1280)
+
+        self.assertEqual(api.get_nearby("weather", 51.5074, -0.1278), {"name": "Neighbour"})
+        self.assertIsNone(api.get_nearby("weather", 51.5080, -0.1280))
+
+    @patch("weather.api.requests.Session.get")
+    def test_get_location_report_partial(self, mock_get):
+        """
+        Test that a location report keeps the weather and icon when the forecast fails.
+        """
+        def respond(url, params=None, timeout=None):
+            if url.endswith("/forecast"):
+                raise requests.exceptions.ConnectionError("Forecast unavailable.")
+            response = Mock(status_code=200)
+            response.json.return_value = {
+                "name": "Sacramento",
+                "main": {"temp": 19},
+                "weather": [{"description": "clear sky", "icon": "01d"}]
+            }
+            response.content = b"icon"
+            return response
+
+        mock_get.side_effect = respond
+        report = WeatherAPI().get_location_report(38.58, -121.49)
+
+        self.assertEqual(report["weather"], ("Sacramento", 19, "clear sky", "01d"))
+        self.assertEqual(report["icon_data"], b"icon")
+        self.assertIsNone(report["forecast"])
+        self.assertEqual(list(report["errors"]), ["forecast"])
+
+    @patch("weather.data.get_coordinates_from_city")
+    @patch("weather.api.requests.Session.get")
+    def test_get_weather_many(self, mock_get, mock_geocode):
+        """
+        Test that a batch deduplicates locations and reports per-location errors.
+        """
+        def respond(url, params=None, timeout=None):
+            if params["lat"] == 99:
+                raise requests.exceptions.HTTPError("400 Client Error.")
+            response = Mock(status_code=200)
+            response.json.return_value = {
+                "name": f"Place {params['lat']}",
+                "main": {"temp": 19},
+                "weather": [{"description": "clear sky", "icon": "01d"}]
+            }
+            response.content = b"{}"
+            return response
+
+        mock_get.side_effect = respond
+        mock_geocode.side_effect = lambda city: (1.0, 2.0) if city == "Known" else (None, None)
+        locations = [(1, 2), (1.00001, 2.0), (3, 4), (99, 0), "Known", "known ", "Unknown", (1, 2, 3, 4), None]
+
+        results = list(WeatherAPI().get_weather_many(locations, max_concurrency=2))
+
+        by_location = {result.location: result for result in results}
+        self.assertEqual(len(results), 7)
+        self.assertEqual(by_location[(3, 4)].data[0], "Place 3.0")
+        self.assertIsInstance(by_location[(99, 0)].error, requests.exceptions.HTTPError)
+        self.assertEqual(by_location["Known"].coordinates, (1.0, 2.0))
+        self.assertIsInstance(by_location["Unknown"].error, ValueError)
+        self.assertIsNone(by_location["Unknown"].data)
+        self.assertIsInstance(by_location[(1, 2, 3, 4)].error, ValueError)
+        self.assertIsInstance(by_location[None].error, TypeError)
+
+    @patch("weather.api.time.sleep")
+    @patch("weather.api.requests.Session.get")
+    def test_request_retries_rate_limited_calls(self, mock_get, mock_sleep):
+        """
+        Test that a 429 response is retried after the delay in its Retry-After header.
+        """
+        limited = Mock(status_code=429, headers={"Retry-After": "2"})
+        success = Mock(status_code=200)
+        mock_get.side_effect = [limited, success]
+
+        api = WeatherAPI()
+        self.assertIs(api.request("https://example.com"), success)
+        mock_sleep.assert_called_once_with(2.0)
+        self.assertEqual(api.usage.snapshot()["calls"], 2)
+
+    @patch("weather.api.requests.Session.get")
+    def test_circuit_breaker_serves_stale_data(self, mock_get):
+        """
+        Test that an open circuit breaker fails fast and stale cached data is served instead.
+        """
+        mock_get.side_effect = requests.exceptions.ConnectionError("API down.")
+        api = WeatherAPI()
+        api.cache.set(WeatherAPI.cache_key("forecast", 1, 2), {"list": []}, ttl=0)
+
+        self.assertEqual(api.get_forecast(1, 2), {})
+        self.assertEqual(api.circuit_breaker.state, "open")
+        calls = mock_get.call_count
+
+        with self.assertRaises(CircuitOpenError):
+            api.fetch_weather(3, 4)
+        self.assertEqual(mock_get.call_count, calls)
+
+    @patch("weather.api.requests.Session.get")
+    def test_failed_trial_call_recorded(self, mock_get):
+        """
+        Test that a trial call failing with an error that is not retried still ends the
+        trial, so the next call is let through.
+        """
+        api = WeatherAPI()
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+        breaker.record_failure()
+        mock_get.side_effect = requests.exceptions.ChunkedEncodingError("Connection broken.")
+
+        with patch.object(WeatherAPI, "circuit_breaker", breaker):
+            with self.assertRaises(requests.exceptions.ChunkedEncodingError):
+                api.request("https://example.com")
+            self.assertEqual(mock_get.call_count, 1)
+
+            success = Mock(status_code=200, content=b"")
+            mock_get.side_effect = None
+            mock_get.return_value = success
+            self.assertIs(api.request("https://example.com"), success)
+            self.assertEqual(breaker.state, "closed")
+
+    def test_against_stub_server(self):
+        """
+        Test a lookup over real HTTP against the recorded fixtures, and that persistent
+        429 responses are retried and then raised.
+        """
+        with StubServer(fixtures=load_fixtures(), retry_after=0) as stub:
+            api = WeatherAPI(base_url=stub.url, icon_base_url=f"{stub.url}/img/wn")
+            city, temperature, description, icon_data = api.get_weather(51.5085, -0.1257)
+            self.assertEqual((city, description), ("London", "light rain"))
+            self.assertGreaterEqual(len(api.get_forecast(51.5085, -0.1257)), 5)
+
+            stub.rate_limit_rate = 1
+            with self.assertRaises(requests.exceptions.HTTPError):
+                api.fetch_weather(0, 0)
+            self.assertEqual(stub.requests["/data/2.5/weather"], 1 + 1 + api.retry_policy.max_retries)
+
+    def test_session_shared_between_instances(self):
+        """
+        Test that all WeatherAPI instances share one pooled session.
+        """
+        WeatherAPI.close_session()
+        first = WeatherAPI(pool_size=4)
+        second = WeatherAPI(pool_size=16)
+
+        self.assertIs(first.session, second.session)
+        adapter = first.session.get_adapter("https://api.openweathermap.org")
+        self.assertEqual(adapter._pool_maxsize, 16)
+
+        with patch.object(adapter, "close") as mock_close:
+            WeatherAPI(pool_size=32)
+        mock_close.assert_called_once_with()
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,115 @@
+"""
+Unit tests for the AsyncWeatherAPI class, run against a local stub server.
+"""
+import asyncio
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+from weather.api import WeatherAPI
+from weather.async_api import AsyncWeatherAPI
+from weather.data import GeocodeCache
+from weather.ratelimit import TokenBucket, RetryPolicy, CircuitBreaker, UsageCounter
+from tests.stub_server import StubServer, ICON_DATA
+
+class TestAsyncWeatherAPI(unittest.IsolatedAsyncioTestCase):
+    """
+    Test cases for the AsyncWeatherAPI class.
+    """
+    def setUp(self):
+        """
+        Start a stub server, and give each test an empty geocode cache and fresh
+        WeatherAPI shared state.
+        """
+        self.server = StubServer()
+        self.server.start()
+        self.addCleanup(self.server.stop)
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        cache = GeocodeCache(path=str(Path(temp_dir.name) / "geocode_cache.json"))
+        self.usage = UsageCounter(path=f"{temp_dir.name}/usage.json")
+        self.addCleanup(self.usage.flush)
+        self.circuit_breaker = CircuitBreaker(failure_threshold=2)
+        for patcher in (
+            patch("weather.async_api.geocode_cache", cache),
+            patch.object(WeatherAPI, "rate_limiter", TokenBucket(rate=1000, capacity=1000)),
+            patch.object(WeatherAPI, "retry_policy", RetryPolicy(max_retries=2, base_delay=0)),
+            patch.object(WeatherAPI, "circuit_breaker", self.circuit_breaker),
+            patch.object(WeatherAPI, "usage", self.usage),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def make_api(self, **kwargs):
+        """
+        Create a client pointed at the stub server.
+        """
+        return AsyncWeatherAPI(
+            api_key="test", base_url=self.server.url, icon_base_url=f"{self.server.url}/img/wn", **kwargs
+        )
+
+    async def test_get_weather_and_forecast(self):
+        """
+        Test that weather and forecast are parsed like WeatherAPI does.
+        """
+        async with self.make_api() as api:
+            weather = await api.get_weather(51.5, -0.12)
+            forecast = await api.get_forecast(51.5, -0.12)
+            icon_data = await api.get_icon(weather[3])
+
+        self.assertEqual(weather, ("Stub 51.5,-0.12", 20.5, "clear sky", "01d"))
+        self.assertGreaterEqual(len(forecast), 4)
+        self.assertEqual(icon_data, ICON_DATA)
+
+    async def test_many_concurrent_requests(self):
+        """
+        Test that many gathered lookups all succeed through the bounded pool.
+        """
+        async with self.make_api(max_in_flight=20, connections=10) as api:
+            results = await asyncio.gather(*(api.get_weather(index, index) for index in range(200)))
+
+        self.assertTrue(all(result is not None for result in results))
+        self.assertEqual(self.server.requests["/data/2.5/weather"], 200)
+
+    async def test_get_coordinates_cached(self):
+        """
+        Test that geocoding uses the shared cache, including for unknown cities.
+        """
+        async with self.make_api() as api:
+            self.assertEqual(await api.get_coordinates("London"), (51.5074, -0.1278))
+            self.assertEqual(await api.get_coordinates("london"), (51.5074, -0.1278))
+            self.assertEqual(await api.get_coordinates("Nowhere"), (None, None))
+
+        self.assertEqual(self.server.requests["/geo/1.0/direct"], 2)
+
+    async def test_shares_limits_with_weather_api(self):
+        """
+        Test that API calls are retried, counted in the usage and stopped by the circuit
+        breaker shared with WeatherAPI, and icons are not counted.
+        """
+        async with self.make_api() as api:
+            self.server.rate_limit_rate, self.server.retry_after = 1, 0
+            self.assertIsNone(await api.get_weather(51.5, -0.12))
+            self.assertEqual(self.server.requests["/data/2.5/weather"], 3)
+            self.assertEqual(self.usage.snapshot()["calls"], 3)
+
+            self.server.rate_limit_rate = 0
+            self.server.error_rate = 1
+            self.assertIsNone(await api.get_weather(51.5, -0.12))
+            self.assertEqual(self.circuit_breaker.state, "open")
+            self.assertIsNone(await api.get_weather(51.5, -0.12))
+            self.assertEqual(self.server.requests["/data/2.5/weather"], 5)
+
+            self.server.error_rate = 0
+            await api.get_icon("01d")
+        self.assertEqual(self.usage.snapshot()["calls"], 5)
+
+    async def test_get_weather_failure(self):
+        """
+        Test that a failed request returns None.
+        """
+        async with AsyncWeatherAPI(api_key="test", base_url=f"{self.server.url}/missing") as api:
+            self.assertIsNone(await api.get_weather(0, 0))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,145 @@
+"""
+Unit tests for the ResponseCache class.
+"""
+import unittest
+import threading
+from unittest.mock import Mock
+from weather.cache import ResponseCache
+
+class FakeClock:
+    """
+    A clock that only moves when told to.
+    """
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
+
+class TestResponseCache(unittest.TestCase):
+    """
+    Test cases for the ResponseCache class.
+    """
+    def setUp(self):
+        """
+        Set up a cache driven by a fake clock.
+        """
+        self.clock = FakeClock()
+        self.cache = ResponseCache(max_entries=3, max_bytes=100, clock=self.clock)
+
+    def test_get_or_fetch_hit_and_miss(self):
+        """
+        Test that a fresh entry is served without fetching again.
+        """
+        fetch = Mock(return_value=("value", 10))
+
+        self.assertEqual(self.cache.get_or_fetch("key", fetch, ttl=60), "value")
+        self.assertEqual(self.cache.get_or_fetch("key", fetch, ttl=60), "value")
+
+        fetch.assert_called_once()
+        stats = self.cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"], stats["bytes"]), (1, 1, 10))
+
+    def test_expired_entry_fetched_again(self):
+        """
+        Test that an entry past its TTL and stale window is fetched again.
+        """
+        fetch = Mock(side_effect=[("old", 1), ("new", 1)])
+        self.cache.get_or_fetch("key", fetch, ttl=60)
+        self.clock.now = 61
+
+        self.assertEqual(self.cache.get_or_fetch("key", fetch, ttl=60), "new")
+        self.assertIsNone(self.cache.get("missing"))
+
+    def test_stale_while_revalidate(self):
+        """
+        Test that a stale entry is served at once while it is refreshed in the background.
+        """
+        refreshed = threading.Event()
+
+        def refresh():
+            refreshed.set()
+            return "new", 1
+
+        self.cache.set("key", "old", ttl=60, size=1, stale_ttl=60)
+        self.clock.now = 90
+
+        self.assertEqual(self.cache.get_or_fetch("key", refresh, ttl=60, stale_ttl=60), "old")
+        self.assertTrue(refreshed.wait(1))
+        for _ in range(100):
+            if self.cache.get("key") == "new":
+                break
+            threading.Event().wait(0.01)
+        self.assertEqual(self.cache.get("key"), "new")
+        self.assertEqual(self.cache.stats()["stale_hits"], 1)
+
+    def test_eviction_by_count_and_size(self):
+        """
+        Test that the least recently used entries are evicted when a bound is exceeded.
+        """
+        for key in ("a", "b", "c"):
+            self.cache.set(key, key, ttl=60, size=10)
+        self.cache.get("a")
+        self.cache.set("d", "d", ttl=60, size=10)
+        self.assertIsNone(self.cache.get("b"))
+        self.assertEqual(self.cache.get("a"), "a")
+
+        self.cache.set("e", "e", ttl=60, size=90)
+        self.assertEqual(self.cache.stats()["bytes"], 100)
+        self.assertIsNone(self.cache.get("d"))
+        self.assertEqual(self.cache.get("a"), "a")
+
+        self.cache.set("huge", "huge", ttl=60, size=101)
+        self.assertIsNone(self.cache.get("huge"))
+
+    def test_concurrent_misses_share_one_fetch(self):
+        """
+        Test that lookups arriving while an entry is fetched wait for that fetch.
+        """
+        started = threading.Event()
+        release = threading.Event()
+
+        def fetch():
+            started.set()
+            release.wait(5)
+            return "value", 1
+
+        results = []
+        first = threading.Thread(target=lambda: results.append(self.cache.get_or_fetch("key", fetch, ttl=60)))
+        first.start()
+        started.wait(5)
+        second_fetch = Mock(return_value=("other", 1))
+        second = threading.Thread(target=lambda: results.append(self.cache.get_or_fetch("key", second_fetch, ttl=60)))
+        second.start()
+        release.set()
+        first.join(5)
+        second.join(5)
+
+        self.assertEqual(results, ["value", "value"])
+        second_fetch.assert_not_called()
+        self.assertEqual(self.cache.stats()["misses"], 1)
+
+    def test_get_or_fetch_reports_result(self):
+        """
+        Test that a lookup can tell whether it fetched the value or found it cached.
+        """
+        fetch = Mock(return_value=("value", 1))
+        lookup = lambda: self.cache.get_or_fetch("key", fetch, ttl=60, stale_ttl=60, with_result=True)
+
+        self.assertEqual(lookup(), ("value", "miss"))
+        self.assertEqual(lookup(), ("value", "hit"))
+        self.clock.now = 90
+        self.assertEqual(lookup(), ("value", "stale"))
+
+    def test_invalidate(self):
+        """
+        Test that invalidating an entry removes it.
+        """
+        self.cache.set("key", "value", ttl=60, size=5)
+        self.cache.invalidate("key")
+
+        self.assertIsNone(self.cache.get("key"))
+        self.assertEqual(self.cache.stats()["bytes"], 0)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,94 @@
+"""
+Unit tests for the headless command line interface.
+"""
+import io
+import os
+import csv
+import json
+import unittest
+import requests
+from unittest.mock import patch
+from weather import cli
+from weather.api import WeatherAPI
+
+def fake_fetch_weather(latitude, longitude):
+    """Returns made-up weather, failing for the null island."""
+    if (latitude, longitude) == (0, 0):
+        raise requests.exceptions.ConnectionError("unreachable")
+    return "Somewhere", 20.0, "clear sky", "01d"
+
+class TestCLI(unittest.TestCase):
+    """
+    Test cases for the command line interface.
+    """
+    def setUp(self):
+        """
+        Replace the network calls with fakes.
+        """
+        for patcher in (
+            patch.dict(os.environ, {"OPENWEATHER_API_KEY": "test_key"}),
+            patch.object(WeatherAPI, "fetch_weather", side_effect=fake_fetch_weather),
+            patch.object(WeatherAPI, "fetch_forecast", return_value={"01-01-2030": (5.0, "snow")}),
+            patch("weather.data.get_coordinates_from_city", return_value=(51.5, -0.12)),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def run_cli(self, argv, stdin=""):
+        """Runs the command and returns its exit code and output."""
+        stdout = io.StringIO()
+        code = cli.main(argv, stdin=io.StringIO(stdin), stdout=stdout)
+        return code, stdout.getvalue()
+
+    def test_parse_location(self):
+        """
+        Test that coordinate pairs are told apart from city names.
+        """
+        self.assertEqual(cli.parse_location("51.5, -0.12"), (51.5, -0.12))
+        self.assertEqual(cli.parse_location("Paris, FR"), "Paris, FR")
+        self.assertEqual(cli.parse_location("London"), "London")
+        self.assertEqual(cli.parse_location("100, 200"), "100, 200")
+
+    def test_streams_json_lines_from_stdin(self):
+        """
+        Test that every location read from standard input gets one JSON record.
+        """
+        code, output = self.run_cli([], stdin="London\n# a comment\n\n0, 0\n")
+
+        records = {record["location"]: record for record in map(json.loads, output.splitlines())}
+        self.assertEqual(code, 1)
+        self.assertEqual(set(records), {"London", "0.0, 0.0"})
+        self.assertEqual(records["London"]["temperature"], 20.0)
+        self.assertEqual(records["London"]["latitude"], 51.5)
+        self.assertIn("unreachable", records["0.0, 0.0"]["error"])
+
+    def test_forecast_as_csv(self):
+        """
+        Test that a forecast is written as one CSV row per day.
+        """
+        code, output = self.run_cli(["--forecast", "--format", "csv", "10, 20"])
+
+        rows = list(csv.DictReader(io.StringIO(output)))
+        self.assertEqual(code, 0)
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]["date"], "01-01-2030")
+        self.assertEqual(rows[0]["description"], "snow")
+
+    def test_reads_input_lazily(self):
+        """
+        Test that the input is consumed as results are written, not read up front.
+        """
+        consumed = []
+
+        def lines():
+            for index in range(100):
+                consumed.append(index)
+                yield f"{index % 80}, 1\n"
+
+        results = WeatherAPI().get_weather_many(cli.read_locations(lines()), max_concurrency=2)
+        next(results)
+        self.assertLessEqual(len(consumed), 4)
+        results.close()
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,59 @@
+"""
+Unit tests for the shared configuration.
+"""
+import os
+import unittest
+from unittest.mock import patch
+from weather import config
+from weather.api import WeatherAPI
+
+class TestConfig(unittest.TestCase):
+    """
+    Test cases for loading the configuration once per process.
+    """
+    def setUp(self):
+        """
+        Forget any API key loaded by earlier tests.
+        """
+        config.get_api_key.cache_clear()
+        self.addCleanup(config.get_api_key.cache_clear)
+
+    @patch.dict(os.environ, {"OPENWEATHER_API_KEY": "test_key"})
+    @patch("dotenv.load_dotenv")
+    def test_api_key_loaded_once(self, mock_load_dotenv):
+        """
+        Test that the .env file is read once, however many clients are created.
+        """
+        keys = [WeatherAPI().api_key for _ in range(3)]
+
+        self.assertEqual(keys, ["test_key"] * 3)
+        mock_load_dotenv.assert_called_once()
+
+    @patch.dict(os.environ, {}, clear=True)
+    @patch("dotenv.load_dotenv")
+    def test_missing_api_key(self, mock_load_dotenv):
+        """
+        Test that a missing API key raises a ValueError.
+        """
+        with self.assertRaises(ValueError):
+            config.get_api_key()
+
+    @patch.dict(os.environ, {"OPENWEATHER_API_KEY": "test_key"})
+    def test_default_instance_shared(self):
+        """
+        Test that the default client is created once and shared.
+        """
+        with patch.object(WeatherAPI, "_default", None):
+            self.assertIs(WeatherAPI.default(), WeatherAPI.default())
+
+    def test_get_flag(self):
+        """
+        Test that only 1, true and yes turn a setting on.
+        """
+        for value, expected in (("1", True), ("TRUE", True), (" yes", True), ("0", False), ("false", False), ("", False)):
+            with self.subTest(value=value), patch.dict(os.environ, {"WEATHER_TEST_FLAG": value}):
+                self.assertEqual(config.get_flag("WEATHER_TEST_FLAG"), expected)
+        self.assertFalse(config.get_flag("WEATHER_UNSET_FLAG"))
+
+if __name__ == "__main__":
+    unittest.main()
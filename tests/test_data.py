@@ -4,41 +4,110 @@ Unit tests for the data functions.
 import unittest
 import tempfile
 from pathlib import Path
-from unittest.mock import Mock, mock_open, patch
-from weather.data import load_favourite_cities, save_to_favourites, get_coordinates_from_city
+from unittest.mock import Mock, patch
+from weather.api import WeatherAPI
+from weather.data import (
+    load_favourite_cities, save_to_favourites, remove_from_favourites, get_coordinates_from_city, GeocodeCache,
+    FavouritesStore
+)
+from weather.gazetteer import Gazetteer
+from weather.ratelimit import CircuitBreaker, UsageCounter
 
 class TestDataFunctions(unittest.TestCase):
     """
     Test cases for the data functions.
     """
 
-    @patch("weather.data.get_file_path")
-    def test_load_favourite_cities(self, mock_get_file_path):
+    def setUp(self):
         """
-        Test the load_favourite_cities function.
+        Give each test an empty geocode cache and API usage counter backed by
+        temporary files, and a closed circuit breaker.
         """
-        with tempfile.TemporaryDirectory() as temp_dir:
-            temp_file = Path(temp_dir) / "favourites.txt"
-            temp_file.write_text("New York\nDallas\n")
-            mock_get_file_path.return_value = str(temp_file)
-            cities = load_favourite_cities()
-            self.assertEqual(cities, ["New York", "Dallas"])
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_dir.cleanup)
+        self.cache_path = str(Path(self.temp_dir.name) / "geocode_cache.json")
+        usage = UsageCounter(path=str(Path(self.temp_dir.name) / "usage.json"))
+        self.addCleanup(usage.flush)
+        patchers = [
+            patch("weather.data.geocode_cache", GeocodeCache(path=self.cache_path)),
+            patch("weather.data.gazetteer", Gazetteer(path=str(Path(self.temp_dir.name) / "cities.tsv"))),
+            patch.object(WeatherAPI, "usage", usage),
+            patch.object(WeatherAPI, "circuit_breaker", CircuitBreaker()),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
 
-    @patch("weather.data.open", new_callable=mock_open)
-    def test_save_to_favourites(self, mock_file):
+    def make_store(self, legacy_text=None):
+        """
+        Create a favourites store in the temporary directory, optionally with an old
+        favourites.txt file to import, and use it for the data functions.
+        """
+        legacy_path = Path(self.temp_dir.name) / "favourites.txt"
+        if legacy_text is not None:
+            legacy_path.write_text(legacy_text)
+        store = FavouritesStore(
+            path=str(Path(self.temp_dir.name) / "favourites.db"), legacy_path=str(legacy_path)
+        )
+        self.addCleanup(store.close)
+        patcher = patch("weather.data.favourites_store", store)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        return store
+
+    def test_load_favourite_cities(self):
+        """
+        Test the load_favourite_cities function, including the import of favourites.txt.
+        """
+        self.make_store("New York\nDallas\n\nnew york\n")
+        cities = load_favourite_cities()
+        self.assertEqual(cities, ["New York", "Dallas"])
+
+    def test_save_to_favourites(self):
         """
         Test the save_to_favourites function.
         """
+        self.make_store()
         success = save_to_favourites("London")
         self.assertTrue(success)
-        mock_file().write.assert_called_once_with("London\n")
+        self.assertTrue(save_to_favourites("london", 51.5, -0.12))
+        self.assertEqual(load_favourite_cities(), ["London"])
+        self.assertTrue(remove_from_favourites("LONDON"))
+        self.assertEqual(load_favourite_cities(), [])
+
+    def test_favourites_store(self):
+        """
+        Test that the favourites store keeps coordinates and data, and removes cities.
+        """
+        store = self.make_store("Dallas\n")
+        store.add("Paris", 48.85, 2.35)
+        store.set_coordinates("Dallas", 32.78, -96.8)
+        store.set_data("Dallas", {"weather": ["Dallas", 30, "clear sky", "01d"]})
 
-    @patch("weather.data.requests.get")
+        dallas = store.get("DALLAS")
+        self.assertEqual((dallas.latitude, dallas.longitude), (32.78, -96.8))
+        self.assertEqual(dallas.last_data["weather"][1], 30)
+        self.assertIsNotNone(dallas.last_fetched)
+        self.assertEqual(store.get("paris").latitude, 48.85)
+        latest = store.latest_weather(["dallas", "Paris", "Nowhere"])
+        self.assertEqual(list(latest), ["dallas"])
+        self.assertEqual(latest["dallas"][0], ("Dallas", 30, "clear sky", "01d"))
+
+        self.assertTrue(store.remove("Paris"))
+        self.assertFalse(store.remove("Paris"))
+        self.assertIsNone(store.get("Paris"))
+
+        # The old file is only imported once, so removed cities stay removed
+        store.remove("Dallas")
+        store.close()
+        self.assertEqual(store.names(), [])
+
+    @patch("weather.api.requests.Session.get")
     def test_get_coordinates_from_city_success(self, mock_get):
         """
         Test the get_coordinates_from_city function with a successful API response.
         """
-        mock_response = Mock()
+        mock_response = Mock(status_code=200)
         mock_response.json.return_value = [{"lat": 123, "lon": 456}]
         mock_get.return_value = mock_response
         
@@ -46,7 +115,7 @@ class TestDataFunctions(unittest.TestCase):
         self.assertEqual(latitude, 123)
         self.assertEqual(longitude, 456)
 
-    @patch("weather.data.requests.get")
+    @patch("weather.api.requests.Session.get")
     def test_get_coordinates_from_city_failure(self, mock_get):
         """
         Test the get_coordinates_from_city function with a failed API response.
@@ -57,5 +126,74 @@ class TestDataFunctions(unittest.TestCase):
         self.assertIsNone(latitude)
         self.assertIsNone(longitude)
 
+    @patch("weather.api.requests.Session.get")
+    def test_get_coordinates_from_city_cached(self, mock_get):
+        """
+        Test that a city is only geocoded once, whatever its spelling.
+        """
+        mock_response = Mock(status_code=200)
+        mock_response.json.return_value = [{"lat": 51.5, "lon": -0.1}]
+        mock_get.return_value = mock_response
+
+        self.assertEqual(get_coordinates_from_city("London"), (51.5, -0.1))
+        self.assertEqual(get_coordinates_from_city("  lONDON "), (51.5, -0.1))
+        self.assertEqual(mock_get.call_count, 1)
+
+    @patch("weather.api.requests.Session.get")
+    def test_get_coordinates_from_city_gazetteer(self, mock_get):
+        """
+        Test that cities in the gazetteer are resolved without a network request.
+        """
+        Path(self.temp_dir.name, "cities.tsv").write_text("Oxford\tGB\t51.752\t-1.2577\t154600\n")
+        mock_response = Mock(status_code=200)
+        mock_response.json.return_value = [{"lat": 1, "lon": 2}]
+        mock_get.return_value = mock_response
+
+        self.assertEqual(get_coordinates_from_city("oxford"), (51.752, -1.2577))
+        self.assertEqual(get_coordinates_from_city("Cambridge"), (1, 2))
+        self.assertEqual(mock_get.call_count, 1)
+
+    @patch("weather.api.requests.Session.get")
+    def test_get_coordinates_from_city_negative_cache(self, mock_get):
+        """
+        Test that unknown cities are cached, but network errors are not.
+        """
+        mock_response = Mock(status_code=200)
+        mock_response.json.return_value = []
+        mock_get.return_value = mock_response
+
+        self.assertEqual(get_coordinates_from_city("Nowhere"), (None, None))
+        self.assertEqual(get_coordinates_from_city("Nowhere"), (None, None))
+        self.assertEqual(mock_get.call_count, 1)
+
+        mock_get.side_effect = Exception("Failed API call.")
+        get_coordinates_from_city("Elsewhere")
+        get_coordinates_from_city("Elsewhere")
+        self.assertEqual(mock_get.call_count, 3)
+
+    def test_geocode_cache_persistence_and_eviction(self):
+        """
+        Test that the geocode cache survives a reload and evicts the least recently used city.
+        """
+        cache = GeocodeCache(path=self.cache_path, max_entries=2)
+        cache.set("Paris", 48.85, 2.35)
+        cache.set("Rome", 41.9, 12.5)
+        cache.get("Paris")
+        cache.set("Oslo", 59.9, 10.75)
+
+        reloaded = GeocodeCache(path=self.cache_path, max_entries=2)
+        self.assertEqual(reloaded.get("paris"), (48.85, 2.35))
+        self.assertEqual(reloaded.get("Oslo"), (59.9, 10.75))
+        self.assertIsNone(reloaded.get("Rome"))
+
+    def test_geocode_cache_negative_entry_expires(self):
+        """
+        Test that a cached unknown city expires after the negative TTL.
+        """
+        cache = GeocodeCache(path=self.cache_path, negative_ttl=0)
+        cache.set("Nowhere", None, None)
+        with patch("weather.data.time.time", return_value=10**10):
+            self.assertIsNone(cache.get("Nowhere"))
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,65 @@
+"""
+Unit tests for the favourites list behind the favourites panel.
+"""
+import unittest
+from datetime import datetime
+from weather.favourites import FavouritesList, format_conditions
+
+class TestFavouritesList(unittest.TestCase):
+    """
+    Test cases for the FavouritesList class.
+    """
+    def test_filter_narrows_and_widens(self):
+        """
+        Test that the filter ignores case and accents, and that deleting text widens it again.
+        """
+        favourites = FavouritesList(["London", "São Paulo", "Paris", "Londrina"])
+
+        self.assertEqual(favourites.filter("LON"), ["London", "Londrina"])
+        self.assertEqual(favourites.filter("lond"), ["London", "Londrina"])
+        self.assertEqual(favourites.filter("londo"), ["London"])
+        self.assertEqual(favourites.filter("pa"), ["São Paulo", "Paris"])
+        self.assertEqual(favourites.filter("sao "), ["São Paulo"])
+        self.assertEqual(len(favourites.filter("")), 4)
+
+    def test_add_and_remove_keep_the_filter(self):
+        """
+        Test that added and removed cities update the matches without filtering again,
+        and that spellings of the same city are stored once.
+        """
+        favourites = FavouritesList(["London"])
+        favourites.filter("on")
+
+        self.assertTrue(favourites.add("Boston"))
+        self.assertTrue(favourites.add("Paris"))
+        self.assertFalse(favourites.add("  boston "))
+        self.assertEqual(favourites.matches, ["London", "Boston"])
+        self.assertEqual(favourites.total, 3)
+
+        self.assertTrue(favourites.remove("LONDON"))
+        self.assertFalse(favourites.remove("London"))
+        self.assertEqual(favourites.matches, ["Boston"])
+        self.assertNotIn("London", favourites)
+
+    def test_window(self):
+        """
+        Test that only the requested slice of a long list of matches is returned.
+        """
+        favourites = FavouritesList(f"Site {number}" for number in range(5000))
+        favourites.filter("site 49")
+        self.assertEqual(len(favourites), 111)
+        self.assertEqual(favourites.window(110, 10), ["Site 4999"])
+
+    def test_format_conditions(self):
+        """
+        Test that the time fetched shows the date only for older weather.
+        """
+        fetched = datetime(2024, 5, 1, 9, 30).timestamp()
+        weather = ("London", 12.34, "light rain", "10d")
+
+        self.assertEqual(format_conditions(weather, fetched, now=fetched + 60), ("12.3°C", "light rain", "09:30"))
+        self.assertEqual(format_conditions(weather, fetched, now=fetched + 86400)[2], "01/05")
+        self.assertEqual(format_conditions(None, None), ("", "", ""))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,84 @@
+"""
+Unit tests for the ForecastTable class.
+"""
+import unittest
+from weather.forecast import ForecastTable
+from weather.api import parse_forecast
+
+# Midnight UTC on 1 January 2025
+MIDNIGHT = 1735689600
+
+def make_item(timestamp, temperature, description, humidity=50, wind=2.0, pop=0.0):
+    """
+    Build one three-hourly entry of a forecast response.
+    """
+    return {
+        "dt": timestamp,
+        "main": {"temp": temperature, "humidity": humidity},
+        "wind": {"speed": wind},
+        "pop": pop,
+        "weather": [{"description": description}],
+    }
+
+class TestForecastTable(unittest.TestCase):
+    """
+    Test cases for the ForecastTable class.
+    """
+    def setUp(self):
+        """
+        Build a response covering the afternoon of 1 January and all of 2 January (UTC).
+        """
+        self.response = {
+            "city": {"timezone": 0},
+            "list": [make_item(MIDNIGHT + 15 * 3600, 8, "rain")] + [
+                make_item(MIDNIGHT + 86400 + hour * 3600, 10 + hour // 3, "clear sky" if hour < 15 else "rain",
+                          humidity=40 + hour, wind=hour / 3, pop=hour / 30)
+                for hour in range(0, 24, 3)
+            ],
+        }
+
+    def test_daily_summaries(self):
+        """
+        Test that every sample of a day contributes to its summary.
+        """
+        table = ForecastTable.from_response(self.response)
+        summaries = table.daily_summaries(skip_today=False, now=MIDNIGHT)
+
+        self.assertEqual([summary.date for summary in summaries], ["01-01-2025", "02-01-2025"])
+        day = summaries[1]
+        self.assertEqual((day.min_temperature, day.max_temperature), (10, 17))
+        self.assertAlmostEqual(day.mean_temperature, 13.5)
+        self.assertAlmostEqual(day.mean_humidity, 50.5)
+        self.assertEqual(day.max_wind_speed, 7)
+        self.assertAlmostEqual(day.max_pop, 0.7)
+        self.assertEqual(day.description, "clear sky")
+        self.assertEqual(day.samples, 8)
+
+    def test_skip_today(self):
+        """
+        Test that the current local day is left out by default.
+        """
+        summaries = ForecastTable.from_response(self.response).daily_summaries(now=MIDNIGHT + 3600)
+        self.assertEqual([summary.date for summary in summaries], ["02-01-2025"])
+
+    def test_timezone_offset(self):
+        """
+        Test that days are bucketed in the local time of the location.
+        """
+        self.response["city"]["timezone"] = -10 * 3600
+        summaries = ForecastTable.from_response(self.response).daily_summaries(skip_today=False, now=MIDNIGHT)
+
+        # At UTC-10, the 00:00 to 09:00 UTC samples of 2 January fall on 1 January
+        self.assertEqual(summaries[0].date, "01-01-2025")
+        self.assertEqual(summaries[0].samples, 5)
+
+    def test_parse_forecast(self):
+        """
+        Test that parse_forecast returns the mean temperature and dominant description per day.
+        """
+        forecast = parse_forecast(self.response)
+        self.assertAlmostEqual(forecast["02-01-2025"][0], 13.5)
+        self.assertEqual(forecast["02-01-2025"][1], "clear sky")
+
+if __name__ == "__main__":
+    unittest.main()
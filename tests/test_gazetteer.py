@@ -0,0 +1,65 @@
+"""
+Unit tests for the Gazetteer class.
+"""
+import tempfile
+import unittest
+from pathlib import Path
+from weather.gazetteer import Gazetteer
+
+CITIES = """# name	country	latitude	longitude	population
+London	GB	51.5085	-0.1257	8961989
+London	CA	42.9834	-81.233	422324
+Londonderry	GB	54.9977	-7.3086	83652
+Los Angeles	US	34.0522	-118.2437	3971883
+São Paulo	BR	-23.5475	-46.6361	10021295
+"""
+
+class TestGazetteer(unittest.TestCase):
+    """
+    Test cases for the Gazetteer class.
+    """
+    def setUp(self):
+        """
+        Write a small city list to a temporary file.
+        """
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.path = Path(temp_dir.name) / "cities.tsv"
+        self.path.write_text(CITIES, encoding="utf-8")
+
+    def test_loaded_lazily(self):
+        """
+        Test that the file is only read on the first lookup, and a missing one is empty.
+        """
+        gazetteer = Gazetteer(path=str(self.path))
+        self.assertFalse(gazetteer.loaded)
+        self.assertEqual(len(gazetteer), 5)
+        self.assertTrue(gazetteer.loaded)
+        self.assertEqual(Gazetteer(path=str(self.path.with_name("missing.tsv"))).suggest("lo"), [])
+
+    def test_suggest_by_prefix(self):
+        """
+        Test that suggestions match the prefix, most populous first, and can be narrowed by country.
+        """
+        gazetteer = Gazetteer(path=str(self.path))
+
+        self.assertEqual(gazetteer.suggest("LON"), ["London, GB", "London, CA", "Londonderry, GB"])
+        self.assertEqual(gazetteer.suggest("lo", limit=2), ["London, GB", "Los Angeles, US"])
+        self.assertEqual(gazetteer.suggest("london, g"), ["London, GB", "Londonderry, GB"])
+        self.assertEqual(gazetteer.suggest("sao"), ["São Paulo, BR"])
+        self.assertEqual(gazetteer.suggest("  "), [])
+
+    def test_resolve_exact_name(self):
+        """
+        Test that only exact names resolve, to the most populous city unless a country is given.
+        """
+        gazetteer = Gazetteer(path=str(self.path))
+
+        self.assertEqual(gazetteer.resolve("london"), (51.5085, -0.1257))
+        self.assertEqual(gazetteer.resolve("London, CA"), (42.9834, -81.233))
+        self.assertEqual(gazetteer.resolve("Sao Paulo"), (-23.5475, -46.6361))
+        self.assertIsNone(gazetteer.resolve("Lond"))
+        self.assertIsNone(gazetteer.resolve("London, US"))
+
+if __name__ == "__main__":
+    unittest.main()
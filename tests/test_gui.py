@@ -2,19 +2,48 @@
 Unit tests for the GUI.
 """
 import unittest
+import tempfile
 from unittest.mock import patch
 from tkinter import Tk
 from weather.gui import Weather
+from weather.api import WeatherAPI
+from weather.ratelimit import UsageCounter
+from weather.history import History
+from weather.gazetteer import Gazetteer
+from weather.data import FavouritesStore
+from weather.favourites import FavouritesPanel
+from weather.profiling import SessionProfiler
 import time
 
+ICON_DATA = b"R0lGODlhAQABAIAAAAAAAP///ywAAAAAAQABAAACAUwAOw=="
+
+def make_report(weather):
+    """
+    Build the report WeatherAPI.get_location_report returns for the given weather.
+    """
+    icon_data = ICON_DATA if weather else None
+    return {"weather": weather, "icon_data": icon_data, "forecast": {}, "errors": {}}
+
 class TestWeatherGUI(unittest.TestCase):
     """
     Test cases for the GUI.
     """
     def setUp(self):
         """
-        Set up the test environment.
+        Set up the test environment, with the history and API usage counter backed by
+        a temporary directory.
         """
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        usage = UsageCounter(path=f"{temp_dir.name}/usage.json")
+        self.addCleanup(usage.flush)
+        for patcher in (
+            patch("weather.gui.get_coordinates_from_city", return_value=(30.27, -97.74)),
+            patch("weather.gui.history", History(directory=temp_dir.name)),
+            patch.object(WeatherAPI, "usage", usage),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
         self.root = Tk()
         self.app = Weather(self.root)
 
@@ -22,34 +51,207 @@ class TestWeatherGUI(unittest.TestCase):
         """
         Clean up the test environment.
         """
+        self.app.runner.shutdown()
         self.root.update_idletasks()
         self.root.destroy()
         time.sleep(0.1)
 
-    @patch("weather.gui.WeatherAPI.get_weather")
-    def test_show_weather_success(self, mock_get_weather):
+    def wait_for_lookup(self):
+        """
+        Run the event loop until the background lookup has been displayed.
+        """
+        deadline = time.time() + 5
+        while self.app.runner.is_pending("lookup") and time.time() < deadline:
+            self.root.update()
+            time.sleep(0.01)
+
+    @patch("weather.gui.WeatherAPI.get_location_report")
+    def test_show_weather_success(self, mock_get_report):
         """
         Test the show_weather method with a successful API response.
         """
         # Simulate the API response
-        image_data = b"R0lGODlhAQABAIAAAAAAAP///ywAAAAAAQABAAACAUwAOw=="
-        mock_get_weather.return_value = ("Austin", 34, "clear sky", image_data)
+        mock_get_report.return_value = make_report(("Austin", 34, "clear sky", "01d"))
         self.app.input_city.insert(0, "Austin")
         self.app.show_weather()
-        
+        self.assertEqual(self.app.weather_info.get(), "Loading...")
+        self.wait_for_lookup()
+
         self.assertIn("Austin", self.app.weather_info.get())
 
-    @patch("weather.gui.WeatherAPI.get_weather")
-    def test_show_weather_failure(self, mock_get_weather):
+    @patch("weather.gui.WeatherAPI.get_location_report")
+    def test_icon_image_reused(self, mock_get_report):
+        """
+        Test that each weather icon is only decoded once.
+        """
+        mock_get_report.return_value = make_report(("Austin", 34, "clear sky", "01d"))
+        self.app.input_latitude.insert(0, "30.27")
+        self.app.input_longitude.insert(0, "-97.74")
+        self.app.show_weather()
+        self.wait_for_lookup()
+        first_image = self.app.icon_images["01d"]
+        self.app.show_weather()
+        self.wait_for_lookup()
+
+        self.assertIs(self.app.icon_images["01d"], first_image)
+
+    @patch("weather.gui.WeatherAPI.get_location_report")
+    def test_newer_lookup_wins(self, mock_get_report):
+        """
+        Test that a superseded lookup never overwrites the result of a newer one.
+        """
+        def slow_report(latitude, longitude):
+            if latitude == 1:
+                time.sleep(0.3)
+                return make_report(("Old Town", 10, "rain", "10d"))
+            return make_report(("New Town", 20, "clear sky", "01d"))
+
+        mock_get_report.side_effect = slow_report
+        self.app.input_latitude.insert(0, "1")
+        self.app.input_longitude.insert(0, "1")
+        self.app.show_weather()
+        self.app.input_latitude.delete(0, "end")
+        self.app.input_latitude.insert(0, "2")
+        self.app.show_weather()
+        self.wait_for_lookup()
+        time.sleep(0.4)
+        self.root.update()
+
+        self.assertIn("New Town", self.app.weather_info.get())
+
+    @patch("weather.gui.WeatherAPI.get_location_report")
+    def test_show_weather_failure(self, mock_get_report):
         """
         Test the show_weather method with a failed API response.
         """
         # Simulate an API failure
-        mock_get_weather.return_value = None
+        mock_get_report.return_value = make_report(None)
         self.app.input_city.insert(0, "City")
         self.app.show_weather()
+        self.wait_for_lookup()
         
         self.assertEqual(self.app.weather_info.get(), "An unexpected error occurred. Please try again later.")
 
+    def test_city_suggestions(self):
+        """
+        Test that cities from the gazetteer are suggested as a name is typed.
+        """
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = f"{temp_dir}/cities.tsv"
+            with open(path, "w") as file:
+                file.write("London\tGB\t51.5085\t-0.1257\t8961989\nLondon\tCA\t42.9834\t-81.233\t422324\n")
+            with patch("weather.gui.gazetteer", Gazetteer(path=path)):
+                self.app.input_city.insert(0, "lon")
+                self.app.suggest_cities()
+                deadline = time.time() + 5
+                while self.app.runner.is_pending("suggest") and time.time() < deadline:
+                    self.root.update()
+                    time.sleep(0.01)
+
+        self.assertEqual(list(self.app.input_city["values"]), ["London, GB", "London, CA"])
+
+    def test_speculation_skipped_for_repeated_input(self):
+        """
+        Test that a stable city is prefetched once, and that showing the weather
+        abandons the speculation.
+        """
+        with patch.object(self.app.speculator, "prefetch", return_value="fetched") as mock_prefetch:
+            self.app.input_city.insert(0, "Austin")
+            self.app.speculate()
+            self.app.speculate()
+            deadline = time.time() + 5
+            while self.app.runner.is_pending("speculate") and time.time() < deadline:
+                self.root.update()
+                time.sleep(0.01)
+        self.assertEqual(mock_prefetch.call_count, 1)
+        self.assertEqual(mock_prefetch.call_args.args[1:], ("Austin", None, None))
+
+        self.app.schedule_speculation()
+        self.app.show_weather()
+        self.assertIsNone(self.app._speculation_timer)
+        self.assertFalse(self.app.runner.is_pending("speculate"))
+
+    @patch("weather.gui.WeatherAPI.get_location_report")
+    def test_typed_coordinates_not_stored_for_favourite(self, mock_get_report):
+        """
+        Test that a lookup of typed coordinates leaves the favourite named in the city field alone.
+        """
+        mock_get_report.return_value = make_report(("Somewhere", 20, "clear sky", "01d"))
+        with tempfile.TemporaryDirectory() as temp_dir:
+            store = FavouritesStore(path=f"{temp_dir}/favourites.db", legacy_path=f"{temp_dir}/favourites.txt")
+            self.addCleanup(store.close)
+            store.add("St. Louis", 38.63, -90.2)
+            with patch("weather.gui.favourites_store", store):
+                self.app.fetch_weather("St. Louis", 10.0, 20.0)
+                self.assertIsNone(store.get("St. Louis").last_data)
+                self.app.fetch_weather("St. Louis", 38.63, -90.2)
+                self.assertEqual(store.get("St. Louis").last_data["weather"][0], "Somewhere")
+
+    def test_no_favourites_keeps_weather(self):
+        """
+        Test that having no favourites is shown in the favourites panel, not over the weather.
+        """
+        self.app.weather_info.set("The current temperature in Austin is 30.0°C / 86.0°F.")
+        self.app.show_favourite_cities([], None)
+
+        self.assertEqual(self.app.weather_info.get(), "The current temperature in Austin is 30.0°C / 86.0°F.")
+        self.assertEqual(self.app.favourites.count.get(), "No saved cities available.")
+
+    def test_favourites_panel_is_virtual(self):
+        """
+        Test that the favourites panel only renders its visible rows, with the stored
+        weather, and is filtered and updated in place.
+        """
+        with tempfile.TemporaryDirectory() as temp_dir:
+            store = FavouritesStore(path=f"{temp_dir}/favourites.db", legacy_path=f"{temp_dir}/favourites.txt")
+            self.addCleanup(store.close)
+            store.add("Site 1")
+            store.set_data("Site 1", {"weather": ["Site 1", 12.0, "rain", "10d"]})
+            selected = []
+            panel = FavouritesPanel(self.root, on_select=selected.append, on_remove=lambda city: None,
+                                    store=store, rows=5)
+            panel.set_names([f"Site {number}" for number in range(1, 3001)])
+
+            self.assertEqual(len(panel.table.get_children()), 5)
+            self.assertEqual(panel.table.item(panel.table.get_children()[0], "values")[:3], ("Site 1", "12.0°C", "rain"))
+
+            panel.yview("moveto", "0.5")
+            self.assertEqual(panel.table.item(panel.table.get_children()[0], "values")[0], "Site 1501")
+
+            panel.search.insert(0, "site 300")
+            panel.apply_filter()
+            panel.add("Site 3001")
+            panel.remove("Site 300")
+            names = [panel.table.item(item, "values")[0] for item in panel.table.get_children()]
+            self.assertEqual(names, ["Site 3000", "Site 3001"])
+            self.assertEqual(panel.selected, "Site 3001")
+            panel._open()
+            self.assertEqual(selected, ["Site 3001"])
+
+            # Saving an existing favourite again scrolls back to it rather than to the end
+            panel.search.delete(0, "end")
+            panel.apply_filter()
+            panel.yview("moveto", "0.5")
+            panel.add("site 2")
+            self.assertEqual(panel.selected, "Site 2")
+            self.assertEqual(panel.offset, 1)
+
+    @patch("weather.gui.WeatherAPI.get_location_report")
+    def test_lookup_profiled(self, mock_get_report):
+        """
+        Test that with profiling on, a lookup's fetching and rendering are profiled together.
+        """
+        mock_get_report.return_value = make_report(("Austin", 30, "clear sky", "01d"))
+        with tempfile.TemporaryDirectory() as temp_dir:
+            self.app.profiler = SessionProfiler(directory=temp_dir)
+            self.app.profiler.start()
+            self.app.input_city.insert(0, "Austin")
+            self.app.show_weather()
+            self.wait_for_lookup()
+            self.app.profiler.stop()
+
+            self.assertEqual(self.app.profiler.lookups[0]["label"], "Austin")
+            self.assertEqual(set(self.app.profiler.lookups[0]["stages"]), {"fetch", "render"})
+
 if __name__ == "__main__":
     unittest.main()
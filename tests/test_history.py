@@ -0,0 +1,76 @@
+"""
+Unit tests for the History class.
+"""
+import os
+import time
+import tempfile
+import unittest
+from weather.history import History, WEATHER_DEDUPE_WINDOW
+
+class TestHistory(unittest.TestCase):
+    """
+    Test cases for the History class.
+    """
+    def setUp(self):
+        """
+        Set up a history backed by a temporary directory.
+        """
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.directory = temp_dir.name
+        self.history = History(directory=self.directory, compact_rows=4)
+
+    def test_time_range_query(self):
+        """
+        Test that observations are returned by time range, across the log and the segment.
+        """
+        start = int(time.time()) - 100 * 3600
+        for hour in range(10):
+            self.history.record_weather(51.5, -0.12, ("London", 10.0 + hour, "clear sky", "01d"), start + hour * 3600)
+
+        self.assertTrue(os.path.exists(os.path.join(self.directory, "+51.5000_-0.1200.observations.seg")))
+        observations = self.history.observations(51.5, -0.12, start + 2 * 3600, start + 5 * 3600)
+        self.assertEqual(list(observations["temperature"]), [12.0, 13.0, 14.0, 15.0])
+        self.assertEqual(observations["city"], ["London"] * 4)
+        self.assertEqual(len(self.history.observations(51.5, -0.12)["timestamp"]), 10)
+
+    def test_repeated_observation_skipped(self):
+        """
+        Test that the same cached weather looked up again is only recorded once.
+        """
+        now = time.time()
+        weather = ("Paris", 15.0, "mist", "50d")
+
+        self.assertTrue(self.history.record_weather(48.85, 2.35, weather, now))
+        self.assertFalse(self.history.record_weather(48.85, 2.35, weather, now + 60))
+        self.assertTrue(self.history.record_weather(48.85, 2.35, weather, now + WEATHER_DEDUPE_WINDOW))
+
+    def test_latest_and_most_recent_location(self):
+        """
+        Test that the last known weather and forecast are read back without a network call.
+        """
+        self.history.record_weather(1, 2, ("Somewhere", 20.5, "rain", "10n"), 1000)
+        self.history.record_forecast(1, 2, {"01-01-2030": (4.0, "snow"), "02-01-2030": (5.0, "rain")}, 1000)
+        self.history.record_forecast(1, 2, {"02-01-2030": (6.0, "sun")}, 100000)
+
+        self.assertEqual(self.history.latest_weather(1, 2), (1000, ("Somewhere", 20.5, "rain", "10n")))
+        self.assertEqual(self.history.latest_forecast(1, 2), (100000, {"02-01-2030": (6.0, "sun")}))
+        self.assertEqual(self.history.most_recent_location(), (1.0, 2.0))
+        self.assertIsNone(self.history.latest_weather(3, 4))
+
+    def test_retention(self):
+        """
+        Test that compaction drops observations older than the retention period.
+        """
+        history = History(directory=self.directory, retention=3600)
+        now = int(time.time())
+        history.record_weather(0, 0, ("Old", 1.0, "fog", "50n"), now - 7200)
+        history.record_weather(0, 0, ("New", 2.0, "fog", "50n"), now)
+
+        history.compact()
+
+        self.assertEqual(history.observations(0, 0)["city"], ["New"])
+        self.assertEqual(os.path.getsize(os.path.join(self.directory, "+0.0000_+0.0000.observations.log")), 0)
+
+if __name__ == "__main__":
+    unittest.main()
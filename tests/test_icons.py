@@ -0,0 +1,67 @@
+"""
+Unit tests for the IconStore class.
+"""
+import os
+import unittest
+import tempfile
+from unittest.mock import Mock
+from weather.icons import IconStore, ICON_CODES
+
+class TestIconStore(unittest.TestCase):
+    """
+    Test cases for the IconStore class.
+    """
+    def setUp(self):
+        """
+        Set up a store backed by a temporary directory.
+        """
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.directory = temp_dir.name
+        self.store = IconStore(directory=self.directory)
+
+    def test_get_downloads_once(self):
+        """
+        Test that an icon is downloaded once and then served from memory.
+        """
+        download = Mock(return_value=b"png")
+
+        self.assertEqual(self.store.get("01d", download), b"png")
+        self.assertEqual(self.store.get("01d", download), b"png")
+        download.assert_called_once_with("01d")
+
+    def test_get_reads_from_disk(self):
+        """
+        Test that icons saved by one store are reused by another without downloading.
+        """
+        self.store.get("10n", Mock(return_value=b"png"))
+        self.assertTrue(os.path.exists(os.path.join(self.directory, "10n.png")))
+
+        download = Mock()
+        self.assertEqual(IconStore(directory=self.directory).get("10n", download), b"png")
+        download.assert_not_called()
+
+    def test_get_rejects_invalid_code(self):
+        """
+        Test that codes which are not OpenWeatherMap icon codes are rejected.
+        """
+        with self.assertRaises(ValueError):
+            self.store.get("../secret", Mock())
+
+    def test_prefetch_loads_every_icon(self):
+        """
+        Test that prefetching loads every known icon and survives download failures.
+        """
+        def download_icon(icon_code):
+            if icon_code == "50n":
+                raise OSError("Failed download.")
+            return icon_code.encode()
+
+        download = Mock(side_effect=download_icon)
+        self.store.prefetch(download).join()
+
+        self.assertEqual(self.store.get("01d", Mock()), b"01d")
+        self.assertEqual(download.call_count, len(ICON_CODES))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,118 @@
+"""
+Unit tests for the metrics registry and the instrumentation of WeatherAPI.
+"""
+import json
+import tempfile
+import unittest
+from unittest.mock import patch, Mock
+from weather.api import WeatherAPI
+from weather.cache import ResponseCache
+from weather.spatial import SpatialIndex
+from weather.providers import ProviderChain, OpenWeatherMapProvider
+from weather.metrics import Registry
+from weather.ratelimit import TokenBucket, CircuitBreaker, UsageCounter
+
+class TestRegistry(unittest.TestCase):
+    """
+    Test cases for the Registry class.
+    """
+    def test_disabled_records_nothing(self):
+        """
+        Test that a disabled registry hands out a shared no-op span and records nothing.
+        """
+        registry = Registry()
+
+        self.assertIs(registry.span("stage_seconds", stage="a"), registry.span("stage_seconds", stage="b"))
+        with registry.span("stage_seconds", stage="a"):
+            registry.increment("requests_total")
+        self.assertEqual(registry.snapshot(), {"counters": [], "histograms": []})
+
+    def test_span_records_duration_and_errors(self):
+        """
+        Test that a span records its duration, and counts the exception that ended it.
+        """
+        registry = Registry(enabled=True)
+
+        with registry.span("stage_seconds", stage="geocode"):
+            pass
+        with self.assertRaises(KeyError):
+            with registry.span("stage_seconds", stage="geocode"):
+                raise KeyError("lat")
+
+        snapshot = registry.snapshot()
+        histogram = snapshot["histograms"][0]
+        self.assertEqual(histogram["labels"], {"stage": "geocode"})
+        self.assertEqual(histogram["value"]["count"], 2)
+        self.assertEqual(histogram["value"]["buckets"]["+Inf"], 2)
+        self.assertEqual(snapshot["counters"], [{
+            "name": "stage_seconds_errors_total", "labels": {"error": "KeyError", "stage": "geocode"}, "value": 1,
+        }])
+
+    def test_prometheus_format(self):
+        """
+        Test the Prometheus text exposition of counters and histograms.
+        """
+        registry = Registry(enabled=True)
+        registry.increment("http_requests_total", kind="api", status="200")
+        registry.increment("http_requests_total", kind="api", status="200")
+        registry.observe("stage_seconds", 0.02, stage="weather")
+
+        lines = registry.to_prometheus().splitlines()
+        self.assertIn("# TYPE weather_http_requests_total counter", lines)
+        self.assertIn('weather_http_requests_total{kind="api",status="200"} 2', lines)
+        self.assertIn("# TYPE weather_stage_seconds histogram", lines)
+        self.assertIn('weather_stage_seconds_bucket{le="0.01",stage="weather"} 0', lines)
+        self.assertIn('weather_stage_seconds_bucket{le="0.025",stage="weather"} 1', lines)
+        self.assertIn('weather_stage_seconds_count{stage="weather"} 1', lines)
+
+class TestInstrumentation(unittest.TestCase):
+    """
+    Test cases for the metrics recorded by WeatherAPI.
+    """
+    def setUp(self):
+        """
+        Record into a fresh registry, with fresh shared WeatherAPI state.
+        """
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.registry = Registry(enabled=True)
+        usage = UsageCounter(path=f"{temp_dir.name}/usage.json")
+        self.addCleanup(usage.flush)
+        for patcher in (
+            patch("weather.api.metrics", self.registry),
+            patch.object(WeatherAPI, "cache", ResponseCache()),
+            patch.object(WeatherAPI, "nearby", SpatialIndex()),
+            patch.object(WeatherAPI, "providers", ProviderChain([OpenWeatherMapProvider()])),
+            patch.object(WeatherAPI, "rate_limiter", TokenBucket(rate=1000, capacity=1000)),
+            patch.object(WeatherAPI, "circuit_breaker", CircuitBreaker()),
+            patch.object(WeatherAPI, "usage", usage),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    @patch("weather.api.requests.Session.get")
+    def test_requests_and_cache_counted(self, mock_get):
+        """
+        Test that requests, bytes and cache lookups are counted and the stage is timed.
+        """
+        body = {"name": "Paris", "main": {"temp": 15}, "weather": [{"description": "mist", "icon": "50d"}]}
+        mock_get.return_value = Mock(status_code=200, content=json.dumps(body).encode())
+        mock_get.return_value.json.return_value = body
+
+        api = WeatherAPI()
+        api.fetch_weather(48.85, 2.35)
+        api.fetch_weather(48.85, 2.35)
+
+        counters = {
+            (series["name"], tuple(sorted(series["labels"].items()))): series["value"]
+            for series in self.registry.snapshot()["counters"]
+        }
+        self.assertEqual(counters[("http_requests_total", (("kind", "api"), ("status", "200")))], 1)
+        self.assertEqual(counters[("http_response_bytes_total", (("kind", "api"),))], len(json.dumps(body)))
+        self.assertEqual(counters[("cache_lookups_total", (("endpoint", "weather"), ("result", "miss")))], 1)
+        self.assertEqual(counters[("cache_lookups_total", (("endpoint", "weather"), ("result", "hit")))], 1)
+        stages = [series for series in self.registry.snapshot()["histograms"] if series["name"] == "stage_seconds"]
+        self.assertEqual(stages[0]["value"]["count"], 2)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,61 @@
+"""
+Unit tests for the Speculator class.
+"""
+import unittest
+from unittest.mock import patch, Mock
+from weather.prefetch import Speculator
+
+class TestSpeculator(unittest.TestCase):
+    """
+    Test cases for the Speculator class.
+    """
+    def setUp(self):
+        """
+        Give each test a fake API whose locations are never cached.
+        """
+        self.api = Mock()
+        self.api.is_cached.return_value = False
+        self.speculator = Speculator(api_factory=lambda: self.api, per_minute=2)
+
+    @patch("weather.prefetch.get_coordinates_from_city")
+    @patch("weather.prefetch.cached_coordinates", return_value=(51.5, -0.12))
+    def test_offline_city_fetched_within_budget(self, mock_cached, mock_geocode):
+        """
+        Test that a city known offline is not geocoded online, and that lookups stop
+        once the budget is spent.
+        """
+        outcomes = [self.speculator.prefetch(self.speculator.start(), "London", None, None) for _ in range(3)]
+
+        self.assertEqual(outcomes, ["fetched", "fetched", "limited"])
+        mock_geocode.assert_not_called()
+        self.api.get_location_report.assert_called_with(51.5, -0.12)
+        self.assertEqual(self.api.get_location_report.call_count, 2)
+
+    def test_cached_location_costs_nothing(self):
+        """
+        Test that a cached location is neither fetched nor charged to the budget.
+        """
+        self.api.is_cached.return_value = True
+        for _ in range(3):
+            self.assertEqual(self.speculator.prefetch(self.speculator.start(), "", 1.0, 2.0), "cached")
+        self.api.get_location_report.assert_not_called()
+        self.assertTrue(self.speculator.budget.try_acquire())
+
+    @patch("weather.prefetch.cached_coordinates", return_value=None)
+    def test_superseded_speculation_stops(self, mock_cached):
+        """
+        Test that a speculation superseded while geocoding sends no further requests,
+        and that an unknown city is not fetched.
+        """
+        def geocode(city):
+            self.speculator.cancel()
+            return (1.0, 2.0)
+
+        with patch("weather.prefetch.get_coordinates_from_city", side_effect=geocode):
+            self.assertEqual(self.speculator.prefetch(self.speculator.start(), "Paris", None, None), "cancelled")
+        with patch("weather.prefetch.get_coordinates_from_city", return_value=(None, None)):
+            self.assertEqual(self.speculator.prefetch(self.speculator.start(), "Nowhere", None, None), "not_found")
+        self.api.get_location_report.assert_not_called()
+
+if __name__ == "__main__":
+    unittest.main()
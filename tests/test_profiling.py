@@ -0,0 +1,99 @@
+"""
+Unit tests for the session profiler.
+"""
+import json
+import pstats
+import unittest
+import tempfile
+import tracemalloc
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from weather.profiling import SessionProfiler, carry, format_size
+
+# Kept alive between lookups, like a cache that is never emptied
+retained = []
+
+def allocate(count):
+    """Allocates some memory that outlives the call, and spends a little time."""
+    retained.append([str(number) for number in range(count)])
+    return sum(len(text) for text in retained[-1])
+
+class TestSessionProfiler(unittest.TestCase):
+    """
+    Test cases for the SessionProfiler class.
+    """
+    def setUp(self):
+        """
+        Profile into a temporary directory, stopping the allocation tracing afterwards.
+        """
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.directory = Path(temp_dir.name)
+        self.profiler = SessionProfiler(directory=temp_dir.name, top=5)
+        self.profiler.start()
+        self.addCleanup(self.profiler.stop)
+        self.addCleanup(retained.clear)
+
+    def test_lookups_profiled_and_summarised(self):
+        """
+        Test that each lookup's stages are profiled together, its snapshot is written,
+        and the memory it kept shows up in the summary.
+        """
+        for label in ("London", "Paris"):
+            capture = self.profiler.begin(label)
+            fetch = capture.wrap("fetch", allocate)
+            render = capture.wrap("render", lambda result: result, finish=True)
+            render(fetch(20000))
+        # Waits for the lookups to be summarised in the background
+        self.profiler.stop()
+
+        self.assertFalse(tracemalloc.is_tracing())
+        for name in ("lookup-001.prof", "lookup-002.prof", "lookup-001.snapshot", "summary.txt"):
+            self.assertTrue((self.directory / name).exists(), name)
+        functions = {name for _, _, name in pstats.Stats(str(self.directory / "lookup-002.prof")).stats}
+        self.assertIn("allocate", functions)
+
+        summary = json.loads((self.directory / "summary.json").read_text())["lookups"]
+        self.assertEqual([lookup["label"] for lookup in summary], ["London", "Paris"])
+        self.assertEqual(set(summary[1]["stages"]), {"fetch", "render"})
+        self.assertGreater(summary[1]["memory"]["growth_bytes"], 500000)
+        self.assertTrue(any("test_profiling.py" in line["line"] for line in summary[1]["growth"]))
+
+        text = (self.directory / "summary.txt").read_text(encoding="utf-8")
+        self.assertIn("Lookup 2: Paris", text)
+        self.assertIn("Memory kept from lookup 1 to lookup 2", text)
+
+    def test_nested_stages_only_timed(self):
+        """
+        Test that a stage started while another is being profiled is timed but not profiled.
+        """
+        outer, inner = self.profiler.begin("outer"), self.profiler.begin("inner")
+        with outer.stage("fetch"):
+            with inner.stage("fetch"):
+                allocate(10)
+        self.assertIsNone(inner.stats())
+        self.assertIn("fetch", inner.stages)
+        self.assertIsNotNone(outer.stats())
+
+    def test_pool_work_profiled(self):
+        """
+        Test that work a stage hands to a thread pool through carry() is in its profile.
+        """
+        capture = self.profiler.begin("London")
+        with ThreadPoolExecutor(max_workers=2) as executor, capture.stage("fetch"):
+            executor.submit(carry(allocate), 1000).result()
+        functions = {name for _, _, name in capture.stats().stats}
+
+        self.assertIn("allocate", functions)
+        self.assertEqual(list(capture.stages), ["fetch"])
+
+    def test_format_size(self):
+        """
+        Test that sizes are shown in the largest fitting unit, signed for growth.
+        """
+        self.assertEqual(format_size(512), "512 B")
+        self.assertEqual(format_size(1536, signed=True), "+1.5 KiB")
+        self.assertEqual(format_size(-3 * 1024 ** 2, signed=True), "-3.0 MiB")
+
+if __name__ == "__main__":
+    unittest.main()
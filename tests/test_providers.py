@@ -0,0 +1,167 @@
+"""
+Unit tests for the providers and the provider chain, run against local stub servers.
+"""
+import time
+import tempfile
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+from weather.api import WeatherAPI, parse_weather, parse_daily_forecast
+from weather.cache import ResponseCache
+from weather.spatial import SpatialIndex
+from weather.providers import ProviderChain, OpenWeatherMapProvider, OpenMeteoProvider
+from weather.ratelimit import TokenBucket, RetryPolicy, CircuitBreaker, UsageCounter
+from tests.stub_server import StubServer
+
+class TestProviderChain(unittest.TestCase):
+    """
+    Test cases for hedging and failover between providers.
+    """
+    def setUp(self):
+        """
+        Start a primary and a backup stub server, and give WeatherAPI fresh shared state.
+        """
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        usage = UsageCounter(path=f"{temp_dir.name}/usage.json")
+        self.addCleanup(usage.flush)
+        for name, value in {
+            "cache": ResponseCache(),
+            "nearby": SpatialIndex(),
+            "rate_limiter": TokenBucket(rate=1000, capacity=1000),
+            "retry_policy": RetryPolicy(max_retries=1, base_delay=0),
+            "circuit_breaker": CircuitBreaker(),
+            "usage": usage,
+        }.items():
+            patcher = patch.object(WeatherAPI, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.primary = StubServer()
+        self.backup = StubServer()
+        for server in (self.primary, self.backup):
+            server.start()
+            self.addCleanup(server.stop)
+        self.chain = ProviderChain(
+            [OpenWeatherMapProvider(self.primary.url), OpenWeatherMapProvider(self.backup.url, name="backup")],
+            min_samples=3, min_delay=0.05,
+        )
+        self.api = WeatherAPI(providers=self.chain)
+
+    def test_failover(self):
+        """
+        Test that the backup answers when the primary keeps failing.
+        """
+        self.primary.error_rate = 1
+
+        self.assertEqual(self.api.fetch_weather(51.5, -0.12)[1], 20.5)
+        self.assertEqual(self.primary.requests["/data/2.5/weather"], 2)
+        self.assertEqual(self.backup.requests["/data/2.5/weather"], 1)
+
+    def test_slow_request_hedged(self):
+        """
+        Test that a request slower than usual is duplicated, and the first answer wins.
+        """
+        for _ in range(3):
+            self.chain.providers[0].latency.record(0.01)
+        self.primary.latency = 0.6
+
+        start = time.perf_counter()
+        self.assertEqual(self.api.fetch_weather(51.5, -0.12)[1], 20.5)
+
+        self.assertLess(time.perf_counter() - start, 0.5)
+        self.assertEqual(self.backup.requests["/data/2.5/weather"], 1)
+        self.assertEqual(len(self.chain.providers[1].latency), 1)
+
+    def test_hedges_within_budget(self):
+        """
+        Test that once the hedge budget is spent, slow requests are no longer duplicated.
+        """
+        self.chain.hedge_budget = 0
+        for _ in range(3):
+            self.chain.providers[0].latency.record(0.01)
+        self.primary.latency = 0.2
+
+        for latitude in (-60, -20, 20, 60):
+            self.api.fetch_weather(latitude, -0.12)
+
+        self.assertEqual(self.backup.requests["/data/2.5/weather"], 3)
+        self.assertEqual(self.primary.requests["/data/2.5/weather"], 4)
+
+    def test_queued_time_not_hedged(self):
+        """
+        Test that the time a request waits for a free thread does not count towards hedging it.
+        """
+        for _ in range(3):
+            self.chain.providers[0].latency.record(0.01)
+        with ThreadPoolExecutor(max_workers=1) as executor, patch.object(ProviderChain, "_executor", executor):
+            executor.submit(time.sleep, 0.3)
+            self.api.fetch_weather(51.5, -0.12)
+
+        self.assertEqual(self.backup.requests["/data/2.5/weather"], 0)
+
+    def test_not_hedged_without_samples(self):
+        """
+        Test that nothing is hedged until the primary's response times are known.
+        """
+        self.assertIsNone(self.chain.hedge_delay())
+        self.api.fetch_weather(51.5, -0.12)
+
+        self.assertEqual(self.backup.requests["/data/2.5/weather"], 0)
+        self.assertEqual(len(self.chain.providers[0].latency), 1)
+
+    def test_unknown_provider_in_environment(self):
+        """
+        Test that an unknown provider name is an error, unless it may be left out.
+        """
+        with patch.dict("os.environ", {"WEATHER_PROVIDERS": "open-meteo,openweathermpa"}):
+            with self.assertRaises(ValueError):
+                ProviderChain.from_environment()
+            with self.assertLogs(level="WARNING"):
+                chain = ProviderChain.from_environment(strict=False)
+            self.assertEqual([type(provider) for provider in chain.providers], [OpenMeteoProvider])
+        with patch.dict("os.environ", {"WEATHER_PROVIDERS": "owm"}), self.assertLogs(level="WARNING"):
+            chain = ProviderChain.from_environment(strict=False)
+        self.assertEqual([type(provider) for provider in chain.providers], [OpenWeatherMapProvider])
+
+class TestOpenMeteoProvider(unittest.TestCase):
+    """
+    Test cases for the conversion of Open-Meteo responses.
+    """
+    def test_weather(self):
+        """
+        Test that current weather converts to the OpenWeatherMap format.
+        """
+        data = {"current": {"time": 1700000000, "temperature_2m": 7.5, "relative_humidity_2m": 80,
+                            "wind_speed_10m": 4.2, "weather_code": 61, "is_day": 0}}
+
+        converted = OpenMeteoProvider.to_weather(data, 51.5, -0.12)
+
+        self.assertEqual(parse_weather(converted), ("your selected location", 7.5, "light rain", "10n"))
+
+    def test_forecast(self):
+        """
+        Test that an hourly forecast converts to three-hourly OpenWeatherMap samples.
+        """
+        hours = range(0, 3 * 24 * 3600, 3600)
+        data = {
+            "utc_offset_seconds": 0,
+            "hourly": {
+                "time": [1700006400 + hour for hour in hours],
+                "temperature_2m": [10.0 for _ in hours],
+                "relative_humidity_2m": [70 for _ in hours],
+                "wind_speed_10m": [3.0 for _ in hours],
+                "precipitation_probability": [50 for _ in hours],
+                "weather_code": [3 for _ in hours],
+                "is_day": [1 for _ in hours],
+            },
+        }
+
+        converted = OpenMeteoProvider.to_forecast(data, 51.5, -0.12)
+        summaries = parse_daily_forecast(converted)
+
+        self.assertEqual(len(converted["list"]), 24)
+        self.assertEqual(converted["list"][0]["pop"], 0.5)
+        self.assertEqual(summaries[0].description, "overcast clouds")
+
+if __name__ == "__main__":
+    unittest.main()
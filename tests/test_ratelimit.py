@@ -0,0 +1,149 @@
+"""
+Unit tests for the rate limiting and failure handling classes.
+"""
+import json
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+from weather.ratelimit import TokenBucket, RetryPolicy, CircuitBreaker, CircuitOpenError, UsageCounter
+
+class FakeClock:
+    """
+    A clock that only moves when told to, or when something sleeps.
+    """
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+class TestTokenBucket(unittest.TestCase):
+    """
+    Test cases for the TokenBucket class.
+    """
+    def test_burst_then_throttle(self):
+        """
+        Test that a full bucket allows a burst and then spaces calls out.
+        """
+        clock = FakeClock()
+        bucket = TokenBucket(rate=2, capacity=3, clock=clock, sleep=clock.sleep)
+
+        waits = [bucket.acquire() for _ in range(5)]
+
+        self.assertEqual(waits[:3], [0, 0, 0])
+        self.assertAlmostEqual(waits[3], 0.5)
+        self.assertAlmostEqual(clock.now, 1.0)
+
+    def test_try_acquire_never_waits(self):
+        """
+        Test that try_acquire refuses when the bucket is empty, until it refills.
+        """
+        clock = FakeClock()
+        bucket = TokenBucket(rate=1, capacity=2, clock=clock, sleep=clock.sleep)
+
+        self.assertEqual([bucket.try_acquire() for _ in range(3)], [True, True, False])
+        clock.now = 1
+        self.assertTrue(bucket.try_acquire())
+        self.assertEqual(clock.now, 1)
+
+class TestRetryPolicy(unittest.TestCase):
+    """
+    Test cases for the RetryPolicy class.
+    """
+    def test_should_retry(self):
+        """
+        Test that only transient failures are retried, up to the limit.
+        """
+        policy = RetryPolicy(max_retries=2)
+        self.assertTrue(policy.should_retry(0, 429))
+        self.assertTrue(policy.should_retry(1, 503))
+        self.assertTrue(policy.should_retry(0))
+        self.assertFalse(policy.should_retry(0, 404))
+        self.assertFalse(policy.should_retry(2, 503))
+
+    def test_delay(self):
+        """
+        Test that Retry-After is honoured and backoff is capped.
+        """
+        policy = RetryPolicy(base_delay=1, max_delay=10)
+        self.assertEqual(policy.delay(0, "3"), 3)
+        self.assertEqual(policy.delay(0, "120"), 10)
+        self.assertEqual(policy.delay(0, "Wed, 21 Oct 2015 07:28:00 GMT"), 0)
+        for attempt in range(8):
+            self.assertLessEqual(policy.delay(attempt), min(10, 2 ** attempt))
+
+class TestCircuitBreaker(unittest.TestCase):
+    """
+    Test cases for the CircuitBreaker class.
+    """
+    def test_open_half_open_close(self):
+        """
+        Test that the breaker opens after repeated failures and closes after a successful trial.
+        """
+        clock = FakeClock()
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=30, clock=clock)
+        breaker.record_failure()
+        breaker.check()
+        breaker.record_failure()
+
+        self.assertEqual(breaker.state, "open")
+        with self.assertRaises(CircuitOpenError):
+            breaker.check()
+
+        clock.now = 30
+        self.assertEqual(breaker.state, "half-open")
+        breaker.check()
+        with self.assertRaises(CircuitOpenError):
+            breaker.check()
+        breaker.record_success()
+        self.assertEqual(breaker.state, "closed")
+
+    def test_failed_trial_reopens(self):
+        """
+        Test that a failed trial call keeps the breaker open for another period.
+        """
+        clock = FakeClock()
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30, clock=clock)
+        breaker.record_failure()
+        clock.now = 30
+        breaker.check()
+        breaker.record_failure()
+
+        self.assertEqual(breaker.state, "open")
+
+class TestUsageCounter(unittest.TestCase):
+    """
+    Test cases for the UsageCounter class.
+    """
+    def test_usage_persisted(self):
+        """
+        Test that calls are written to disk and read back by a new counter.
+        """
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = str(Path(temp_dir) / "usage.json")
+            counter = UsageCounter(path=path, monthly_limit=100, flush_every=2)
+            counter.record()
+            counter.record()
+            counter.record()
+            self.assertEqual(json.loads(Path(path).read_text())["calls"], 2)
+            counter.flush()
+
+            snapshot = UsageCounter(path=path, monthly_limit=100).snapshot()
+            self.assertEqual(snapshot["calls"], 3)
+            self.assertEqual(snapshot["remaining"], 97)
+
+    def test_counters_not_kept_until_exit(self):
+        """
+        Test that creating a counter does not register it to be flushed at exit.
+        """
+        with patch("atexit.register") as mock_register:
+            for _ in range(3):
+                UsageCounter(path="unused.json")
+        mock_register.assert_not_called()
+
+if __name__ == "__main__":
+    unittest.main()
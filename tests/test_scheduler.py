@@ -0,0 +1,155 @@
+"""
+Unit tests for the RefreshScheduler class.
+"""
+import tempfile
+import unittest
+from datetime import datetime, timezone
+from pathlib import Path
+from unittest.mock import Mock, patch
+from weather.data import FavouritesStore
+from weather.scheduler import RefreshScheduler, month_elapsed_fraction
+from weather.history import History
+
+class FakeClock:
+    """
+    A clock that only moves when told to.
+    """
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
+
+def make_report(temperature, description="clear sky"):
+    """
+    Build the report WeatherAPI.get_location_report returns.
+    """
+    return {
+        "weather": ("Dallas", temperature, description, "01d"),
+        "icon_data": b"icon",
+        "forecast": {"02-01-2025": (20.0, "clear sky")},
+        "errors": {},
+    }
+
+class TestRefreshScheduler(unittest.TestCase):
+    """
+    Test cases for the RefreshScheduler class.
+    """
+    def setUp(self):
+        """
+        Set up a favourites store with one city and a scheduler using a fake API.
+        """
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.store = FavouritesStore(path=str(Path(temp_dir.name) / "favourites.db"),
+                                     legacy_path=str(Path(temp_dir.name) / "favourites.txt"))
+        self.addCleanup(self.store.close)
+        self.store.add("Dallas", 32.78, -96.8)
+        patcher = patch("weather.scheduler.history", History(directory=temp_dir.name))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.api = Mock()
+        self.clock = FakeClock()
+        self.scheduler = RefreshScheduler(store=self.store, api_factory=lambda: self.api,
+                                          min_interval=100, max_interval=1000, clock=self.clock)
+        patcher = patch.object(RefreshScheduler, "budget_factor", return_value=1)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_prefetch_stores_data(self):
+        """
+        Test that a newly added favourite is fetched at once and its data stored.
+        """
+        self.api.get_location_report.return_value = make_report(30)
+        self.scheduler.add("Dallas")
+
+        self.assertEqual(self.scheduler.run_pending(), 100)
+        self.api.get_location_report.assert_called_once_with(32.78, -96.8)
+        self.assertEqual(self.store.get("Dallas").last_data["weather"][1], 30)
+
+    def test_interval_adapts_to_changes(self):
+        """
+        Test that the interval grows while the weather is steady and shrinks when it changes.
+        """
+        self.api.get_location_report.return_value = make_report(30)
+        self.scheduler.add("Dallas")
+        self.scheduler.run_pending()
+
+        self.clock.now = 100
+        self.scheduler.run_pending()
+        self.assertEqual(self.scheduler.interval("Dallas"), 150)
+
+        self.clock.now = 250
+        self.scheduler.run_pending()
+        self.assertEqual(self.scheduler.interval("Dallas"), 225)
+
+        self.api.get_location_report.return_value = make_report(25, "rain")
+        self.clock.now = 475
+        self.scheduler.run_pending()
+        self.assertEqual(self.scheduler.interval("Dallas"), 150)
+
+    def test_geocodes_missing_coordinates(self):
+        """
+        Test that a favourite without coordinates is geocoded once and the result stored.
+        """
+        self.store.add("Paris")
+        self.api.get_location_report.return_value = make_report(15)
+        with patch("weather.scheduler.get_coordinates_from_city", return_value=(48.85, 2.35)) as mock_geocode:
+            self.scheduler.add("Paris")
+            self.scheduler.run_pending()
+
+        mock_geocode.assert_called_once_with("Paris")
+        self.assertEqual(self.store.get("Paris").latitude, 48.85)
+
+    def test_removed_favourite_not_refreshed(self):
+        """
+        Test that a city removed from the favourites is dropped from the schedule.
+        """
+        self.scheduler.add("Dallas")
+        self.store.remove("Dallas")
+
+        self.assertIsNone(self.scheduler.run_pending())
+        self.api.get_location_report.assert_not_called()
+
+    def test_readded_favourite_refreshed_once(self):
+        """
+        Test that a city removed and added again keeps a single refresh schedule.
+        """
+        self.api.get_location_report.return_value = make_report(30.0)
+        self.scheduler.add("Dallas")
+        self.scheduler.run_pending()
+        self.scheduler.remove("Dallas")
+        self.scheduler.add("Dallas")
+
+        self.scheduler.run_pending()
+        self.assertEqual(self.api.get_location_report.call_count, 2)
+        self.clock.now = 1000
+        self.scheduler.run_pending()
+        self.assertEqual(self.api.get_location_report.call_count, 3)
+
+    def test_failed_refresh_rescheduled(self):
+        """
+        Test that a city whose refresh raises is backed off to the longest interval, not dropped.
+        """
+        self.api.get_location_report.return_value = make_report(30.0)
+        self.scheduler.add("Dallas")
+        with patch("weather.scheduler.history.record_weather", side_effect=OSError("disk full")):
+            with self.assertRaises(OSError):
+                self.scheduler.run_pending()
+
+        self.assertEqual(self.scheduler.interval("Dallas"), 1000)
+        self.assertEqual(self.scheduler.run_pending(), 1000)
+        self.clock.now = 1000
+        self.scheduler.run_pending()
+        self.assertEqual(self.api.get_location_report.call_count, 2)
+
+    def test_month_elapsed_fraction(self):
+        """
+        Test the share of the month that has passed.
+        """
+        self.assertEqual(month_elapsed_fraction(datetime(2025, 2, 1, tzinfo=timezone.utc)), 0)
+        self.assertAlmostEqual(month_elapsed_fraction(datetime(2025, 2, 15, tzinfo=timezone.utc)), 0.5)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,105 @@
+"""
+Unit tests for the HTTP service mode.
+"""
+import time
+import asyncio
+import threading
+import unittest
+import requests
+from unittest.mock import patch
+from aiohttp.test_utils import TestClient, TestServer
+from weather.api import WeatherAPI
+from weather.server import WeatherServer
+from weather.ratelimit import CircuitOpenError
+
+class TestWeatherServer(unittest.IsolatedAsyncioTestCase):
+    """
+    Test cases for the WeatherServer class.
+    """
+    async def asyncSetUp(self):
+        """
+        Start the server with fake upstream calls that count how often they run.
+        """
+        self.calls = 0
+        self.lock = threading.Lock()
+
+        def fetch_weather(latitude, longitude):
+            with self.lock:
+                self.calls += 1
+            time.sleep(0.1)
+            if latitude == 0:
+                raise requests.exceptions.ConnectionError("unreachable")
+            return "London", 12.5, "light rain", "10d"
+
+        def geocode_city(city):
+            if city == "Offline":
+                raise requests.exceptions.ConnectionError("unreachable")
+            if city == "Paused":
+                raise CircuitOpenError("The OpenWeatherMap API is unavailable; not calling it for now.")
+            return (51.5, -0.12) if city == "London" else (None, None)
+
+        for patcher in (
+            patch.object(WeatherAPI, "__init__", return_value=None),
+            patch.object(WeatherAPI, "get_session"),
+            patch.object(WeatherAPI, "fetch_weather", side_effect=fetch_weather),
+            patch.object(WeatherAPI, "fetch_forecast", return_value={"02-01-2030": (4.0, "snow")}),
+            patch("weather.server.geocode_city", side_effect=geocode_city),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        self.server = WeatherServer(api=WeatherAPI(), workers=4)
+        self.client = TestClient(TestServer(self.server.make_app()))
+        await self.client.start_server()
+
+    async def asyncTearDown(self):
+        await self.client.close()
+
+    async def test_concurrent_requests_coalesced(self):
+        """
+        Test that identical requests in flight at the same time share one upstream call.
+        """
+        responses = await asyncio.gather(*(
+            self.client.get("/weather", params={"lat": "51.5", "lon": "-0.12"}) for _ in range(20)
+        ))
+
+        bodies = [await response.json() for response in responses]
+        self.assertEqual({response.status for response in responses}, {200})
+        self.assertEqual(bodies[0]["city"], "London")
+        self.assertEqual(bodies[0]["icon"], "10d")
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(self.server.coalescer.coalesced, 19)
+
+    async def test_weather_by_city_and_forecast(self):
+        """
+        Test that a city is geocoded and its forecast returned as a list of days.
+        """
+        response = await self.client.get("/forecast", params={"city": "London"})
+        body = await response.json()
+
+        self.assertEqual(response.status, 200)
+        self.assertEqual(body["latitude"], 51.5)
+        self.assertEqual(body["forecast"], [{"date": "02-01-2030", "temperature": 4.0, "description": "snow"}])
+
+    async def test_errors(self):
+        """
+        Test the status codes of invalid queries, unknown cities and upstream failures,
+        including those of geocoding.
+        """
+        cases = [
+            ("/weather", {"lat": "north", "lon": "1"}, 400),
+            ("/weather", {"lat": "95", "lon": "1"}, 400),
+            ("/forecast", {}, 400),
+            ("/geocode", {"city": "Atlantis"}, 404),
+            ("/geocode", {"city": "Offline"}, 502),
+            ("/weather", {"city": "Paused"}, 503),
+            ("/weather", {"lat": "0", "lon": "1"}, 502),
+        ]
+        for path, params, status in cases:
+            with self.subTest(path=path, params=params):
+                response = await self.client.get(path, params=params)
+                self.assertEqual(response.status, status)
+                self.assertIn("error", await response.json())
+
+if __name__ == "__main__":
+    unittest.main()
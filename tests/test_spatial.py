@@ -0,0 +1,51 @@
+"""
+Unit tests for the geohash spatial index.
+"""
+import unittest
+from weather.spatial import SpatialIndex, geohash, normalise_coordinates, distance_km
+
+class TestSpatialIndex(unittest.TestCase):
+    """
+    Test cases for the SpatialIndex class and its helpers.
+    """
+    def test_geohash_and_normalisation(self):
+        """
+        Test geohash encoding and the canonical range of coordinates.
+        """
+        self.assertEqual(geohash(57.64911, 10.40744, 11), "u4pruydqqvj")
+        self.assertEqual(normalise_coordinates("51.5", 190), (51.5, -170.0))
+        self.assertAlmostEqual(distance_km(0, 0, 1, 0), 111.2, places=1)
+
+    def test_nearest_within_radius(self):
+        """
+        Test that the nearest point within the radius is found, across cell edges and
+        only within the same namespace.
+        """
+        index = SpatialIndex()
+        index.add("weather", 51.5074, -0.1278)
+        index.add("weather", 51.52, -0.10)
+        index.add("forecast", 51.5075, -0.1277)
+
+        self.assertEqual(index.nearest("weather", 51.5075, -0.1277, 1.0), (51.5074, -0.1278))
+        self.assertIsNone(index.nearest("weather", 51.6, -0.1277, 1.0))
+        # The two points straddle the edge of a geohash cell at the equator
+        index.add("weather", 0.0001, 0.0001)
+        self.assertEqual(index.nearest("weather", -0.0001, -0.0001, 1.0), (0.0001, 0.0001))
+
+    def test_remove_and_bounded_size(self):
+        """
+        Test that removed and evicted points are no longer found.
+        """
+        index = SpatialIndex(max_points=2)
+        index.add("weather", 10, 10)
+        index.add("weather", 20, 20)
+        index.add("weather", 30, 30)
+        index.remove("weather", 20, 20)
+
+        self.assertEqual(len(index), 1)
+        self.assertIsNone(index.nearest("weather", 10, 10, 1.0))
+        self.assertIsNone(index.nearest("weather", 20, 20, 1.0))
+        self.assertEqual(index.nearest("weather", 30, 30, 1.0), (30, 30))
+
+if __name__ == "__main__":
+    unittest.main()
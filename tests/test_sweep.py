@@ -0,0 +1,79 @@
+"""
+Unit tests for the grid sweep, run against a local stub server.
+"""
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+from weather.api import WeatherAPI
+from weather.ratelimit import UsageCounter
+from weather.sweep import sweep, read_sweep, grid_points
+from tests.stub_server import StubServer
+
+class TestSweep(unittest.TestCase):
+    """
+    Test cases for the grid sweep.
+    """
+    def setUp(self):
+        """
+        Start a stub server, and give the sweep a temporary output directory and usage counter.
+        """
+        self.server = StubServer()
+        self.server.start()
+        self.addCleanup(self.server.stop)
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.directory = os.path.join(temp_dir.name, "sweep")
+        self.usage = UsageCounter(path=os.path.join(temp_dir.name, "usage.json"))
+        self.addCleanup(self.usage.flush)
+        patcher = patch.object(WeatherAPI, "usage", self.usage)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def run_sweep(self, **kwargs):
+        """
+        Sweep a 5 by 4 grid with two workers against the stub server.
+        """
+        return sweep(50.0, -1.0, 50.4, -0.7, 0.1, self.directory, processes=2, rate=100000,
+                     chunk_size=4, base_url=self.server.url, **kwargs)
+
+    def test_grid_points(self):
+        """
+        Test that the grid covers the bounding box, edges included.
+        """
+        points = list(grid_points(50.0, -1.0, 50.4, -0.7, 0.1))
+
+        self.assertEqual(len(points), 20)
+        self.assertEqual(points[0], (0, 50.0, -1.0))
+        self.assertEqual(points[-1], (19, 50.4, -0.7))
+
+    def test_sweep_and_resume(self):
+        """
+        Test that every point is written once, and a resumed sweep only fetches the missing ones.
+        """
+        summary = self.run_sweep()
+        self.assertEqual((summary.points, summary.fetched, summary.failed), (20, 20, 0))
+        self.assertEqual(self.usage.snapshot()["calls"], 20)
+
+        results = read_sweep(self.directory)
+        self.assertEqual(list(results["index"]), list(range(20)))
+        self.assertEqual(results["latitude"][5], 50.1)
+        self.assertEqual(results["description"][0], "clear sky")
+
+        # Lose one chunk, as if the run had been interrupted before writing it
+        os.remove(os.path.join(self.directory, "shard-001-000000.seg"))
+        summary = self.run_sweep()
+        self.assertEqual((summary.fetched, summary.skipped), (4, 16))
+        self.assertEqual(list(read_sweep(self.directory)["index"]), list(range(20)))
+
+    def test_different_grid_rejected(self):
+        """
+        Test that an output directory cannot be reused for a different grid.
+        """
+        self.run_sweep()
+
+        with self.assertRaises(ValueError):
+            sweep(50.0, -1.0, 50.4, -0.7, 0.2, self.directory, base_url=self.server.url)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,104 @@
+"""
+Unit tests for the BackgroundRunner class.
+"""
+import unittest
+import threading
+from weather.tasks import BackgroundRunner
+
+class FakeMaster:
+    """
+    Stands in for a Tk widget, running scheduled callbacks when asked to.
+    """
+    def __init__(self):
+        self.scheduled = []
+
+    def after(self, delay, callback):
+        self.scheduled.append(callback)
+
+    def run_pending(self):
+        scheduled, self.scheduled = self.scheduled, []
+        for callback in scheduled:
+            callback()
+
+class TestBackgroundRunner(unittest.TestCase):
+    """
+    Test cases for the BackgroundRunner class.
+    """
+    def setUp(self):
+        """
+        Set up a runner attached to a fake main loop.
+        """
+        self.master = FakeMaster()
+        self.runner = BackgroundRunner(self.master, max_workers=2)
+        self.addCleanup(self.runner.shutdown)
+        self.results = []
+
+    def callback(self, result, error):
+        self.results.append((result, error))
+
+    def run_until_idle(self):
+        """
+        Run the fake main loop until no task is pending.
+        """
+        for _ in range(500):
+            if not self.runner.is_pending("lookup"):
+                return
+            threading.Event().wait(0.01)
+            self.master.run_pending()
+
+    def test_result_delivered_on_poll(self):
+        """
+        Test that results are only delivered when the main loop polls.
+        """
+        self.runner.submit("lookup", lambda value: value * 2, self.callback, 21)
+        self.assertEqual(self.results, [])
+
+        self.run_until_idle()
+        self.assertEqual(self.results, [(42, None)])
+
+    def test_error_delivered(self):
+        """
+        Test that an exception raised by the work is passed to the callback.
+        """
+        def fail():
+            raise RuntimeError("Failed.")
+
+        self.runner.submit("lookup", fail, self.callback)
+        self.run_until_idle()
+
+        self.assertIsNone(self.results[0][0])
+        self.assertIsInstance(self.results[0][1], RuntimeError)
+
+    def test_superseded_result_discarded(self):
+        """
+        Test that only the newest task on a channel delivers its result.
+        """
+        release = threading.Event()
+
+        def slow():
+            release.wait(1)
+            return "old"
+
+        self.runner.submit("lookup", slow, self.callback)
+        self.runner.submit("lookup", lambda: "new", self.callback)
+        release.set()
+        self.run_until_idle()
+        threading.Event().wait(0.05)
+        self.master.run_pending()
+
+        self.assertEqual(self.results, [("new", None)])
+
+    def test_cancel(self):
+        """
+        Test that a cancelled task never delivers its result.
+        """
+        self.runner.submit("lookup", lambda: "value", self.callback)
+        self.runner.cancel("lookup")
+        threading.Event().wait(0.05)
+        self.master.run_pending()
+
+        self.assertFalse(self.runner.is_pending("lookup"))
+        self.assertEqual(self.results, [])
+
+if __name__ == "__main__":
+    unittest.main()
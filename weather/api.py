@@ -1,30 +1,287 @@
+import sys
+import atexit
 import logging
 import requests
 import json
-import os
-from dotenv import load_dotenv
-from datetime import datetime
+import time
+import threading
+from collections import namedtuple
+from concurrent.futures import Future, ThreadPoolExecutor, wait, FIRST_COMPLETED
+from requests.adapters import HTTPAdapter
+from weather import config
+from weather.icons import IconStore, ICON_CODES
+from weather.forecast import ForecastTable
+from weather.cache import ResponseCache
+from weather.ratelimit import TokenBucket, RetryPolicy, CircuitBreaker, UsageCounter
+from weather.metrics import metrics
+from weather.spatial import SpatialIndex, normalise_coordinates, DEFAULT_RADIUS_KM
+from weather.providers import ProviderChain
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
 
+API_BASE_URL = "https://api.openweathermap.org"
+ICON_BASE_URL = "https://openweathermap.org/img/wn"
+
+# (connect, read) timeouts in seconds, so a stalled socket cannot hang a caller forever
+DEFAULT_TIMEOUT = (3.05, 10)
+DEFAULT_POOL_SIZE = 10
+
+# How long, in seconds, responses stay fresh in the cache. Current conditions update about
+# every ten minutes, the three-hourly forecast far less often. Expired responses are served
+# for as long again while they are refreshed in the background.
+CACHE_TTLS = {"weather": 10 * 60, "forecast": 60 * 60}
+
+# One result of a batch lookup. The data is None and the error set when the location failed.
+BatchResult = namedtuple("BatchResult", ["location", "coordinates", "data", "error"])
+
+def parse_weather(data):
+    """
+    Extracts the current weather from a /data/2.5/weather response.
+
+    Args:
+        data (dict): The decoded JSON response.
+
+    Returns:
+        tuple: A tuple containing the city name (str), temperature (float),
+        weather description (str), and weather icon code (str).
+
+    Raises:
+        KeyError: If the response data is missing a field.
+    """
+    city = data.get("name", "your selected location")
+    temperature = data["main"]["temp"]
+    description = data["weather"][0]["description"]
+    icon_code = data["weather"][0]["icon"]
+
+    return city, temperature, description, icon_code
+
+def parse_daily_forecast(forecast_data):
+    """
+    Aggregates a /data/2.5/forecast response into one summary per local day, after today.
+
+    Days are bucketed in the timezone of the location, taken from the response.
+
+    Args:
+        forecast_data (dict): The decoded JSON response.
+
+    Returns:
+        list of DailySummary: The minimum, maximum and mean temperature, mean humidity,
+        maximum wind speed and precipitation probability, and most frequent weather
+        description of each day, in date order.
+
+    Raises:
+        KeyError: If the response data is missing a field.
+    """
+    return ForecastTable.from_response(forecast_data).daily_summaries()
+
+def parse_forecast(forecast_data):
+    """
+    Extracts one forecast per day, after today, from a /data/2.5/forecast response.
+
+    Args:
+        forecast_data (dict): The decoded JSON response.
+
+    Returns:
+        dict: A dictionary where keys are dates (str) and values are tuples
+        containing the mean temperature (float) and the most frequent weather
+        description (str) of the day.
+
+    Raises:
+        KeyError: If the response data is missing a field.
+    """
+    return {
+        summary.date: (summary.mean_temperature, summary.description)
+        for summary in parse_daily_forecast(forecast_data)
+    }
+
 class WeatherAPI:
     """
     A class that interacts with the OpenWeatherMap API to retrieve current weather
     and forecast data.
 
+    All instances share a single pooled, keep-alive HTTP session, so connections to
+    OpenWeatherMap are reused across calls and across WeatherAPI instances.
+
     Attributes:
         api_key (str): The API key used to authenticate with the OpenWeatherMap API.
+        timeout (tuple): The (connect, read) timeouts in seconds applied to every request.
+        base_url (str): The base URL of the data and geocoding endpoints.
+        icon_base_url (str): The base URL of the weather icons.
+        session (requests.Session): The shared session used for every request.
+        icons (IconStore): The store shared by all instances that holds each weather
+            icon once it has been downloaded.
+        cache (ResponseCache): The cache shared by all instances that holds recent
+            weather and forecast responses.
+        rate_limiter (TokenBucket): Keeps API calls from all instances under the
+            per-minute limit.
+        retry_policy (RetryPolicy): Decides how failed requests are retried.
+        circuit_breaker (CircuitBreaker): Stops calling the API while it keeps failing.
+        usage (UsageCounter): Counts the API calls made this month.
+        providers (ProviderChain): The providers weather and forecasts are fetched from,
+            shared by all instances unless one is given its own.
+        nearby (SpatialIndex): The locations of the responses in the cache, shared by all
+            instances, so lookups close to one can be answered with it.
+        nearby_radius (float): How close, in kilometres, a cached response must be to be
+            served for a lookup. 0 only serves responses for the same coordinates.
     """
 
-    def __init__(self):
+    icons = IconStore()
+    cache = ResponseCache()
+    rate_limiter = TokenBucket()
+    retry_policy = RetryPolicy()
+    circuit_breaker = CircuitBreaker()
+    usage = UsageCounter()
+    # Created on import, so a typo in WEATHER_PROVIDERS is logged rather than raised
+    providers = ProviderChain.from_environment(strict=False)
+    nearby = SpatialIndex()
+    _default = None
+    _session = None
+    _executor = None
+    _pool_size = 0
+    _session_lock = threading.Lock()
+    _default_lock = threading.Lock()
+
+    def __init__(self, timeout=DEFAULT_TIMEOUT, pool_size=DEFAULT_POOL_SIZE, base_url=API_BASE_URL,
+                 icon_base_url=ICON_BASE_URL, nearby_radius=DEFAULT_RADIUS_KM, providers=None):
         """
-        Initialises the WeatherAPI instance by loading the API key.
+        Initialises the WeatherAPI instance by loading the API key and attaching
+        the shared HTTP session.
+
+        Args:
+            timeout (float or tuple): The (connect, read) timeouts in seconds.
+            pool_size (int): The maximum number of pooled connections per host.
+            base_url (str): The base URL of the data and geocoding endpoints.
+            icon_base_url (str): The base URL of the weather icons.
+            nearby_radius (float): How close, in kilometres, a cached response must be
+                to be served for a lookup.
+            providers (ProviderChain): The providers to fetch from, instead of the shared ones.
         """
         self.api_key = self.get_api_key()
+        self.timeout = timeout
+        self.base_url = base_url
+        self.icon_base_url = icon_base_url
+        self.nearby_radius = nearby_radius
+        if providers is not None:
+            self.providers = providers
+        self.session = self.get_session(pool_size)
 
-    def get_api_key(self):
+    @classmethod
+    def get_session(cls, pool_size=DEFAULT_POOL_SIZE):
         """
-        Retrieves the API key from the environment variables.
+        Returns the process-wide HTTP session, creating it on first use.
+
+        The session keeps connections alive and pools them per host. If a larger
+        pool is requested than the current one, the pool is grown in place.
+
+        Args:
+            pool_size (int): The maximum number of pooled connections per host.
+
+        Returns:
+            requests.Session: The shared session.
+        """
+        with cls._session_lock:
+            if cls._session is None:
+                cls._session = requests.Session()
+                cls._session.headers.update({"Connection": "keep-alive"})
+            if pool_size > cls._pool_size:
+                replaced = {id(adapter): adapter for adapter in (
+                    cls._session.adapters.get("https://"), cls._session.adapters.get("http://")
+                ) if adapter is not None}
+                adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+                cls._session.mount("https://", adapter)
+                cls._session.mount("http://", adapter)
+                cls._pool_size = pool_size
+                # Release the connections pooled by the adapters that were replaced
+                for old_adapter in replaced.values():
+                    old_adapter.close()
+            return cls._session
+
+    @classmethod
+    def close_session(cls):
+        """
+        Closes the shared HTTP session and its pooled connections.
+
+        A new session is created the next time one is needed.
+        """
+        with cls._session_lock:
+            if cls._session is not None:
+                cls._session.close()
+            cls._session = None
+            cls._pool_size = 0
+
+    def request(self, url, params=None, metered=True, kind=None):
+        """
+        Sends a GET request through the shared session.
+
+        Connection errors, timeouts, 429 and 5xx responses are retried with backoff,
+        honouring any Retry-After header. Metered requests, which count against the
+        API quota, also wait for the rate limiter, are counted in the usage counter
+        and are refused while the circuit breaker is open.
+
+        Args:
+            url (str): The URL to request.
+            params (dict): The query parameters to send.
+            metered (bool): Whether the request is an API call that counts against the quota.
+            kind (str): The label the request is counted under in the metrics, "api" for
+                metered requests and "icon" for the others by default.
+
+        Returns:
+            requests.Response: The successful response.
+
+        Raises:
+            requests.exceptions.RequestException: If there is a network error,
+            a timeout or an HTTP error status.
+            CircuitOpenError: If the API is failing and is not being called for now.
+        """
+        kind = kind or ("api" if metered else "icon")
+        attempt = 0
+        while True:
+            if metered:
+                self.circuit_breaker.check()
+                metrics.observe("rate_limit_wait_seconds", self.rate_limiter.acquire())
+                self.usage.record()
+            try:
+                with metrics.span("http_request_seconds", kind=kind):
+                    response = self.session.get(url, params=params, timeout=self.timeout)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                metrics.increment("http_requests_total", kind=kind, status=type(e).__name__)
+                if metered:
+                    self.circuit_breaker.record_failure()
+                if not self.retry_policy.should_retry(attempt):
+                    raise
+                delay = self.retry_policy.delay(attempt)
+                logging.warning(f"Network error, retrying in {delay:.1f}s: {e}")
+            except Exception as e:
+                # Not worth retrying, but the circuit breaker must still hear how the call
+                # went, or a half-open trial would never end
+                metrics.increment("http_requests_total", kind=kind, status=type(e).__name__)
+                if metered:
+                    self.circuit_breaker.record_failure()
+                raise
+            else:
+                status_code = response.status_code
+                if metrics.enabled:
+                    metrics.increment("http_requests_total", kind=kind, status=str(status_code))
+                    metrics.increment("http_response_bytes_total", len(response.content), kind=kind)
+                if metered:
+                    if status_code >= 500:
+                        self.circuit_breaker.record_failure()
+                    else:
+                        self.circuit_breaker.record_success()
+                if not self.retry_policy.should_retry(attempt, status_code):
+                    response.raise_for_status()
+                    return response
+                delay = self.retry_policy.delay(attempt, response.headers.get("Retry-After"))
+                logging.warning(f"HTTP {status_code} from the API, retrying in {delay:.1f}s.")
+            metrics.increment("http_retries_total", kind=kind)
+            time.sleep(delay)
+            attempt += 1
+
+    @staticmethod
+    def get_api_key():
+        """
+        Retrieves the API key from the environment variables. The .env file is only
+        read the first time, however many instances are created.
 
         Returns:
             api_key: The API key, when retrieved successfully.
@@ -32,19 +289,215 @@ class WeatherAPI:
         Raises:
             ValueError: If the API key is not set.
         """
-        load_dotenv()
-        
-        api_key = os.getenv("OPENWEATHER_API_KEY")
+        return config.get_api_key()
+
+    @classmethod
+    def default(cls):
+        """
+        Returns an instance with the default settings, shared by the whole process.
+
+        Returns:
+            WeatherAPI: The shared instance, created on first use.
+
+        Raises:
+            ValueError: If the API key is not set.
+        """
+        with cls._default_lock:
+            if cls._default is None:
+                cls._default = cls()
+            return cls._default
+
+    def fetch_json(self, endpoint, latitude, longitude):
+        """
+        Retrieves the JSON data of a data endpoint for the specified coordinates,
+        answering from the response cache when possible.
+
+        A fresh cached response for a location within nearby_radius is served as if it
+        were for these coordinates, so nearly identical lookups share one API call.
+        Otherwise the response is fetched through the provider chain, which hedges slow
+        requests and fails over to the next provider when one fails.
+
+        Args:
+            endpoint (str): The endpoint name, "weather" or "forecast".
+            latitude (float): The latitude of the location.
+            longitude (float): The longitude of the location.
+
+        Returns:
+            dict: The decoded JSON response.
+
+        Raises:
+            requests.exceptions.RequestException: If there is a network error.
+            ValueError: If the response is not valid JSON.
+        """
+        latitude, longitude = normalise_coordinates(latitude, longitude)
+
+        def fetch():
+            return self.providers.fetch(self, endpoint, latitude, longitude)
+
+        ttl = CACHE_TTLS[endpoint]
+        key = self.cache_key(endpoint, latitude, longitude)
+        with metrics.span("stage_seconds", stage=endpoint):
+            nearby = self.get_nearby(endpoint, latitude, longitude)
+            if nearby is not None:
+                metrics.increment("cache_lookups_total", endpoint=endpoint, result="nearby")
+                return nearby
+            try:
+                data, result = self.cache.get_or_fetch(key, fetch, ttl, ttl, with_result=True)
+                self.nearby.add(endpoint, *key[1:])
+                metrics.increment("cache_lookups_total", endpoint=endpoint, result=result)
+                return data
+            except requests.exceptions.RequestException as e:
+                stale = self.cache.get(key, allow_expired=True)
+                if stale is None:
+                    raise
+                metrics.increment("cache_lookups_total", endpoint=endpoint, result="fallback")
+                logging.warning(f"Serving cached {endpoint} data after a network error: {e}")
+                return stale
+
+    def is_cached(self, latitude, longitude):
+        """
+        Returns whether fresh weather and forecast responses for the specified coordinates,
+        or for a location within nearby_radius, are in the cache.
+
+        Args:
+            latitude (float): The latitude of the location.
+            longitude (float): The longitude of the location.
+
+        Returns:
+            bool: True if a lookup would not call the API.
+        """
+        latitude, longitude = normalise_coordinates(latitude, longitude)
+        return all(
+            self.cache.get(self.cache_key(endpoint, latitude, longitude)) is not None
+            or self.get_nearby(endpoint, latitude, longitude) is not None
+            for endpoint in CACHE_TTLS
+        )
+
+    def get_nearby(self, endpoint, latitude, longitude):
+        """
+        Returns the fresh cached response of an endpoint for the location nearest to the
+        specified coordinates, if there is one within nearby_radius.
+
+        None is returned when the coordinates themselves have a fresh response, so that
+        lookup goes through the cache as usual. Other locations whose responses have
+        left the cache or gone stale are dropped from the index as they are found.
+
+        Args:
+            endpoint (str): The endpoint name, "weather" or "forecast".
+            latitude (float): The latitude of the location.
+            longitude (float): The longitude of the location.
+
+        Returns:
+            dict: The cached JSON response, or None.
+        """
+        if not self.nearby_radius:
+            return None
+        key = self.cache_key(endpoint, latitude, longitude)
+        exclude = set()
+        while True:
+            point = self.nearby.nearest(endpoint, latitude, longitude, self.nearby_radius, exclude)
+            if point is None:
+                return None
+            data = self.cache.get(self.cache_key(endpoint, *point))
+            if self.cache_key(endpoint, *point) == key:
+                if data is not None:
+                    return None
+                # The location's own response is stale, but a neighbour's may not be
+                exclude.add(point)
+                continue
+            if data is not None:
+                return data
+            self.nearby.remove(endpoint, *point)
+
+    @staticmethod
+    def cache_key(endpoint, latitude, longitude):
+        """
+        Returns the response cache key of an endpoint at the specified coordinates.
+
+        Coordinates are rounded to four decimal places (about 11 metres).
+
+        Args:
+            endpoint (str): The endpoint name, "weather" or "forecast".
+            latitude (float): The latitude of the location.
+            longitude (float): The longitude of the location.
+
+        Returns:
+            tuple: The cache key.
+        """
+        return endpoint, round(float(latitude), 4), round(float(longitude), 4)
+
+    def invalidate_cache(self, latitude, longitude):
+        """
+        Removes the cached weather and forecast for the specified coordinates, and for
+        any location within nearby_radius of them, so the next lookup queries the API again.
+
+        Args:
+            latitude (float): The latitude of the location.
+            longitude (float): The longitude of the location.
+        """
+        latitude, longitude = normalise_coordinates(latitude, longitude)
+        for endpoint in CACHE_TTLS:
+            self.cache.invalidate(self.cache_key(endpoint, latitude, longitude))
+            while self.nearby_radius:
+                point = self.nearby.nearest(endpoint, latitude, longitude, self.nearby_radius)
+                if point is None:
+                    break
+                self.nearby.remove(endpoint, *point)
+                self.cache.invalidate(self.cache_key(endpoint, *point))
+
+    def fetch_weather(self, latitude, longitude):
+        """
+        Retrieves current weather data for the specified coordinates, without the icon.
+
+        Unlike get_weather, errors are raised rather than logged.
+
+        Args:
+            latitude (float): The latitude of the location.
+            longitude (float): The longitude of the location.
+
+        Returns:
+            tuple: A tuple containing the city name (str), temperature (float),
+            weather description (str), and weather icon code (str).
+
+        Raises:
+            requests.exceptions.RequestException: If there is a network error.
+            ValueError: If the response data is invalid.
+            KeyError: If the response data is missing a field.
+        """
+        return parse_weather(self.fetch_json("weather", latitude, longitude))
+
+    def get_current_weather(self, latitude, longitude):
+        """
+        Retrieves current weather data for the specified coordinates, without the icon.
+
+        Args:
+            latitude (float): The latitude of the location.
+            longitude (float): The longitude of the location.
 
-        if api_key is None:
-            raise ValueError("The API key is not set. Please set the OPENWEATHER_API_KEY environment variable.")
-        
-        return api_key
+        Returns:
+            tuple: A tuple containing the city name (str), temperature (float),
+            weather description (str), and weather icon code (str).
+            None: If an error occurs during the API request.
+        """
+        try:
+            return self.fetch_weather(latitude, longitude)
+        except requests.exceptions.RequestException as e:
+            logging.error(f"Network error: {e}")
+            return None
+        except ValueError as e:
+            logging.error(f"Data error: {e}")
+            return None
+        except Exception as e:
+            logging.error(f"Unexpected error: {e}")
+            return None
 
     def get_weather(self, latitude, longitude):
         """
         Retrieves current weather data for the specified coordinates.
 
+        The weather icon comes from the shared icon store, so it is only downloaded
+        the first time its code is seen.
+
         Args:
             latitude (float): The latitude of the location.
             longitude (float): The longitude of the location.
@@ -58,22 +511,9 @@ class WeatherAPI:
             requests.exceptions.RequestException: If there is a network error.
             ValueError: If the response data is invalid.
         """
-        url = (
-            f"https://api.openweathermap.org/data/2.5/weather?"
-            f"lat={latitude}&lon={longitude}&appid={self.api_key}&units=metric"
-        )
         try:
-            response = requests.get(url)
-            response.raise_for_status()
-            data = response.json()
-
-            city = data.get("name", "your selected location")
-            temperature = data["main"]["temp"]
-            description = data["weather"][0]["description"]
-            icon_code = data["weather"][0]["icon"]
-
-            icon_url = f"http://openweathermap.org/img/wn/{icon_code}.png"
-            icon_data = requests.get(icon_url).content
+            city, temperature, description, icon_code = self.fetch_weather(latitude, longitude)
+            icon_data = self.get_icon(icon_code)
 
             return city, temperature, description, icon_data
         except requests.exceptions.RequestException as e:
@@ -86,6 +526,90 @@ class WeatherAPI:
             logging.error(f"Unexpected error: {e}")
             return None
 
+    def download_icon(self, icon_code):
+        """
+        Downloads the PNG data of a weather icon, bypassing the icon store.
+
+        Args:
+            icon_code (str): The OpenWeatherMap icon code, such as "01d".
+
+        Returns:
+            bytes: The PNG data of the icon.
+
+        Raises:
+            requests.exceptions.RequestException: If there is a network error.
+        """
+        return self.request(f"{self.icon_base_url}/{icon_code}.png", metered=False).content
+
+    def get_icon(self, icon_code):
+        """
+        Returns the PNG data of a weather icon from the icon store, downloading it once.
+
+        Args:
+            icon_code (str): The OpenWeatherMap icon code, such as "01d".
+
+        Returns:
+            bytes: The PNG data of the icon.
+
+        Raises:
+            requests.exceptions.RequestException: If there is a network error.
+            ValueError: If the icon code is invalid.
+        """
+        with metrics.span("stage_seconds", stage="icon"):
+            return self.icons.get(icon_code, self.download_icon)
+
+    def prefetch_icons(self, icon_codes=ICON_CODES):
+        """
+        Loads every weather icon into the icon store on a background thread.
+
+        Args:
+            icon_codes (iterable of str): The icon codes to load, every known code by default.
+
+        Returns:
+            threading.Thread: The daemon thread doing the work.
+        """
+        return self.icons.prefetch(self.download_icon, icon_codes)
+
+    def fetch_forecast(self, latitude, longitude):
+        """
+        Retrieves a five-day weather forecast for the specified coordinates.
+
+        Unlike get_forecast, errors are raised rather than logged.
+
+        Args:
+            latitude (float): The latitude of the location.
+            longitude (float): The longitude of the location.
+
+        Returns:
+            dict: A dictionary where keys are dates (str) and values are tuples
+            containing the mean temperature (float) and most frequent weather
+            description (str) of the day.
+
+        Raises:
+            requests.exceptions.RequestException: If there is a network error.
+            ValueError: If the response data is invalid.
+            KeyError: If the response data is missing a field.
+        """
+        return parse_forecast(self.fetch_json("forecast", latitude, longitude))
+
+    def fetch_daily_forecast(self, latitude, longitude):
+        """
+        Retrieves the forecast for the specified coordinates, aggregated per day.
+
+        Args:
+            latitude (float): The latitude of the location.
+            longitude (float): The longitude of the location.
+
+        Returns:
+            list of DailySummary: One summary per day after today, in date order.
+
+        Raises:
+            requests.exceptions.RequestException: If there is a network error.
+            ValueError: If the response data is invalid.
+            KeyError: If the response data is missing a field.
+        """
+        return parse_daily_forecast(self.fetch_json("forecast", latitude, longitude))
+
     def get_forecast(self, latitude, longitude):
         """
         Retrieves a five-day weather forecast for the specified coordinates.
@@ -96,37 +620,211 @@ class WeatherAPI:
 
         Returns:
             dict: A dictionary where keys are dates (str) and values are tuples
-            containing the temperature (float) and weather description (str).
+            containing the mean temperature (float) and most frequent weather
+            description (str) of the day.
             None: If an error occurs during the API request.
 
         Raises:
             requests.exceptions.RequestException: If there is a network error.
             ValueError: If the response data is invalid.
         """
-        url = (
-            f"https://api.openweathermap.org/data/2.5/forecast?"
-            f"lat={latitude}&lon={longitude}&appid={self.api_key}&units=metric"
-        )
         try:
-            response = requests.get(url)
-            response.raise_for_status()
-            forecast_data = response.json()
+            return self.fetch_forecast(latitude, longitude)
+        except Exception as e:
+            logging.error(f"Error: {e}")
+            return None
 
-            daily_forecasts = {}
-            today = datetime.now().strftime("%d-%m-%Y")
+    @classmethod
+    def get_executor(cls):
+        """
+        Returns the process-wide thread pool used to send independent requests concurrently,
+        creating it on first use.
 
-            for item in forecast_data["list"]:
-                date = datetime.fromtimestamp(item["dt"]).strftime("%d-%m-%Y")
+        Returns:
+            ThreadPoolExecutor: The shared pool, sized to match the connection pool.
+        """
+        with cls._session_lock:
+            if cls._executor is None:
+                cls._executor = ThreadPoolExecutor(
+                    max_workers=DEFAULT_POOL_SIZE, thread_name_prefix="weather-api"
+                )
+            return cls._executor
+
+    def get_location_report(self, latitude, longitude):
+        """
+        Retrieves the current weather, its icon and the forecast for the specified
+        coordinates, sending the independent requests concurrently.
+
+        The forecast is requested at the same time as the current weather, and the icon
+        as soon as the current weather names it. If one of them fails, the others are
+        still returned.
+
+        Args:
+            latitude (float): The latitude of the location.
+            longitude (float): The longitude of the location.
 
-                if date == today:
-                    continue
+        Returns:
+            dict: The "weather" tuple as returned by get_current_weather, the "icon_data"
+            bytes, the "forecast" dictionary as returned by get_forecast, each None if it
+            could not be retrieved, and "errors", a dictionary of the exceptions raised,
+            keyed by "weather", "icon" or "forecast".
+        """
+        report = {"weather": None, "icon_data": None, "forecast": None, "errors": {}}
+
+        def fetch_weather_and_icon():
+            report["weather"] = self.fetch_weather(latitude, longitude)
+            try:
+                report["icon_data"] = self.get_icon(report["weather"][3])
+            except Exception as e:
+                report["errors"]["icon"] = e
+
+        # Profiled with the lookup if profiling is on; weather.profiling is only imported
+        # then, as it slows start-up down
+        profiling = sys.modules.get("weather.profiling")
+        carry = profiling.carry if profiling is not None else lambda function: function
+        executor = self.get_executor()
+        futures = {
+            "weather": executor.submit(carry(fetch_weather_and_icon)),
+            "forecast": executor.submit(carry(self.fetch_forecast), latitude, longitude),
+        }
+        for leg, future in futures.items():
+            try:
+                result = future.result()
+                if leg == "forecast":
+                    report["forecast"] = result
+            except Exception as e:
+                report["errors"][leg] = e
 
-                if date not in daily_forecasts:
-                    temperature = item["main"]["temp"]
-                    description = item["weather"][0]["description"]
-                    daily_forecasts[date] = (temperature, description)
+        for leg, error in report["errors"].items():
+            logging.error(f"Could not retrieve the {leg}: {error}")
+        return report
+
+    def get_weather_many(self, locations, max_concurrency=DEFAULT_POOL_SIZE, dedupe=True):
+        """
+        Retrieves the current weather for many locations, yielding each result as soon
+        as it arrives.
+
+        Args:
+            locations (iterable): (latitude, longitude) tuples and/or city names. The
+                iterable is consumed lazily, so it may be a generator over a large file.
+            max_concurrency (int): The maximum number of locations fetched at once.
+            dedupe (bool): Whether repeated locations in the batch are only fetched and
+                yielded once. This keeps the key of every location seen in memory.
 
-            return daily_forecasts
+        Yields:
+            BatchResult: The location as given, its (latitude, longitude) and either the
+            weather tuple returned by fetch_weather (with the icon code, not the icon
+            data) or the exception that prevented it, in order of completion.
+        """
+        return self._fetch_many(self.fetch_weather, locations, max_concurrency, dedupe)
+
+    def get_forecast_many(self, locations, max_concurrency=DEFAULT_POOL_SIZE, dedupe=True):
+        """
+        Retrieves the forecast for many locations, yielding each result as soon as it arrives.
+
+        Args:
+            locations (iterable): (latitude, longitude) tuples and/or city names. The
+                iterable is consumed lazily, so it may be a generator over a large file.
+            max_concurrency (int): The maximum number of locations fetched at once.
+            dedupe (bool): Whether repeated locations in the batch are only fetched and
+                yielded once. This keeps the key of every location seen in memory.
+
+        Yields:
+            BatchResult: The location as given, its (latitude, longitude) and either the
+            forecast dictionary returned by fetch_forecast or the exception that
+            prevented it, in order of completion.
+        """
+        return self._fetch_many(self.fetch_forecast, locations, max_concurrency, dedupe)
+
+    @staticmethod
+    def location_key(location):
+        """
+        Returns a key under which equivalent locations compare equal.
+
+        Args:
+            location (tuple or str): A (latitude, longitude) tuple or a city name.
+
+        Returns:
+            tuple: The normalised city name, or the coordinates rounded to four decimal places.
+        """
+        if isinstance(location, str):
+            # Imported here, because weather.data imports this module
+            from weather.data import normalise_city
+
+            return ("city", normalise_city(location))
+        latitude, longitude = location
+        return ("coordinates", round(float(latitude), 4), round(float(longitude), 4))
+
+    def _fetch_location(self, fetch, location):
+        """
+        Geocodes a location if needed and fetches its data, capturing any error.
+
+        Returns:
+            tuple: The (latitude, longitude), or None if the city could not be geocoded,
+            the fetched data, or None, and the exception raised, or None.
+        """
+        coordinates = None
+        try:
+            if isinstance(location, str):
+                from weather.data import get_coordinates_from_city
+
+                latitude, longitude = get_coordinates_from_city(location)
+                if latitude is None or longitude is None:
+                    raise ValueError(f"Could not find the coordinates of {location}.")
+            else:
+                latitude, longitude = location
+                latitude, longitude = float(latitude), float(longitude)
+            coordinates = (latitude, longitude)
+            return coordinates, fetch(latitude, longitude), None
         except Exception as e:
-            logging.error(f"Error: {e}")
-            return None
+            return coordinates, None, e
+
+    def _fetch_many(self, fetch, locations, max_concurrency, dedupe):
+        """
+        Runs fetch over locations with at most max_concurrency in flight, yielding each
+        BatchResult as soon as it completes.
+
+        Only max_concurrency locations are taken from the iterable ahead of the results,
+        so memory use does not grow with the size of the batch.
+        """
+        # Make sure every worker can hold its own pooled connection
+        self.get_session(max_concurrency)
+        locations = iter(locations)
+        seen = set()
+        pending = {}
+        executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="weather-batch")
+
+        def submit_next():
+            for location in locations:
+                if dedupe:
+                    try:
+                        key = self.location_key(location)
+                    except (TypeError, ValueError) as e:
+                        # A malformed location fails on its own, like one that cannot be fetched
+                        invalid = Future()
+                        invalid.set_result((None, None, e))
+                        pending[invalid] = location
+                        return True
+                    if key in seen:
+                        continue
+                    seen.add(key)
+                pending[executor.submit(self._fetch_location, fetch, location)] = location
+                return True
+            return False
+
+        try:
+            for _ in range(max_concurrency):
+                if not submit_next():
+                    break
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    location = pending.pop(future)
+                    yield BatchResult(location, *future.result())
+                    submit_next()
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+# Whichever counter WeatherAPI uses when the interpreter exits, as tools such as the
+# benchmarks replace it
+atexit.register(lambda: WeatherAPI.usage.flush())
@@ -0,0 +1,305 @@
+"""
+An asyncio client for the OpenWeatherMap API.
+"""
+import json
+import asyncio
+import logging
+import aiohttp
+from weather.api import WeatherAPI, API_BASE_URL, ICON_BASE_URL, parse_weather, parse_forecast
+from weather.data import geocode_cache
+from weather.metrics import metrics
+from weather.ratelimit import CircuitOpenError
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+# The number of requests that may be waiting on the network at once
+DEFAULT_MAX_IN_FLIGHT = 1000
+# The number of pooled connections they share
+DEFAULT_CONNECTIONS = 100
+DEFAULT_TIMEOUT = 10
+
+class AsyncWeatherAPI:
+    """
+    An asyncio counterpart of WeatherAPI, sharing its response parsing.
+
+    Every request goes through one aiohttp session with a pooled, keep-alive connector,
+    created on first use inside the running event loop. A semaphore bounds the number of
+    requests in flight, so thousands of lookups can be gathered at once. API calls share
+    the rate limiter, retry policy, circuit breaker and usage counter of WeatherAPI, so
+    they count against the same quota as the rest of the application. Use the client as
+    an async context manager, or call close() when done.
+
+    Attributes:
+        api_key (str): The API key used to authenticate with the OpenWeatherMap API.
+        base_url (str): The base URL of the data and geocoding endpoints.
+        icon_base_url (str): The base URL of the weather icons.
+    """
+
+    def __init__(
+        self,
+        api_key=None,
+        base_url=API_BASE_URL,
+        icon_base_url=ICON_BASE_URL,
+        max_in_flight=DEFAULT_MAX_IN_FLIGHT,
+        connections=DEFAULT_CONNECTIONS,
+        timeout=DEFAULT_TIMEOUT,
+    ):
+        """
+        Initialises the client. No connection is opened until the first request.
+
+        Args:
+            api_key (str): The API key, read from the environment if not given.
+            base_url (str): The base URL of the data and geocoding endpoints.
+            icon_base_url (str): The base URL of the weather icons.
+            max_in_flight (int): The maximum number of requests in flight at once.
+            connections (int): The maximum number of pooled connections.
+            timeout (float): The total timeout of a request, in seconds.
+        """
+        self.api_key = api_key or WeatherAPI.get_api_key()
+        self.base_url = base_url
+        self.icon_base_url = icon_base_url
+        self.max_in_flight = max_in_flight
+        self.connections = connections
+        self.timeout = timeout
+        self._session = None
+        self._semaphore = None
+        self._icons = {}
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    def _get_session(self):
+        """Returns the shared session, creating it in the running event loop on first use."""
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.connections, keepalive_timeout=30),
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+            )
+            self._semaphore = asyncio.Semaphore(self.max_in_flight)
+        return self._session
+
+    async def close(self):
+        """Closes the session and its pooled connections."""
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def request(self, url, params=None, metered=True, kind=None):
+        """
+        Sends a GET request through the shared session, like WeatherAPI.request.
+
+        Connection errors, timeouts, 429 and 5xx responses are retried with backoff,
+        honouring any Retry-After header. Metered requests, which count against the
+        API quota, also wait for the rate limiter, are counted in the usage counter
+        and are refused while the circuit breaker is open.
+
+        Args:
+            url (str): The URL to request.
+            params (dict): The query parameters to send.
+            metered (bool): Whether the request is an API call that counts against the quota.
+            kind (str): The label the request is counted under in the metrics, "api" for
+                metered requests and "icon" for the others by default.
+
+        Returns:
+            bytes: The body of the successful response.
+
+        Raises:
+            aiohttp.ClientError: If there is a network error or an HTTP error status.
+            asyncio.TimeoutError: If the request times out.
+            CircuitOpenError: If the API is failing and is not being called for now.
+        """
+        kind = kind or ("api" if metered else "icon")
+        session = self._get_session()
+        if params is not None:
+            params = {key: str(value) for key, value in params.items()}
+        attempt = 0
+        while True:
+            if metered:
+                WeatherAPI.circuit_breaker.check()
+                metrics.observe("rate_limit_wait_seconds", await WeatherAPI.rate_limiter.acquire_async())
+                # Every few calls the counter is written to its file, so it is kept off the event loop
+                await asyncio.to_thread(WeatherAPI.usage.record)
+            try:
+                with metrics.span("http_request_seconds", kind=kind):
+                    async with self._semaphore, session.get(url, params=params) as response:
+                        body = await response.read()
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                metrics.increment("http_requests_total", kind=kind, status=type(e).__name__)
+                if metered:
+                    WeatherAPI.circuit_breaker.record_failure()
+                if not WeatherAPI.retry_policy.should_retry(attempt):
+                    raise
+                delay = WeatherAPI.retry_policy.delay(attempt)
+                logging.warning(f"Network error, retrying in {delay:.1f}s: {e}")
+            except Exception as e:
+                metrics.increment("http_requests_total", kind=kind, status=type(e).__name__)
+                if metered:
+                    WeatherAPI.circuit_breaker.record_failure()
+                raise
+            else:
+                status_code = response.status
+                if metrics.enabled:
+                    metrics.increment("http_requests_total", kind=kind, status=str(status_code))
+                    metrics.increment("http_response_bytes_total", len(body), kind=kind)
+                if metered:
+                    if status_code >= 500:
+                        WeatherAPI.circuit_breaker.record_failure()
+                    else:
+                        WeatherAPI.circuit_breaker.record_success()
+                if not WeatherAPI.retry_policy.should_retry(attempt, status_code):
+                    response.raise_for_status()
+                    return body
+                delay = WeatherAPI.retry_policy.delay(attempt, response.headers.get("Retry-After"))
+                logging.warning(f"HTTP {status_code} from the API, retrying in {delay:.1f}s.")
+            metrics.increment("http_retries_total", kind=kind)
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    async def fetch_json(self, endpoint, latitude, longitude):
+        """
+        Retrieves the JSON data of a data endpoint for the specified coordinates.
+
+        Args:
+            endpoint (str): The endpoint name, "weather" or "forecast".
+            latitude (float): The latitude of the location.
+            longitude (float): The longitude of the location.
+
+        Returns:
+            dict: The decoded JSON response.
+
+        Raises:
+            aiohttp.ClientError: If there is a network error.
+            asyncio.TimeoutError: If the request times out.
+            CircuitOpenError: If the API is failing and is not being called for now.
+            ValueError: If the response is not valid JSON.
+        """
+        params = {"lat": latitude, "lon": longitude, "appid": self.api_key, "units": "metric"}
+        body = await self.request(f"{self.base_url}/data/2.5/{endpoint}", params)
+        return json.loads(body)
+
+    async def fetch_weather(self, latitude, longitude):
+        """
+        Retrieves current weather data for the specified coordinates, raising on errors.
+
+        Returns:
+            tuple: A tuple containing the city name (str), temperature (float),
+            weather description (str), and weather icon code (str).
+        """
+        return parse_weather(await self.fetch_json("weather", latitude, longitude))
+
+    async def fetch_forecast(self, latitude, longitude):
+        """
+        Retrieves a five-day weather forecast for the specified coordinates, raising on errors.
+
+        Returns:
+            dict: A dictionary where keys are dates (str) and values are tuples
+            containing the mean temperature (float) and most frequent weather
+            description (str) of the day.
+        """
+        return parse_forecast(await self.fetch_json("forecast", latitude, longitude))
+
+    async def get_weather(self, latitude, longitude):
+        """
+        Retrieves current weather data for the specified coordinates.
+
+        Unlike WeatherAPI.get_weather, the icon is returned as its code; use get_icon
+        for the image data.
+
+        Args:
+            latitude (float): The latitude of the location.
+            longitude (float): The longitude of the location.
+
+        Returns:
+            tuple: A tuple containing the city name (str), temperature (float),
+            weather description (str), and weather icon code (str).
+            None: If an error occurs during the API request.
+        """
+        try:
+            return await self.fetch_weather(latitude, longitude)
+        except (aiohttp.ClientError, asyncio.TimeoutError, CircuitOpenError) as e:
+            logging.error(f"Network error: {e}")
+            return None
+        except ValueError as e:
+            logging.error(f"Data error: {e}")
+            return None
+        except Exception as e:
+            logging.error(f"Unexpected error: {e}")
+            return None
+
+    async def get_forecast(self, latitude, longitude):
+        """
+        Retrieves a five-day weather forecast for the specified coordinates.
+
+        Args:
+            latitude (float): The latitude of the location.
+            longitude (float): The longitude of the location.
+
+        Returns:
+            dict: A dictionary where keys are dates (str) and values are tuples
+            containing the mean temperature (float) and most frequent weather
+            description (str) of the day.
+            None: If an error occurs during the API request.
+        """
+        try:
+            return await self.fetch_forecast(latitude, longitude)
+        except Exception as e:
+            logging.error(f"Error: {e}")
+            return None
+
+    async def get_icon(self, icon_code):
+        """
+        Returns the PNG data of a weather icon, downloading each code once per client.
+
+        Args:
+            icon_code (str): The OpenWeatherMap icon code, such as "01d".
+
+        Returns:
+            bytes: The PNG data of the icon.
+
+        Raises:
+            aiohttp.ClientError: If there is a network error.
+        """
+        if icon_code not in self._icons:
+            self._icons[icon_code] = await self.request(f"{self.icon_base_url}/{icon_code}.png", metered=False)
+        return self._icons[icon_code]
+
+    async def get_coordinates(self, city):
+        """
+        Returns coordinates based on the provided city name, using the geocode cache
+        shared with weather.data.geocode_city.
+
+        Args:
+            city (str): The name of the city to retrieve coordinates for.
+
+        Returns:
+            tuple: A tuple containing latitude and longitude as floats, or (None, None) if the
+            city is not found or an error occurs.
+        """
+        # The cache reads and rewrites its file, so it is used off the event loop
+        cached = await asyncio.to_thread(geocode_cache.get, city)
+        if cached is not None:
+            return cached
+
+        params = {"q": city, "limit": 1, "appid": self.api_key}
+        try:
+            data = json.loads(await self.request(f"{self.base_url}/geo/1.0/direct", params))
+
+            if not data:
+                await asyncio.to_thread(geocode_cache.set, city, None, None)
+                return None, None
+
+            latitude, longitude = data[0]["lat"], data[0]["lon"]
+            await asyncio.to_thread(geocode_cache.set, city, latitude, longitude)
+            return latitude, longitude
+        except (aiohttp.ClientError, asyncio.TimeoutError, CircuitOpenError) as e:
+            logging.error(f"Network error: {e}")
+            return None, None
+        except ValueError as e:
+            logging.error(f"Data error: {e}")
+            return None, None
+        except Exception as e:
+            logging.error(f"Unexpected error: {e}")
+            return None, None
@@ -0,0 +1,237 @@
+"""
+An in-memory response cache with time-to-live and least-recently-used eviction.
+"""
+import time
+import logging
+import threading
+from collections import OrderedDict
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+DEFAULT_MAX_ENTRIES = 512
+DEFAULT_MAX_BYTES = 16 * 1024 * 1024
+
+class ResponseCache:
+    """
+    A thread-safe cache of API responses, bounded by entry count and total size.
+
+    Every entry has a time-to-live, after which it is stale. A stale entry can still be
+    served for a further stale_ttl seconds while it is refreshed in the background
+    (stale-while-revalidate). Older entries are kept until evicted, so they can be
+    served as a last resort when fetching fails. When either bound is exceeded, the
+    least recently used entries are evicted. Concurrent lookups of a missing entry share
+    a single fetch.
+
+    Attributes:
+        max_entries (int): The maximum number of entries kept.
+        max_bytes (int): The maximum total size, in bytes, of the entries kept.
+        hits (int): Lookups answered with a fresh entry.
+        stale_hits (int): Lookups answered with a stale entry while it was refreshed.
+        misses (int): Lookups that had to fetch.
+        shared (int): Lookups that waited for another lookup's fetch instead of fetching.
+        evictions (int): Entries removed to respect the bounds.
+    """
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, max_bytes=DEFAULT_MAX_BYTES, clock=time.monotonic):
+        """
+        Initialises an empty cache.
+
+        Args:
+            max_entries (int): The maximum number of entries kept.
+            max_bytes (int): The maximum total size, in bytes, of the entries kept.
+            clock (callable): Returns the current time in seconds; used for expiry.
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.clock = clock
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.shared = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._refreshing = set()
+        self._fetching = {}
+        self._lock = threading.Lock()
+
+    def _remove(self, key):
+        """Removes an entry. Must be called with the lock held."""
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry["size"]
+
+    def _lookup(self, key):
+        """
+        Returns the entry for a key and its state: "fresh", "stale" or "expired".
+        Must be called with the lock held.
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            return None, None
+        now = self.clock()
+        if now < entry["expires"]:
+            return entry, "fresh"
+        if now < entry["stale_until"]:
+            return entry, "stale"
+        return entry, "expired"
+
+    def get(self, key, allow_stale=False, allow_expired=False):
+        """
+        Returns a cached value without fetching it.
+
+        Args:
+            key (hashable): The cache key.
+            allow_stale (bool): Whether an entry past its TTL but inside its stale
+                window may be returned.
+            allow_expired (bool): Whether any entry still held may be returned, however
+                old, as a last resort when the value cannot be fetched.
+
+        Returns:
+            The cached value, or None if there is no usable entry.
+        """
+        with self._lock:
+            entry, state = self._lookup(key)
+            if entry is None:
+                return None
+            if state == "stale" and not (allow_stale or allow_expired):
+                return None
+            if state == "expired" and not allow_expired:
+                return None
+            self._entries.move_to_end(key)
+            return entry["value"]
+
+    def set(self, key, value, ttl, size=0, stale_ttl=0):
+        """
+        Stores a value, evicting the least recently used entries if the cache is full.
+
+        Args:
+            key (hashable): The cache key.
+            value: The value to store.
+            ttl (float): How long, in seconds, the value is fresh.
+            size (int): The size of the value in bytes, counted against max_bytes.
+            stale_ttl (float): How long, in seconds, after expiring the value may still
+                be served while it is refreshed.
+        """
+        if size > self.max_bytes:
+            return
+        now = self.clock()
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = {
+                "value": value,
+                "size": size,
+                "expires": now + ttl,
+                "stale_until": now + ttl + stale_ttl,
+            }
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def get_or_fetch(self, key, fetch, ttl, stale_ttl=0, with_result=False):
+        """
+        Returns a cached value, fetching and storing it if there is no usable entry.
+
+        A stale entry is returned immediately and refreshed on a background thread.
+        While an entry is being fetched, other lookups of it wait for that fetch; if it
+        fails, they fetch again themselves.
+
+        Args:
+            key (hashable): The cache key.
+            fetch (callable): Takes no arguments and returns a (value, size in bytes) tuple.
+            ttl (float): How long, in seconds, a fetched value is fresh.
+            stale_ttl (float): How long, in seconds, after expiring a value may still
+                be served while it is refreshed.
+            with_result (bool): Whether to also return how the lookup was answered.
+
+        Returns:
+            The cached or freshly fetched value. If with_result is True, a (value, result)
+            tuple, where result is "hit", "stale", "shared" if the value was fetched by
+            another lookup while this one waited, or "miss" if this lookup fetched it.
+
+        Raises:
+            Exception: Whatever fetch raises, when there is no usable entry.
+        """
+        waited = False
+        while True:
+            with self._lock:
+                entry, state = self._lookup(key)
+                if state == "fresh":
+                    self._entries.move_to_end(key)
+                    if not waited:
+                        self.hits += 1
+                    return (entry["value"], "shared" if waited else "hit") if with_result else entry["value"]
+                if state == "stale":
+                    self._entries.move_to_end(key)
+                    self.stale_hits += 1
+                    if key not in self._refreshing:
+                        self._refreshing.add(key)
+                        threading.Thread(
+                            target=self._refresh, args=(key, fetch, ttl, stale_ttl), daemon=True
+                        ).start()
+                    return (entry["value"], "stale") if with_result else entry["value"]
+                done = self._fetching.get(key)
+                if done is None:
+                    self.misses += 1
+                    done = self._fetching[key] = threading.Event()
+                    break
+                if not waited:
+                    self.shared += 1
+                    waited = True
+            done.wait()
+
+        try:
+            value, size = fetch()
+            self.set(key, value, ttl, size, stale_ttl)
+            return (value, "miss") if with_result else value
+        finally:
+            with self._lock:
+                del self._fetching[key]
+            done.set()
+
+    def _refresh(self, key, fetch, ttl, stale_ttl):
+        """Fetches a stale entry again and stores the result."""
+        try:
+            value, size = fetch()
+            self.set(key, value, ttl, size, stale_ttl)
+        except Exception as e:
+            logging.warning(f"Could not refresh cached response: {e}")
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def invalidate(self, key):
+        """
+        Removes an entry, so the next lookup fetches it again.
+
+        Args:
+            key (hashable): The cache key.
+        """
+        with self._lock:
+            self._remove(key)
+
+    def clear(self):
+        """Removes every entry. The counters are kept."""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        """
+        Returns the cache counters and current usage.
+
+        Returns:
+            dict: The hits, stale_hits, misses, shared, evictions, entries and bytes.
+        """
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "stale_hits": self.stale_hits,
+                "misses": self.misses,
+                "shared": self.shared,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+            }
@@ -0,0 +1,196 @@
+"""
+A headless command line interface that fetches the weather of many locations and
+streams one record per location to standard output.
+
+Usage:
+    python -m weather.cli London Paris "51.5, -0.12"
+    python -m weather.cli --file cities.txt --format csv
+    cat cities.txt | python -m weather.cli --forecast
+"""
+import os
+import sys
+import csv
+import json
+import argparse
+from itertools import chain
+from weather.api import WeatherAPI, DEFAULT_POOL_SIZE
+from weather.metrics import metrics
+
+WEATHER_FIELDS = ["location", "latitude", "longitude", "city", "temperature", "description", "icon", "error"]
+FORECAST_FIELDS = ["location", "latitude", "longitude", "date", "temperature", "description", "error"]
+
+def parse_location(text):
+    """
+    Parses one location, given either as "latitude, longitude" or as a city name.
+
+    Args:
+        text (str): The location.
+
+    Returns:
+        tuple or str: A (latitude, longitude) tuple of floats, or the city name.
+    """
+    parts = text.split(",")
+    if len(parts) == 2:
+        try:
+            latitude, longitude = float(parts[0]), float(parts[1])
+        except ValueError:
+            return text
+        if -90 <= latitude <= 90 and -180 <= longitude <= 180:
+            return latitude, longitude
+    return text
+
+def read_locations(lines):
+    """
+    Lazily parses locations from lines of text, one per line, skipping blank lines
+    and lines starting with "#".
+
+    Args:
+        lines (iterable of str): The lines, such as an open file.
+
+    Yields:
+        tuple or str: The parsed locations.
+    """
+    for line in lines:
+        line = line.strip()
+        if line and not line.startswith("#"):
+            yield parse_location(line)
+
+def to_record(result, forecast=False):
+    """
+    Converts one batch result into the record written for it.
+
+    Args:
+        result (BatchResult): A result from get_weather_many or get_forecast_many.
+        forecast (bool): Whether the result holds a forecast rather than the current weather.
+
+    Returns:
+        dict: The location, its coordinates and either its weather, its forecast as a
+        list of days, or the error that prevented fetching it.
+    """
+    location = result.location if isinstance(result.location, str) else "{}, {}".format(*result.location)
+    latitude, longitude = result.coordinates or (None, None)
+    record = {"location": location, "latitude": latitude, "longitude": longitude}
+
+    if result.error is not None:
+        record["error"] = str(result.error) or type(result.error).__name__
+    elif forecast:
+        record["forecast"] = [
+            {"date": date, "temperature": temperature, "description": description}
+            for date, (temperature, description) in result.data.items()
+        ]
+    else:
+        city, temperature, description, icon_code = result.data
+        record.update(city=city, temperature=temperature, description=description, icon=icon_code)
+    return record
+
+class JSONLinesWriter:
+    """Writes every location as one JSON object per line."""
+
+    def __init__(self, stream, forecast=False):
+        """Initialises a writer to a text stream, of forecasts if forecast is True."""
+        self.stream = stream
+        self.forecast = forecast
+
+    def write(self, result):
+        """Writes the line of a BatchResult and flushes it."""
+        self.stream.write(json.dumps(to_record(result, self.forecast), ensure_ascii=False) + "\n")
+        self.stream.flush()
+
+class CSVWriter:
+    """Writes every location as a CSV row, or one row per day for forecasts."""
+
+    def __init__(self, stream, forecast=False):
+        """Initialises a writer to a text stream, of forecasts if forecast is True, and writes the header."""
+        self.stream = stream
+        self.forecast = forecast
+        self.writer = csv.DictWriter(stream, FORECAST_FIELDS if forecast else WEATHER_FIELDS)
+        self.writer.writeheader()
+
+    def write(self, result):
+        """Writes the rows of a BatchResult and flushes them."""
+        record = to_record(result, self.forecast)
+        days = record.pop("forecast", None)
+        if days:
+            self.writer.writerows(dict(record, **day) for day in days)
+        else:
+            self.writer.writerow(record)
+        self.stream.flush()
+
+WRITERS = {"jsonl": JSONLinesWriter, "csv": CSVWriter}
+
+def build_parser():
+    """Returns the argument parser of the command."""
+    parser = argparse.ArgumentParser(
+        prog="python -m weather.cli",
+        description="Fetch the weather of many locations and stream the results to standard output.",
+    )
+    parser.add_argument("locations", nargs="*",
+                        help='city names or "latitude, longitude" pairs')
+    parser.add_argument("-f", "--file", type=argparse.FileType("r", encoding="utf-8"),
+                        help='read locations from a file, one per line ("-" for standard input)')
+    parser.add_argument("--format", choices=WRITERS, default="jsonl",
+                        help="output format (default: jsonl)")
+    parser.add_argument("--forecast", action="store_true",
+                        help="fetch the five-day forecast instead of the current weather")
+    parser.add_argument("-j", "--concurrency", type=int, default=DEFAULT_POOL_SIZE,
+                        help=f"locations fetched at once (default: {DEFAULT_POOL_SIZE})")
+    parser.add_argument("--dedupe", action="store_true",
+                        help="output repeated locations once; memory then grows with the number of distinct locations")
+    parser.add_argument("--metrics", metavar="FILE",
+                        help='write timings and counters to FILE when done, as JSON or, if it ends in ".prom", for Prometheus')
+    return parser
+
+def main(argv=None, stdin=None, stdout=None):
+    """
+    Runs the command.
+
+    Args:
+        argv (list of str): The arguments, sys.argv[1:] by default.
+        stdin (file): Where locations are read from when none are given, sys.stdin by default.
+        stdout (file): Where the records are written, sys.stdout by default.
+
+    Returns:
+        int: 0 if every location was fetched, 1 if any failed, 2 on a usage or configuration error.
+    """
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    stdin = stdin or sys.stdin
+    stdout = stdout or sys.stdout
+    if args.concurrency < 1:
+        parser.error("--concurrency must be at least 1")
+    if args.metrics:
+        metrics.enable()
+
+    sources = [parse_location(location) for location in args.locations]
+    if args.file is not None:
+        sources = chain(sources, read_locations(args.file))
+    elif not args.locations:
+        if stdin.isatty():
+            parser.error("no locations given")
+        sources = read_locations(stdin)
+
+    try:
+        api = WeatherAPI.default()
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 2
+
+    fetch_many = api.get_forecast_many if args.forecast else api.get_weather_many
+    writer = WRITERS[args.format](stdout, args.forecast)
+    failed = False
+    try:
+        for result in fetch_many(sources, max_concurrency=args.concurrency, dedupe=args.dedupe):
+            failed = failed or result.error is not None
+            writer.write(result)
+    except BrokenPipeError:
+        # The reader went away, as with "| head"; stop without a traceback when exiting
+        os.dup2(os.open(os.devnull, os.O_WRONLY), stdout.fileno())
+    except KeyboardInterrupt:
+        return 130
+    finally:
+        if args.metrics:
+            metrics.dump(args.metrics)
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,67 @@
+"""
+Configuration shared by the whole application, loaded once per process.
+"""
+import os
+import sys
+from functools import lru_cache
+
+APP_DATA_FOLDER = ".python_weather_app"
+
+def get_file_path(filename, for_writing=False):
+    """Returns the correct path for a file in both normal and PyInstaller environments.
+    
+    Args:
+        filename (str): The name of the file to get the path for.
+        for_writing (bool): Whether the path is intended for writing (use user data directory).
+    
+    Returns:
+        str: The absolute path to the requested file.
+    """
+    if for_writing:
+        user_home = os.path.expanduser("~")
+        app_data_folder = os.path.join(user_home, APP_DATA_FOLDER)
+        os.makedirs(app_data_folder, exist_ok=True)
+        return os.path.join(app_data_folder, filename)
+
+    if getattr(sys, "frozen", False):
+        base_path = sys._MEIPASS
+    else:
+        base_path = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+    return os.path.join(base_path, filename)
+
+def get_flag(name):
+    """
+    Returns whether an environment variable turns a setting on.
+
+    Args:
+        name (str): The name of the environment variable.
+
+    Returns:
+        bool: True if it is set to 1, true or yes, in any case.
+    """
+    return os.environ.get(name, "").strip().lower() in ("1", "true", "yes")
+
+@lru_cache(maxsize=None)
+def get_api_key():
+    """
+    Retrieves the API key from the environment variables, loading the .env file the
+    first time it is called. Later calls return the same key without touching the disk.
+
+    Returns:
+        api_key: The API key, when retrieved successfully.
+
+    Raises:
+        ValueError: If the API key is not set.
+    """
+    # Imported here, so that only code which needs the key pays for it
+    from dotenv import load_dotenv
+
+    load_dotenv()
+
+    api_key = os.getenv("OPENWEATHER_API_KEY")
+
+    if api_key is None:
+        raise ValueError("The API key is not set. Please set the OPENWEATHER_API_KEY environment variable.")
+
+    return api_key
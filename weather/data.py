@@ -1,102 +1,490 @@
 from weather.api import WeatherAPI
-import sys
+from weather.metrics import metrics
+from weather.config import get_file_path
+from weather.gazetteer import gazetteer
 import os
-import shutil
+import json
+import time
+import sqlite3
 import logging
+import threading
 import requests
+from collections import OrderedDict, namedtuple
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
 
-def get_file_path(filename, for_writing=False):
-    """Returns the correct path for a file in both normal and PyInstaller environments.
-    
-    Args:
-        filename (str): The name of the file to get the path for.
-        for_writing (bool): Whether the path is intended for writing (use user data directory).
-    
-    Returns:
-        str: The absolute path to the requested file.
+FAVOURITES_DB = "favourites.db"
+LEGACY_FAVOURITES_FILE = "favourites.txt"
+
+# A favourite city. The coordinates and last fetched data are None until known.
+Favourite = namedtuple("Favourite", ["name", "latitude", "longitude", "last_data", "last_fetched"])
+
+GEOCODE_CACHE_FILE = "geocode_cache.json"
+GEOCODE_CACHE_SIZE = 2000
+# Unknown names are retried after a day, in case the geocoder learns about them
+NEGATIVE_CACHE_TTL = 24 * 60 * 60
+
+class FavouritesStore:
+    """
+    A SQLite store of favourite cities, with their coordinates and last fetched weather.
+
+    Cities are keyed by their normalised name, so each is stored once, and adding or
+    removing one touches a single row. On first use the cities of the old favourites.txt
+    file are imported, from the user data directory if it exists there, otherwise from
+    the bundled default.
+
+    Attributes:
+        path (str): The path to the database, resolved on first use if not given.
+        legacy_path (str): The path to the favourites.txt file to import, resolved on
+            first use if not given.
     """
-    if for_writing:
-        user_home = os.path.expanduser("~")
-        app_data_folder = os.path.join(user_home, ".python_weather_app")
-        os.makedirs(app_data_folder, exist_ok=True)
-        return os.path.join(app_data_folder, filename)
 
-    if getattr(sys, "frozen", False):
-        base_path = sys._MEIPASS
-    else:
-        base_path = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+    SCHEMA_VERSION = 1
+
+    def __init__(self, path=None, legacy_path=None):
+        """Initialises the store. The database is not opened until it is first needed."""
+        self.path = path
+        self.legacy_path = legacy_path
+        self._connection = None
+        self._lock = threading.RLock()
+
+    def _connect(self):
+        """Opens the database, creating and migrating it if needed. Must be called with the lock held."""
+        if self._connection is not None:
+            return self._connection
+        if self.path is None:
+            self.path = get_file_path(FAVOURITES_DB, for_writing=True)
+        connection = sqlite3.connect(self.path, check_same_thread=False)
+        connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS favourites (
+                key TEXT PRIMARY KEY,
+                name TEXT NOT NULL,
+                latitude REAL,
+                longitude REAL,
+                last_data TEXT,
+                last_fetched REAL,
+                added REAL NOT NULL
+            )
+            """
+        )
+        if connection.execute("PRAGMA user_version").fetchone()[0] < self.SCHEMA_VERSION:
+            with connection:
+                for city in self._read_legacy_file():
+                    connection.execute(
+                        "INSERT OR IGNORE INTO favourites (key, name, added) VALUES (?, ?, ?)",
+                        (normalise_city(city), city, time.time()),
+                    )
+                connection.execute(f"PRAGMA user_version = {self.SCHEMA_VERSION}")
+        self._connection = connection
+        return connection
+
+    def _read_legacy_file(self):
+        """Returns the cities listed in the old favourites.txt file, if there is one."""
+        paths = [self.legacy_path] if self.legacy_path else [
+            get_file_path(LEGACY_FAVOURITES_FILE, for_writing=True),
+            get_file_path(LEGACY_FAVOURITES_FILE),
+        ]
+        for path in paths:
+            try:
+                with open(path, "r") as file:
+                    return [city.strip() for city in file if city.strip()]
+            except FileNotFoundError:
+                continue
+            except IOError as e:
+                logging.error(f"File error: {e}")
+                return []
+        return []
+
+    def names(self):
+        """
+        Returns the names of all favourite cities.
+
+        Returns:
+            list of str: The names, in the order they were added.
+        """
+        with self._lock:
+            rows = self._connect().execute("SELECT name FROM favourites ORDER BY added, rowid")
+            return [name for (name,) in rows]
+
+    def get(self, city):
+        """
+        Returns a favourite city.
+
+        Args:
+            city (str): The name of the city.
+
+        Returns:
+            Favourite: The stored city, or None if it is not a favourite.
+        """
+        with self._lock:
+            row = self._connect().execute(
+                "SELECT name, latitude, longitude, last_data, last_fetched FROM favourites WHERE key = ?",
+                (normalise_city(city),),
+            ).fetchone()
+        if row is None:
+            return None
+        name, latitude, longitude, last_data, last_fetched = row
+        return Favourite(name, latitude, longitude, json.loads(last_data) if last_data else None, last_fetched)
+
+    def add(self, city, latitude=None, longitude=None):
+        """
+        Adds a city, or updates its coordinates if it is already a favourite.
+
+        Args:
+            city (str): The name of the city.
+            latitude (float): The latitude of the city, if known.
+            longitude (float): The longitude of the city, if known.
+
+        Returns:
+            bool: True if the city was not a favourite before.
+        """
+        with self._lock:
+            connection = self._connect()
+            with connection:
+                cursor = connection.execute(
+                    "INSERT OR IGNORE INTO favourites (key, name, latitude, longitude, added) VALUES (?, ?, ?, ?, ?)",
+                    (normalise_city(city), city, latitude, longitude, time.time()),
+                )
+                if cursor.rowcount == 0 and latitude is not None and longitude is not None:
+                    self.set_coordinates(city, latitude, longitude)
+                return cursor.rowcount == 1
+
+    def remove(self, city):
+        """
+        Removes a city from the favourites.
+
+        Args:
+            city (str): The name of the city.
+
+        Returns:
+            bool: True if the city was a favourite.
+        """
+        with self._lock:
+            connection = self._connect()
+            with connection:
+                cursor = connection.execute("DELETE FROM favourites WHERE key = ?", (normalise_city(city),))
+                return cursor.rowcount == 1
 
-    return os.path.join(base_path, filename)
+    def set_coordinates(self, city, latitude, longitude):
+        """
+        Stores the coordinates of a favourite city, so it never has to be geocoded again.
+
+        Args:
+            city (str): The name of the city.
+            latitude (float): The latitude of the city.
+            longitude (float): The longitude of the city.
+        """
+        with self._lock:
+            connection = self._connect()
+            with connection:
+                connection.execute(
+                    "UPDATE favourites SET latitude = ?, longitude = ? WHERE key = ?",
+                    (latitude, longitude, normalise_city(city)),
+                )
+
+    def set_data(self, city, data):
+        """
+        Stores the weather last fetched for a favourite city.
+
+        Args:
+            city (str): The name of the city.
+            data (dict): JSON-serialisable weather data.
+        """
+        with self._lock:
+            connection = self._connect()
+            with connection:
+                connection.execute(
+                    "UPDATE favourites SET last_data = ?, last_fetched = ? WHERE key = ?",
+                    (json.dumps(data), time.time(), normalise_city(city)),
+                )
+
+    def latest_weather(self, cities):
+        """
+        Returns the weather last fetched for some favourite cities, without their forecasts.
+
+        Args:
+            cities (list of str): The names of the cities.
+
+        Returns:
+            dict: The (weather, last_fetched) of each city that has data, keyed by its
+            normalised name, where weather is the tuple returned by WeatherAPI.fetch_weather.
+        """
+        keys = [normalise_city(city) for city in cities]
+        if not keys:
+            return {}
+        with self._lock:
+            rows = self._connect().execute(
+                "SELECT key, json_extract(last_data, '$.weather'), last_fetched FROM favourites "
+                f"WHERE key IN ({', '.join('?' * len(keys))}) AND last_data IS NOT NULL",
+                keys,
+            ).fetchall()
+        return {
+            key: (tuple(json.loads(weather)), last_fetched)
+            for key, weather, last_fetched in rows if weather is not None
+        }
+
+    def all(self):
+        """
+        Returns every favourite city.
+
+        Returns:
+            list of Favourite: The favourites, in the order they were added.
+        """
+        with self._lock:
+            rows = self._connect().execute(
+                "SELECT name, latitude, longitude, last_data, last_fetched FROM favourites ORDER BY added, rowid"
+            ).fetchall()
+        return [
+            Favourite(name, latitude, longitude, json.loads(last_data) if last_data else None, last_fetched)
+            for name, latitude, longitude, last_data, last_fetched in rows
+        ]
+
+    def close(self):
+        """Closes the database connection."""
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+favourites_store = FavouritesStore()
 
 def load_favourite_cities():
     """
-    Loads favourite cities from a file.
+    Loads favourite cities from the favourites store.
 
     Returns:
-        list of str: A list of city names, if the file is found and read successfully.
-        None: If the file is not found or an error occurs during reading.
+        list of str: A list of city names, or an empty list if an error occurs.
     """
     try:
-        persistent_file_path = get_file_path("favourites.txt", for_writing=True)
-        if not os.path.exists(persistent_file_path):
-            bundled_file_path = get_file_path("favourites.txt")
-            shutil.copy(bundled_file_path, persistent_file_path)
-        with open(persistent_file_path, "r") as file:
-            cities = file.readlines()
-            return [city.strip() for city in cities]
-    except FileNotFoundError:
-        logging.warning("Favourites file not found.")
-        return []
-    except IOError as e:
-        logging.error(f"File error: {e}")
+        return favourites_store.names()
+    except sqlite3.Error as e:
+        logging.error(f"Database error: {e}")
         return []
 
-def save_to_favourites(city):
+def save_to_favourites(city, latitude=None, longitude=None):
     """
-    Saves the specified city to the favourites list.
+    Saves the specified city to the favourites list, unless it is already there.
 
     Args:
         city (str): The name of the city to save to the favourites list.
+        latitude (float): The latitude of the city, if known.
+        longitude (float): The longitude of the city, if known.
 
     Returns:
-        bool: True if the city was saved successfully, False if an error occurred.
+        bool: True if the city was saved successfully or was already a favourite,
+        False if an error occurred.
     """
     try:
-        file_path = get_file_path("favourites.txt", for_writing=True)
-        with open(file_path, "a") as file:
-            file.write(f"{city}\n")
+        favourites_store.add(city, latitude, longitude)
         return True
-    except IOError as e:
-        logging.error(f"File error: {e}")
+    except sqlite3.Error as e:
+        logging.error(f"Database error: {e}")
         return False
 
-def get_coordinates_from_city(city):
+def remove_from_favourites(city):
     """
-    Returns coordinates based on the provided city name, using the OpenWeatherMap API.
+    Removes the specified city from the favourites list.
+
+    Args:
+        city (str): The name of the city to remove.
+
+    Returns:
+        bool: True if the city was removed or was not a favourite, False if an error occurred.
+    """
+    try:
+        favourites_store.remove(city)
+        return True
+    except sqlite3.Error as e:
+        logging.error(f"Database error: {e}")
+        return False
+
+def normalise_city(city):
+    """
+    Normalises a city name so that equivalent spellings share a cache key.
+
+    Args:
+        city (str): The city name as typed by the user.
+
+    Returns:
+        str: The city name, case-folded and with runs of whitespace collapsed.
+    """
+    return " ".join(city.split()).casefold()
+
+class GeocodeCache:
+    """
+    A persistent, size-bounded cache of city name to coordinates lookups.
+
+    Entries are kept in memory in least-recently-used order and written to a JSON
+    file in the user data directory whenever they change. Cities the geocoder does
+    not know are cached as (None, None) for a limited time.
+
+    Attributes:
+        path (str): The path to the cache file, resolved on first use if not given.
+        max_entries (int): The maximum number of cities kept before the least
+            recently used ones are evicted.
+        negative_ttl (float): How long, in seconds, an unknown city stays cached.
+    """
+
+    def __init__(self, path=None, max_entries=GEOCODE_CACHE_SIZE, negative_ttl=NEGATIVE_CACHE_TTL):
+        """Initialises the cache. The file is not read until the first lookup."""
+        self.path = path
+        self.max_entries = max_entries
+        self.negative_ttl = negative_ttl
+        self._entries = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        """Reads the cache file into memory, once. Must be called with the lock held."""
+        if self._entries is not None:
+            return
+        if self.path is None:
+            self.path = get_file_path(GEOCODE_CACHE_FILE, for_writing=True)
+        self._entries = OrderedDict()
+        try:
+            with open(self.path, "r") as file:
+                self._entries.update(json.load(file))
+        except FileNotFoundError:
+            pass
+        except (IOError, ValueError) as e:
+            logging.warning(f"Ignoring unreadable geocode cache: {e}")
+
+    def _save(self):
+        """Atomically writes the cache to disk. Must be called with the lock held."""
+        temp_path = f"{self.path}.tmp"
+        try:
+            with open(temp_path, "w") as file:
+                json.dump(self._entries, file)
+            os.replace(temp_path, self.path)
+        except IOError as e:
+            logging.error(f"File error: {e}")
+
+    def get(self, city):
+        """
+        Looks up the coordinates of a city.
+
+        Args:
+            city (str): The name of the city.
+
+        Returns:
+            tuple: The cached (latitude, longitude), which is (None, None) for a city
+            known not to exist.
+            None: If the city is not cached or its negative entry has expired.
+        """
+        key = normalise_city(city)
+        with self._lock:
+            self._load()
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry["lat"] is None and time.time() - entry["time"] > self.negative_ttl:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry["lat"], entry["lon"]
+
+    def set(self, city, latitude, longitude):
+        """
+        Stores the coordinates of a city and persists the cache.
+
+        Args:
+            city (str): The name of the city.
+            latitude (float): The latitude, or None if the city does not exist.
+            longitude (float): The longitude, or None if the city does not exist.
+        """
+        key = normalise_city(city)
+        with self._lock:
+            self._load()
+            self._entries[key] = {"lat": latitude, "lon": longitude, "time": time.time()}
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._save()
+
+    def clear(self):
+        """Removes every entry from the cache, in memory and on disk."""
+        with self._lock:
+            self._load()
+            self._entries.clear()
+            self._save()
+
+geocode_cache = GeocodeCache()
+
+def cached_coordinates(city):
+    """
+    Returns the coordinates of a city if they are known without a network request, from
+    the geocode cache or the offline gazetteer.
+
+    Args:
+        city (str): The name of the city.
+
+    Returns:
+        tuple: The (latitude, longitude), which is (None, None) for a city known not to exist.
+        None: If the city would have to be geocoded online.
+    """
+    cached = geocode_cache.get(city)
+    if cached is not None:
+        metrics.increment("geocode_lookups_total", result="hit")
+        return cached
+    local = gazetteer.resolve(city)
+    if local is not None:
+        metrics.increment("geocode_lookups_total", result="gazetteer")
+        return local
+    return None
+
+def geocode_city(city):
+    """
+    Returns coordinates based on the provided city name, using the OpenWeatherMap API,
+    raising on errors.
+
+    Cities listed in the offline gazetteer are resolved without a network request.
+    Other results, including cities that were not found, are stored in the geocode
+    cache, so each city only costs one network request.
 
     Args:
         city (str): The name of the city to retrieve coordinates for.
 
     Returns:
         tuple: A tuple containing latitude and longitude as floats, or (None, None) if the
-        city is not found or an error occurs.
+        city is not found.
+
+    Raises:
+        requests.exceptions.RequestException: If there is a network error, or the API
+            is not being called for now.
+        ValueError: If the response is not valid JSON.
+        KeyError: If the response is missing a field.
     """
-    api_key = WeatherAPI().get_api_key()
-    url = (
-        f"http://api.openweathermap.org/geo/1.0/direct?"
-        f"q={city}&limit=1&appid={api_key}"
-    )
-    try:
-        response = requests.get(url)
-        response.raise_for_status()
-        data = response.json()
+    cached = cached_coordinates(city)
+    if cached is not None:
+        return cached
+    metrics.increment("geocode_lookups_total", result="miss")
+
+    with metrics.span("stage_seconds", stage="geocode"):
+        api = WeatherAPI.default()
+        data = api.request(f"{api.base_url}/geo/1.0/direct", {"q": city, "limit": 1, "appid": api.api_key}).json()
 
         if not data:
+            geocode_cache.set(city, None, None)
             return None, None
 
-        return data[0]["lat"], data[0]["lon"]
+        latitude, longitude = data[0]["lat"], data[0]["lon"]
+        geocode_cache.set(city, latitude, longitude)
+        return latitude, longitude
+
+def get_coordinates_from_city(city):
+    """
+    Returns coordinates based on the provided city name, like geocode_city, but logs
+    errors instead of raising them.
+
+    Args:
+        city (str): The name of the city to retrieve coordinates for.
+
+    Returns:
+        tuple: A tuple containing latitude and longitude as floats, or (None, None) if the
+        city is not found or an error occurs.
+    """
+    try:
+        return geocode_city(city)
     except requests.exceptions.RequestException as e:
         logging.error(f"Network error: {e}")
         return None, None
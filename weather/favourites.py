@@ -0,0 +1,371 @@
+"""
+A searchable panel of favourite cities that stays quick with thousands of them.
+"""
+import time
+import logging
+import sqlite3
+import tkinter as tk
+from tkinter import ttk
+from datetime import datetime
+from weather.data import favourites_store, normalise_city
+from weather.gazetteer import fold
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+# The number of rows shown, and so the number of rows ever given to the Treeview
+VISIBLE_ROWS = 10
+# How often, in milliseconds, the conditions shown are read again, to pick up background refreshes
+REFRESH_INTERVAL_MS = 30 * 1000
+
+class FavouritesList:
+    """
+    The favourite city names, in the order they were added, filtered by a search text.
+
+    Filtering matches the text anywhere in a name, ignoring case and accents. When the
+    text only grows, as it does while typing, just the current matches are searched
+    again. Adding and removing a city updates the matches in place.
+
+    Attributes:
+        query (str): The search key of the current filter, "" to match every city.
+        matches (list of str): The names matching the filter, in the order they were added.
+    """
+
+    def __init__(self, names=()):
+        """
+        Initialises the list.
+
+        Args:
+            names (iterable of str): The favourite city names, in the order they were added.
+        """
+        self.query = ""
+        self.reset(names)
+
+    def __len__(self):
+        return len(self.matches)
+
+    def __contains__(self, name):
+        return normalise_city(name) in self._keys
+
+    @property
+    def total(self):
+        """The number of names, matching the filter or not."""
+        return len(self._names)
+
+    def reset(self, names):
+        """
+        Replaces every name, keeping the current filter.
+
+        Args:
+            names (iterable of str): The favourite city names, in the order they were added.
+        """
+        self._names = []
+        self._keys = {}
+        for name in names:
+            self.add(name, refilter=False)
+        self.matches = [name for name in self._names if self._matches(name, self.query)]
+
+    def _matches(self, name, query):
+        """Returns whether a name matches a search key."""
+        return query in self._keys[normalise_city(name)]
+
+    def filter(self, text):
+        """
+        Filters the names by a search text.
+
+        Args:
+            text (str): The text to look for in the names.
+
+        Returns:
+            list of str: The matching names.
+        """
+        query = fold(text)
+        candidates = self.matches if query.startswith(self.query) else self._names
+        self.matches = [name for name in candidates if self._matches(name, query)]
+        self.query = query
+        return self.matches
+
+    def add(self, name, refilter=True):
+        """
+        Adds a name at the end, unless it is in the list already.
+
+        Args:
+            name (str): The name of the city.
+            refilter (bool): Whether to add it to the matches if it matches the filter.
+
+        Returns:
+            bool: True if the name was added.
+        """
+        key = normalise_city(name)
+        if key in self._keys:
+            return False
+        self._keys[key] = fold(name)
+        self._names.append(name)
+        if refilter and self._matches(name, self.query):
+            self.matches.append(name)
+        return True
+
+    def remove(self, name):
+        """
+        Removes a name.
+
+        Args:
+            name (str): The name of the city, in any spelling that normalises the same.
+
+        Returns:
+            bool: True if the name was in the list.
+        """
+        key = normalise_city(name)
+        if self._keys.pop(key, None) is None:
+            return False
+        self._names = [other for other in self._names if normalise_city(other) != key]
+        self.matches = [other for other in self.matches if normalise_city(other) != key]
+        return True
+
+    def window(self, start, count):
+        """
+        Returns a slice of the matches.
+
+        Args:
+            start (int): The position of the first match.
+            count (int): The most matches returned.
+
+        Returns:
+            list of str: The matching names from start.
+        """
+        return self.matches[start:start + count]
+
+def format_conditions(weather, last_fetched, now=None):
+    """
+    Formats the last fetched weather of a favourite for a row of the table.
+
+    Args:
+        weather (tuple): The (city, temperature, description, icon code), or None.
+        last_fetched (float): When the weather was fetched, as a timestamp.
+        now (float): The current time, for testing.
+
+    Returns:
+        tuple: The temperature, description and time fetched, as strings, empty if
+        there is no weather.
+    """
+    if weather is None:
+        return "", "", ""
+    fetched = datetime.fromtimestamp(last_fetched)
+    same_day = fetched.date() == datetime.fromtimestamp(now if now is not None else time.time()).date()
+    return f"{weather[1]:.1f}°C", weather[2], fetched.strftime("%H:%M" if same_day else "%d/%m")
+
+class FavouritesPanel(ttk.Frame):
+    """
+    A search box over a table of the favourite cities and their last fetched weather.
+
+    The table is virtual: the Treeview only ever holds VISIBLE_ROWS rows, which are
+    filled with the matches at the scroll position whenever it changes. Only the
+    weather of the visible cities is read from the store.
+
+    Attributes:
+        favourites (FavouritesList): The names shown, filtered by the search box.
+        offset (int): The position in the matches of the first row shown.
+        selected (str): The name of the selected city, or None.
+        on_select (callable): Called with the name of a city opened with a double
+            click or Return.
+        on_remove (callable): Called with the name of a city to remove with Delete.
+    """
+
+    def __init__(self, master, on_select, on_remove, store=favourites_store, rows=VISIBLE_ROWS):
+        """
+        Initialises the panel, empty until set_names is called.
+
+        Args:
+            master (tk.Misc): The parent widget.
+            on_select (callable): Called with the name of the city to show.
+            on_remove (callable): Called with the name of the city to remove.
+            store (FavouritesStore): Where the last fetched weather is read from.
+            rows (int): The number of rows shown.
+        """
+        super().__init__(master)
+        self.on_select = on_select
+        self.on_remove = on_remove
+        self.store = store
+        self.favourites = FavouritesList()
+        self.offset = 0
+        self.selected = None
+        self._rows = rows
+        self._shown = []
+
+        self.search = ttk.Entry(self, width=30)
+        self.search.grid(row=0, column=0, columnspan=2, sticky=(tk.W, tk.E), pady=(0, 5))
+        self.search.bind("<KeyRelease>", self.apply_filter)
+
+        self.table = ttk.Treeview(
+            self, columns=("City", "Temperature", "Description", "Updated"), show="headings",
+            height=rows, selectmode="browse",
+        )
+        for column, text, width in (
+            ("City", "City", 150), ("Temperature", "Temp.", 70),
+            ("Description", "Conditions", 130), ("Updated", "Updated", 60),
+        ):
+            self.table.heading(column, text=text)
+            self.table.column(column, width=width, anchor="w" if column == "City" else "center")
+        self.table.grid(row=1, column=0, sticky=(tk.N, tk.S, tk.W, tk.E))
+        self.scrollbar = ttk.Scrollbar(self, orient=tk.VERTICAL, command=self.yview)
+        self.scrollbar.grid(row=1, column=1, sticky=(tk.N, tk.S))
+
+        self._items = [self.table.insert("", "end") for _ in range(rows)]
+        for item in self._items:
+            self.table.detach(item)
+
+        self.count = tk.StringVar()
+        ttk.Label(self, textvariable=self.count).grid(row=2, column=0, sticky=tk.W, pady=(5, 0))
+
+        self.table.bind("<<TreeviewSelect>>", self._remember_selection)
+        self.table.bind("<Double-1>", lambda event: self._open())
+        self.table.bind("<Return>", lambda event: self._open())
+        self.table.bind("<Delete>", lambda event: self._remove())
+        self.table.bind("<Up>", lambda event: self._step(-1))
+        self.table.bind("<Down>", lambda event: self._step(1))
+        self.table.bind("<MouseWheel>", lambda event: self.scroll(-1 if event.delta > 0 else 1))
+        self.table.bind("<Button-4>", lambda event: self.scroll(-1))
+        self.table.bind("<Button-5>", lambda event: self.scroll(1))
+        self.after(REFRESH_INTERVAL_MS, self._refresh_periodically)
+
+    def set_names(self, names):
+        """
+        Replaces every favourite shown.
+
+        Args:
+            names (list of str): The favourite city names, in the order they were added.
+        """
+        self.favourites.reset(names)
+        self.offset = 0
+        self.render()
+
+    def add(self, name):
+        """
+        Adds a favourite, or finds it if it is one already, and scrolls to it and
+        selects it if it matches the filter.
+
+        Args:
+            name (str): The name of the city.
+        """
+        key = normalise_city(name)
+        self.favourites.add(name)
+        matches = self.favourites.matches
+        # Searched from the end, where a new favourite is; an existing one may be spelt differently
+        position = next(
+            (position for position in range(len(matches) - 1, -1, -1) if normalise_city(matches[position]) == key),
+            None,
+        )
+        if position is not None:
+            self.selected = matches[position]
+            if not self.offset <= position < self.offset + self._rows:
+                self.offset = position - self._rows + 1 if position > self.offset else position
+        self.render()
+
+    def remove(self, name):
+        """
+        Removes a favourite.
+
+        Args:
+            name (str): The name of the city.
+        """
+        if self.favourites.remove(name):
+            if self.selected is not None and normalise_city(self.selected) == normalise_city(name):
+                self.selected = None
+            self.render()
+
+    def apply_filter(self, event=None):
+        """Shows only the favourites containing the search text, from the top."""
+        self.favourites.filter(self.search.get())
+        self.offset = 0
+        self.render()
+
+    def render(self):
+        """Fills the rows with the matches at the scroll position and their last fetched weather."""
+        total = len(self.favourites)
+        self.offset = max(0, min(self.offset, total - self._rows))
+        self._shown = self.favourites.window(self.offset, self._rows)
+        try:
+            latest = self.store.latest_weather(self._shown)
+        except sqlite3.Error as e:
+            logging.error(f"Database error: {e}")
+            latest = {}
+
+        selection = ()
+        for position, item in enumerate(self._items):
+            if position >= len(self._shown):
+                self.table.detach(item)
+                continue
+            name = self._shown[position]
+            weather, last_fetched = latest.get(normalise_city(name), (None, None))
+            self.table.item(item, values=(name,) + format_conditions(weather, last_fetched))
+            self.table.move(item, "", position)
+            if name == self.selected:
+                selection = (item,)
+        self.table.selection_set(selection)
+
+        if total:
+            self.scrollbar.set(self.offset / total, min(1, (self.offset + self._rows) / total))
+        else:
+            self.scrollbar.set(0, 1)
+        if self.favourites.total:
+            self.count.set(f"{total} of {self.favourites.total} favourites")
+        else:
+            self.count.set("No saved cities available.")
+
+    def yview(self, *args):
+        """Scrolls the table, as the command of its scrollbar."""
+        total = len(self.favourites)
+        if args[0] == "moveto":
+            self.offset = int(float(args[1]) * total)
+        elif args[0] == "scroll":
+            step = self._rows - 1 if args[2] == "pages" else 1
+            self.offset += int(args[1]) * step
+        self.render()
+
+    def scroll(self, rows):
+        """
+        Scrolls the table.
+
+        Args:
+            rows (int): The number of rows to scroll down, or up if negative.
+        """
+        self.offset += rows
+        self.render()
+        return "break"
+
+    def _remember_selection(self, event=None):
+        """Keeps the name of the selected city, so it stays selected while scrolling."""
+        selection = self.table.selection()
+        if selection:
+            self.selected = self._shown[self._items.index(selection[0])]
+
+    def _step(self, rows):
+        """Moves the selection by a number of rows, scrolling when it leaves the table."""
+        matches = self.favourites.matches
+        if not matches:
+            return "break"
+        if self.selected in matches:
+            position = min(max(matches.index(self.selected) + rows, 0), len(matches) - 1)
+        else:
+            position = self.offset
+        self.selected = matches[position]
+        if position < self.offset:
+            self.offset = position
+        elif position >= self.offset + self._rows:
+            self.offset = position - self._rows + 1
+        self.render()
+        return "break"
+
+    def _open(self):
+        """Shows the weather of the selected city."""
+        if self.selected is not None:
+            self.on_select(self.selected)
+
+    def _remove(self):
+        """Asks for the selected city to be removed."""
+        if self.selected is not None:
+            self.on_remove(self.selected)
+
+    def _refresh_periodically(self):
+        """Shows the weather refreshed in the background since the last render."""
+        self.render()
+        self.after(REFRESH_INTERVAL_MS, self._refresh_periodically)
@@ -0,0 +1,129 @@
+"""
+Columnar storage and daily aggregation of three-hourly forecasts.
+"""
+import time
+from array import array
+from collections import Counter, namedtuple
+from datetime import datetime, timezone
+from itertools import groupby
+
+SECONDS_PER_DAY = 24 * 60 * 60
+
+# The aggregated forecast of one local calendar day
+DailySummary = namedtuple(
+    "DailySummary",
+    [
+        "date",
+        "min_temperature",
+        "max_temperature",
+        "mean_temperature",
+        "mean_humidity",
+        "max_wind_speed",
+        "max_pop",
+        "description",
+        "samples",
+    ],
+)
+
+class ForecastTable:
+    """
+    A forecast stored column by column, one typed array per field.
+
+    Each column holds one value per three-hourly sample, in time order. Aggregations
+    work on whole slices of these columns at once instead of on per-sample dictionaries.
+
+    Attributes:
+        timestamps (array): The UTC time of each sample, in seconds since the epoch.
+        temperatures (array): The temperature of each sample, in °C.
+        humidity (array): The relative humidity of each sample, in percent.
+        wind_speeds (array): The wind speed of each sample, in m/s.
+        pops (array): The probability of precipitation of each sample, from 0 to 1.
+        descriptions (list of str): The weather description of each sample.
+        timezone_offset (int): The offset of the location from UTC, in seconds.
+    """
+
+    def __init__(self, timestamps, temperatures, humidity, wind_speeds, pops, descriptions, timezone_offset=0):
+        """Initialises the table from its columns, which must all have the same length."""
+        self.timestamps = array("q", timestamps)
+        self.temperatures = array("d", temperatures)
+        self.humidity = array("d", humidity)
+        self.wind_speeds = array("d", wind_speeds)
+        self.pops = array("d", pops)
+        self.descriptions = list(descriptions)
+        self.timezone_offset = timezone_offset
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    @classmethod
+    def from_response(cls, forecast_data):
+        """
+        Builds a table from a /data/2.5/forecast response.
+
+        Args:
+            forecast_data (dict): The decoded JSON response.
+
+        Returns:
+            ForecastTable: The forecast, sorted by time.
+
+        Raises:
+            KeyError: If the response data is missing a required field.
+        """
+        items = sorted(forecast_data["list"], key=lambda item: item["dt"])
+        return cls(
+            (item["dt"] for item in items),
+            (item["main"]["temp"] for item in items),
+            (item["main"].get("humidity", 0) for item in items),
+            (item.get("wind", {}).get("speed", 0) for item in items),
+            (item.get("pop", 0) for item in items),
+            (item["weather"][0]["description"] for item in items),
+            forecast_data.get("city", {}).get("timezone", 0),
+        )
+
+    def day_numbers(self):
+        """
+        Returns the local calendar day of each sample, as a count of days since the epoch.
+
+        Returns:
+            array: One day number per sample.
+        """
+        offset = self.timezone_offset
+        return array("q", [(timestamp + offset) // SECONDS_PER_DAY for timestamp in self.timestamps])
+
+    def daily_summaries(self, skip_today=True, now=None):
+        """
+        Aggregates the samples into one summary per local calendar day.
+
+        Args:
+            skip_today (bool): Whether to leave out the current local day, which is
+                usually only partly covered.
+            now (float): The current time in seconds since the epoch, for testing.
+
+        Returns:
+            list of DailySummary: The summaries, in date order, with dates formatted
+            as DD-MM-YYYY.
+        """
+        now = time.time() if now is None else now
+        today = (int(now) + self.timezone_offset) // SECONDS_PER_DAY
+
+        summaries = []
+        start = 0
+        for day, run in groupby(self.day_numbers()):
+            end = start + sum(1 for _ in run)
+            if not (skip_today and day == today):
+                temperatures = self.temperatures[start:end]
+                count = end - start
+                description = Counter(self.descriptions[start:end]).most_common(1)[0][0]
+                summaries.append(DailySummary(
+                    datetime.fromtimestamp(day * SECONDS_PER_DAY, timezone.utc).strftime("%d-%m-%Y"),
+                    min(temperatures),
+                    max(temperatures),
+                    sum(temperatures) / count,
+                    sum(self.humidity[start:end]) / count,
+                    max(self.wind_speeds[start:end]),
+                    max(self.pops[start:end]),
+                    description,
+                    count,
+                ))
+            start = end
+        return summaries
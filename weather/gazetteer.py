@@ -0,0 +1,186 @@
+"""
+An offline list of cities, for suggesting names as they are typed and resolving
+well-known ones without a network request.
+"""
+import os
+import heapq
+import logging
+import threading
+import unicodedata
+from array import array
+from bisect import bisect_left
+from weather.config import get_file_path
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+GAZETTEER_FILE = "cities.tsv"
+# A GeoNames dump, such as cities15000.txt, can be used instead of the bundled list
+GAZETTEER_ENV = "WEATHER_GAZETTEER"
+DEFAULT_SUGGESTIONS = 8
+# The columns of the name, latitude, longitude, country code and population in a GeoNames dump
+GEONAMES_COLUMNS = (1, 4, 5, 8, 14)
+
+def fold(name):
+    """
+    Returns the search key of a place name: case-folded, with accents removed and runs
+    of whitespace collapsed, so "São Paulo" and "sao  paulo" match.
+
+    Args:
+        name (str): The place name.
+
+    Returns:
+        str: The search key.
+    """
+    decomposed = unicodedata.normalize("NFKD", name)
+    stripped = "".join(character for character in decomposed if not unicodedata.combining(character))
+    return " ".join(stripped.split()).casefold()
+
+def parse_query(query):
+    """
+    Splits a query such as "London, GB" into its search key and country code.
+
+    Returns:
+        tuple: The search key (str) and the upper-case country code (str), or None if
+        the query names no country.
+    """
+    name, _, country = query.partition(",")
+    return fold(name), country.strip().upper() or None
+
+class Gazetteer:
+    """
+    A read-only, in-memory index of cities sorted by search key, searched by prefix
+    with binary search.
+
+    The file is read on first use, not when the gazetteer is created, so it costs
+    nothing at startup. Each row holds a name, country code, latitude, longitude and
+    population, tab-separated; a GeoNames dump is read as well. If the file is
+    missing, the gazetteer is empty.
+
+    Attributes:
+        path (str): The path to the city list, resolved on first use if not given.
+    """
+
+    def __init__(self, path=None):
+        """Initialises the gazetteer. The file is not read until the first lookup."""
+        self.path = path
+        self._keys = None
+        self._names = []
+        self._countries = []
+        self._latitudes = array("d")
+        self._longitudes = array("d")
+        self._populations = array("q")
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self):
+        """Whether the city list has been read."""
+        return self._keys is not None
+
+    def __len__(self):
+        self._load()
+        return len(self._keys)
+
+    def _load(self):
+        """Reads and indexes the city list, once."""
+        if self._keys is not None:
+            return
+        with self._lock:
+            if self._keys is not None:
+                return
+            if self.path is None:
+                self.path = os.environ.get(GAZETTEER_ENV) or get_file_path(GAZETTEER_FILE)
+            rows = []
+            try:
+                with open(self.path, "r", encoding="utf-8") as file:
+                    for line in file:
+                        row = self._parse_row(line)
+                        if row is not None:
+                            rows.append(row)
+            except FileNotFoundError:
+                logging.info(f"No gazetteer at {self.path}, cities will be geocoded online.")
+            except (IOError, UnicodeDecodeError) as e:
+                logging.warning(f"Ignoring unreadable gazetteer: {e}")
+            rows.sort()
+            for _, name, country, latitude, longitude, population in rows:
+                self._names.append(name)
+                self._countries.append(country)
+                self._latitudes.append(latitude)
+                self._longitudes.append(longitude)
+                self._populations.append(population)
+            self._keys = [row[0] for row in rows]
+
+    @staticmethod
+    def _parse_row(line):
+        """Returns a (key, name, country, latitude, longitude, population) row, or None to skip the line."""
+        if line.startswith("#") or not line.strip():
+            return None
+        fields = line.rstrip("\n").split("\t")
+        try:
+            if len(fields) > max(GEONAMES_COLUMNS):
+                name, latitude, longitude, country, population = (fields[column] for column in GEONAMES_COLUMNS)
+            else:
+                name, country, latitude, longitude, population = fields[:5]
+            return fold(name), name, country, float(latitude), float(longitude), int(population or 0)
+        except ValueError:
+            return None
+
+    def _range(self, prefix):
+        """Returns the positions of the keys starting with a prefix."""
+        self._load()
+        start = bisect_left(self._keys, prefix)
+        end = bisect_left(self._keys, prefix + "\U0010ffff", start)
+        return range(start, end)
+
+    def suggest(self, text, limit=DEFAULT_SUGGESTIONS):
+        """
+        Returns the cities whose names start with the text, most populous first.
+
+        Args:
+            text (str): What has been typed so far, optionally followed by a comma and
+                the start of a country code.
+            limit (int): The maximum number of suggestions.
+
+        Returns:
+            list of str: Names such as "London, GB", without duplicates.
+        """
+        prefix, country = parse_query(text)
+        if not prefix:
+            return []
+        matches = (
+            position for position in self._range(prefix)
+            if country is None or self._countries[position].startswith(country)
+        )
+        suggestions = []
+        for position in heapq.nlargest(limit * 2, matches, key=self._populations.__getitem__):
+            suggestion = f"{self._names[position]}, {self._countries[position]}"
+            if suggestion not in suggestions:
+                suggestions.append(suggestion)
+        return suggestions[:limit]
+
+    def resolve(self, query):
+        """
+        Returns the coordinates of the most populous city with exactly the queried name.
+
+        Args:
+            query (str): A city name, optionally followed by a comma and a country code,
+                such as "London, CA".
+
+        Returns:
+            tuple: The (latitude, longitude) of the city, or None if it is not listed.
+        """
+        key, country = parse_query(query)
+        if not key:
+            return None
+        best = None
+        for position in self._range(key):
+            if self._keys[position] != key:
+                break
+            if country is not None and self._countries[position] != country:
+                continue
+            if best is None or self._populations[position] > self._populations[best]:
+                best = position
+        if best is None:
+            return None
+        return self._latitudes[best], self._longitudes[best]
+
+gazetteer = Gazetteer()
@@ -1,41 +1,82 @@
 import tkinter as tk
 from tkinter import ttk
 from weather.api import WeatherAPI
-from weather.data import load_favourite_cities, save_to_favourites, get_coordinates_from_city
+from weather.data import (
+    load_favourite_cities, save_to_favourites, remove_from_favourites, get_coordinates_from_city,
+    favourites_store, geocode_cache
+)
+from weather.tasks import BackgroundRunner
+from weather.metrics import metrics
+from weather.history import history
+from weather.gazetteer import gazetteer
+from weather.prefetch import Speculator
+from weather.favourites import FavouritesPanel
+from datetime import datetime
 import logging
+import sqlite3
 import webbrowser
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
+# How long, in milliseconds, the input must stay unchanged before a speculative lookup starts
+SPECULATION_DELAY_MS = 400
+# Shorter city names are still being typed too often to be worth a speculative lookup
+MIN_SPECULATIVE_CITY_LENGTH = 3
+
 class Weather:
     """
     A class to create and manage the Weather Forecast GUI.
 
     Attributes:
         master (tk.Tk): The root window of the application.
-        input_city (ttk.Entry): Entry widget for the city name.
+        input_city (ttk.Combobox): Entry widget for the city name, which suggests
+            cities from the gazetteer as the name is typed.
         input_latitude (ttk.Entry): Entry widget for the latitude.
         input_longitude (ttk.Entry): Entry widget for the longitude.
-        favourite_cities (ttk.Combobox): Combobox for selecting the saved favourite cities.
+        favourites (FavouritesPanel): Searchable table of the favourite cities and their
+            last fetched weather.
         weather_info (tk.StringVar): Variable to display the weather information.
         icon_label (ttk.Label): Label widget to display the weather icon.
+        icon_images (dict): Decoded weather icons, keyed by icon code.
+        progress (ttk.Progressbar): Progress bar shown while a lookup is running.
         forecast_tree (ttk.Treeview): Treeview widget to display the weather forecast.
+        runner (BackgroundRunner): Runs the network requests off the main thread.
+        scheduler (RefreshScheduler): Keeps the weather of the favourites fresh in the
+            background, or None.
+        speculator (Speculator): Fetches the location being typed into the cache before
+            it is asked for.
+        profiler (SessionProfiler): Profiles each lookup, or None.
     """
 
-    def __init__(self, master):
-        """Initialises the application and sets up the widgets."""
+    def __init__(self, master, scheduler=None, profiler=None):
+        """
+        Initialises the application and sets up the widgets.
+
+        Args:
+            master (tk.Tk): The root window of the application.
+            scheduler (RefreshScheduler): The scheduler to tell about new favourites, if any.
+            profiler (SessionProfiler): The profiler to record each lookup with, if any.
+        """
         self.master = master
+        self.scheduler = scheduler
+        self.profiler = profiler
         self.master.title("Weather Forecast")
-        self.master.geometry("700x550")
+        self.master.geometry("1180x550")
         self.master.configure(bg="#f0f0f0")
         self.center_window()
 
         self.weather_info = tk.StringVar()
         self.city_entry = None
         self.icon_label = None
+        self.icon_images = {}
         self.forecast_tree = None
+        self.runner = BackgroundRunner(self.master)
+        self.speculator = Speculator()
+        self._speculation_timer = None
+        self._speculated = None
 
         self.create_widgets()
+        self.show_last_known()
 
     def center_window(self):
         """Centers the window on app launch."""
@@ -62,8 +103,11 @@ class Weather:
 
         # Create and place input fields
         ttk.Label(self.frame, text="City:").grid(row=0, column=0, sticky=tk.W, pady=10)
-        self.input_city = ttk.Entry(self.frame, width=30)
+        self.input_city = ttk.Combobox(self.frame, width=28)
         self.input_city.grid(row=0, column=1, sticky=tk.W, pady=5, padx=(0, 10))
+        self.input_city.bind("<KeyRelease>", self.suggest_cities)
+        self.input_city.bind("<KeyRelease>", self.schedule_speculation, add="+")
+        self.input_city.bind("<<ComboboxSelected>>", self.schedule_speculation)
 
         ttk.Label(self.frame, text="Latitude:").grid(row=1, column=0, sticky=tk.W, pady=10)
         self.input_latitude = ttk.Entry(self.frame, width=30)
@@ -72,6 +116,8 @@ class Weather:
         ttk.Label(self.frame, text="Longitude:").grid(row=2, column=0, sticky=tk.W, pady=10)
         self.input_longitude = ttk.Entry(self.frame, width=30)
         self.input_longitude.grid(row=2, column=1, sticky=tk.W, pady=5, padx=(0, 10))
+        for entry in (self.input_latitude, self.input_longitude):
+            entry.bind("<KeyRelease>", self.schedule_speculation)
 
         # Create and place buttons
         button_frame = ttk.Frame(self.frame)
@@ -86,16 +132,20 @@ class Weather:
         ttk.Button(button_frame, text="Quit", command=self.quit_app).grid(
             row=0, column=3, padx=5)
 
-        # Create and place favourite cities list
-        ttk.Label(self.frame, text="Favourite Cities:").grid(row=4, column=0, sticky=tk.W, pady=10)
-        self.favourite_cities = ttk.Combobox(self.frame, state="readonly")
-        self.favourite_cities.grid(row=4, column=1, sticky=tk.W, pady=5, padx=(0, 10))
+        # Create and place the favourite cities, searched as the filter is typed
+        favourites_frame = ttk.Frame(self.frame, padding=(20, 0, 0, 0))
+        favourites_frame.grid(row=0, column=2, rowspan=6, sticky=(tk.N, tk.S))
+        ttk.Label(favourites_frame, text="Favourite Cities (type to filter, Delete to remove):").grid(
+            row=0, column=0, sticky=tk.W, pady=(10, 5))
+        self.favourites = FavouritesPanel(
+            favourites_frame, on_select=self.load_favourite_location, on_remove=self.remove_favourite
+        )
+        self.favourites.grid(row=1, column=0, sticky=(tk.N, tk.S))
         self.load_favourite_cities()
-        self.favourite_cities.bind("<<ComboboxSelected>>", self.load_favourite_location)
 
         # Create and place weather information
         self.weather_frame = ttk.Frame(self.frame)
-        self.weather_frame.grid(row=5, column=0, columnspan=2, pady=20)
+        self.weather_frame.grid(row=4, column=0, columnspan=2, rowspan=2, pady=20)
 
         self.weather_info = tk.StringVar()
         ttk.Label(self.weather_frame, textvariable=self.weather_info, wraplength=500, justify="left").grid(
@@ -104,9 +154,12 @@ class Weather:
         self.icon_label = ttk.Label(self.weather_frame)
         self.icon_label.grid(row=0, column=1, padx=10, pady=10)
 
+        # Shown only while a lookup is running
+        self.progress = ttk.Progressbar(self.weather_frame, mode="indeterminate", length=200)
+
         # Create forecast frame
         self.forecast_frame = ttk.Frame(self.frame)
-        self.forecast_frame.grid(row=6, column=0, columnspan=2, pady=20)
+        self.forecast_frame.grid(row=6, column=0, columnspan=3, pady=20)
 
         # Create and place forecast information
         self.forecast_tree = ttk.Treeview(
@@ -124,30 +177,49 @@ class Weather:
 
     def load_favourite_cities(self):
         """
-        Loads the favourite cities from a file into the combobox.
+        Loads the favourite cities from the favourites store into the favourites panel,
+        in the background so that a long list never holds up the window.
+        """
+        self.runner.submit("favourites", load_favourite_cities, self.show_favourite_cities)
 
-        If the file is not found or an error occurs, a message is displayed to the user.
+    def show_favourite_cities(self, cities, error):
         """
-        cities = load_favourite_cities()
-        if cities:
-            self.favourite_cities["values"] = ["Select a city"] + cities
-            self.favourite_cities.set("Select a city")
-        else:
-            self.favourite_cities["values"] = ["Unable to load cities"]
-            self.weather_info.set("Favourites file not found. No saved cities available.")
-            logging.error("Failed to load favourite cities. Favourites file not found.")
+        Shows the loaded favourite cities. If an error occurs, a message is displayed
+        in the favourites panel, leaving the weather shown alone.
+
+        Args:
+            cities (list of str): The names of the favourite cities.
+            error (Exception): The exception raised while loading them, or None.
+        """
+        if error is not None:
+            self.favourites.count.set("Unable to load the favourite cities.")
+            logging.error(f"Failed to load favourite cities: {error}")
+            return
+        self.favourites.set_names(cities)
 
-    def load_favourite_location(self, event):
+    def load_favourite_location(self, city):
         """
-        Loads the latitude and longitude for the selected favourite location.
+        Shows the weather for the selected favourite location.
+
+        Favourites with stored coordinates go straight to the weather lookup,
+        without geocoding the city again.
 
         Args:
-            event: The event object triggered by selecting a city from the combobox.
+            city (str): The name of the city opened in the favourites panel.
         """
-        city = self.favourite_cities.get()
-        if city != "Select a city":
-            self.input_city.delete(0, tk.END)
-            self.input_city.insert(0, city)
+        self.input_city.delete(0, tk.END)
+        self.input_city.insert(0, city)
+
+        latitude = longitude = None
+        try:
+            favourite = favourites_store.get(city)
+            if favourite is not None:
+                latitude, longitude = favourite.latitude, favourite.longitude
+        except sqlite3.Error as e:
+            logging.error(f"Database error: {e}")
+        self.cancel_speculation()
+        self.start_loading()
+        self.submit_lookup(city, latitude, longitude)
 
     def save_to_favourites(self):
         """
@@ -160,13 +232,31 @@ class Weather:
             self.weather_info.set("Please enter a valid city name.")
             logging.warning("Attempted to save an invalid city name.")
             return
-        if save_to_favourites(city):
-            self.load_favourite_cities()
-            self.favourite_cities.set(city)
+        # Store the coordinates too if the city has been looked up before
+        latitude, longitude = geocode_cache.get(city) or (None, None)
+        if save_to_favourites(city, latitude, longitude):
+            self.favourites.add(city)
+            if self.scheduler is not None:
+                self.scheduler.add(city)
         else:
             self.weather_info.set("Error saving to favourites file. Please try again later.")
             logging.error("Failed to save city to favourites.")
 
+    def remove_favourite(self, city):
+        """
+        Removes a city from the favourites list.
+
+        Args:
+            city (str): The name of the city.
+        """
+        if remove_from_favourites(city):
+            self.favourites.remove(city)
+            if self.scheduler is not None:
+                self.scheduler.remove(city)
+        else:
+            self.weather_info.set("Error removing from favourites. Please try again later.")
+            logging.error("Failed to remove city from favourites.")
+
     def show_weather(self):
         """
         Retrieves and displays weather information for the specified city or coordinates.
@@ -174,66 +264,308 @@ class Weather:
         The weather information includes the current temperature, description,
         and a weather icon. If the input is invalid or the data cannot be retrieved,
         an error message is displayed.
+
+        The requests run in the background, so the window stays responsive. Clicking
+        again while a lookup is running supersedes it, and any speculative lookup is
+        abandoned.
+        """
+        try:
+            city, latitude, longitude = self.read_location()
+        except ValueError as e:
+            self.weather_info.set(str(e))
+            logging.warning(f"Invalid location input: {e}")
+            return
+
+        self.cancel_speculation()
+        self.start_loading()
+        self.submit_lookup(city, latitude, longitude)
+
+    def submit_lookup(self, city, latitude, longitude):
+        """
+        Starts a lookup in the background, superseding any running one, and profiles
+        its fetching and rendering if profiling is on.
+
+        Args:
+            city (str): The city name, used when the coordinates are None.
+            latitude (float): The latitude, or None to geocode the city.
+            longitude (float): The longitude, or None to geocode the city.
+        """
+        fetch, display = self.fetch_weather, self.display_weather
+        if self.profiler is not None:
+            capture = self.profiler.begin(city if latitude is None else f"{latitude}, {longitude}")
+            fetch = capture.wrap("fetch", fetch)
+            display = capture.wrap("render", display, finish=True)
+        self.runner.submit("lookup", fetch, display, city, latitude, longitude)
+
+    def read_location(self):
+        """
+        Returns the location entered: the city, or the coordinates if no valid city is entered.
+
+        Returns:
+            tuple: The city (str), latitude (float) and longitude (float), where the
+            coordinates are None if the city is to be geocoded.
+
+        Raises:
+            ValueError: If neither a valid city nor valid coordinates are entered, with
+                a message for the user.
         """
         city = self.input_city.get().strip()
         latitude = self.input_latitude.get().strip()
         longitude = self.input_longitude.get().strip()
 
-        if city and city.replace(" ", "").isalpha():
-            latitude, longitude = get_coordinates_from_city(city)
-            if not latitude or not longitude:
-                return
-        elif not latitude or not longitude:
-            self.weather_info.set("Please enter a valid city name or both a latitude and longitude.")
-            logging.warning("Invalid city, latitude, or longitude input.")
+        if city and city.replace(" ", "").replace(",", "").isalpha():
+            return city, None, None
+        if not latitude or not longitude:
+            raise ValueError("Please enter a valid city name or both a latitude and longitude.")
+        try:
+            return city, float(latitude), float(longitude)
+        except ValueError:
+            raise ValueError("Invalid latitude or longitude. Please enter numeric values.")
+
+    def schedule_speculation(self, event=None):
+        """
+        Starts a speculative lookup of the location entered once the input has stayed
+        unchanged for SPECULATION_DELAY_MS, restarting the wait on every keystroke.
+        """
+        if event is not None and event.keysym in ("Up", "Down", "Return", "Escape", "Tab"):
             return
+        if self._speculation_timer is not None:
+            self.master.after_cancel(self._speculation_timer)
+        self._speculation_timer = self.master.after(SPECULATION_DELAY_MS, self.speculate)
 
+    def speculate(self):
+        """
+        Fetches the weather of the location entered into the cache in the background,
+        so that showing it is quick. Incomplete input, a location that was just
+        speculated on and a lookup already running are skipped.
+        """
+        self._speculation_timer = None
+        if self.runner.is_pending("lookup"):
+            return
         try:
-            latitude = float(latitude)
-            longitude = float(longitude)
+            city, latitude, longitude = self.read_location()
         except ValueError:
-            self.weather_info.set("Invalid latitude or longitude. Please enter numeric values.")
-            logging.warning("Invalid latitude or longitude input.")
             return
+        if latitude is None and len(city) < MIN_SPECULATIVE_CITY_LENGTH:
+            return
+        target = (city.casefold(), None, None) if latitude is None else (None, latitude, longitude)
+        if target == self._speculated:
+            return
+        self._speculated = target
+        generation = self.speculator.start()
+        self.runner.submit(
+            "speculate", self.speculator.prefetch, self.finish_speculation, generation, city, latitude, longitude
+        )
+
+    def finish_speculation(self, outcome, error):
+        """
+        Logs the outcome of a speculative lookup. Its data is in the cache, so nothing is shown.
+
+        Args:
+            outcome (str): What the speculation did, as returned by Speculator.prefetch.
+            error (Exception): The exception raised by the speculation, or None.
+        """
+        if error is not None:
+            # Forget the target so that it is tried again once the input changes back
+            self._speculated = None
+            logging.info(f"Speculative lookup failed: {error}")
+        elif outcome in ("limited", "cancelled"):
+            self._speculated = None
+
+    def cancel_speculation(self):
+        """Abandons any pending or running speculative lookup."""
+        if self._speculation_timer is not None:
+            self.master.after_cancel(self._speculation_timer)
+            self._speculation_timer = None
+        self.speculator.cancel()
+        self.runner.cancel("speculate")
+        self._speculated = None
+
+    def suggest_cities(self, event=None):
+        """
+        Looks up the cities starting with the text typed so far, in the background so
+        that loading the gazetteer never holds up typing.
+        """
+        if event is not None and event.keysym in ("Up", "Down", "Return", "Escape", "Tab"):
+            return
+        self.runner.submit("suggest", gazetteer.suggest, self.show_suggestions, self.input_city.get())
+
+    def show_suggestions(self, suggestions, error):
+        """
+        Offers the suggested cities in the city drop-down.
+
+        Args:
+            suggestions (list of str): The suggested city names.
+            error (Exception): The exception raised while looking them up, or None.
+        """
+        if error is not None:
+            logging.error(f"Gazetteer error: {error}")
+            return
+        self.input_city["values"] = suggestions
 
-        weather_api = WeatherAPI()
-        weather_data = weather_api.get_weather(latitude, longitude)
-        if weather_data is not None:
-            city, temperature_celsius, description, icon_data = weather_data
+    def fetch_weather(self, city, latitude, longitude):
+        """
+        Retrieves the coordinates, then the weather, icon and forecast concurrently, for a lookup.
+
+        Runs on a worker thread, so it must not touch any widget. If the city is a
+        favourite and the lookup is of its location, its coordinates and the fetched
+        weather are kept in the favourites store.
+
+        Args:
+            city (str): The city name, used when the coordinates are None.
+            latitude (float): The latitude, or None to geocode the city.
+            longitude (float): The longitude, or None to geocode the city.
+
+        Returns:
+            dict: The "city" looked up, the "coordinates" (None if the city was not found),
+            the "weather" tuple, the "icon_data" bytes and the "forecast" dictionary, any
+            of which is None if it could not be retrieved, and "recorded", the time the
+            weather was recorded if it is the last known weather from the history
+            rather than fetched now.
+        """
+        with metrics.span("stage_seconds", stage="lookup"):
+            result = {
+                "city": city, "coordinates": None, "weather": None, "icon_data": None, "forecast": None,
+                "recorded": None,
+            }
+            geocoded = latitude is None or longitude is None
+            if geocoded:
+                latitude, longitude = get_coordinates_from_city(city)
+                if latitude is None or longitude is None:
+                    return result
+            result["coordinates"] = (latitude, longitude)
+
+            report = WeatherAPI.default().get_location_report(latitude, longitude)
+            result.update(weather=report["weather"], icon_data=report["icon_data"], forecast=report["forecast"])
+
+            try:
+                favourite = favourites_store.get(city) if city else None
+                # Typed coordinates are not the favourite's, even if the city field names one
+                if favourite is not None and (
+                    geocoded or (favourite.latitude, favourite.longitude) == (latitude, longitude)
+                ):
+                    if geocoded:
+                        favourites_store.set_coordinates(city, latitude, longitude)
+                    if result["weather"] is not None:
+                        favourites_store.set_data(city, {"weather": result["weather"], "forecast": result["forecast"]})
+            except sqlite3.Error as e:
+                logging.error(f"Database error: {e}")
+
+            # Keep what was fetched, and fall back to the last known weather when offline
+            if result["weather"] is not None:
+                history.record_weather(latitude, longitude, result["weather"])
+            if result["forecast"] is not None:
+                history.record_forecast(latitude, longitude, result["forecast"])
+            if result["weather"] is None:
+                last_known = last_known_result(city, latitude, longitude)
+                if last_known is not None:
+                    result.update(last_known, forecast=result["forecast"] or last_known["forecast"])
+            return result
+
+    def display_weather(self, result, error):
+        """
+        Displays the outcome of a lookup. Runs on the main thread.
+
+        Args:
+            result (dict): The data returned by fetch_weather.
+            error (Exception): The error raised by fetch_weather, or None.
+        """
+        with metrics.span("stage_seconds", stage="render"):
+            self.stop_loading()
+            if error is not None:
+                self.weather_info.set("An unexpected error occurred. Please try again later.")
+                logging.error(f"Unexpected error: {error}")
+                return
+            if result["coordinates"] is None:
+                self.weather_info.set(f"Could not find the coordinates of {result['city']}.")
+                logging.warning("Could not retrieve the coordinates of the city.")
+                return
+            if result["weather"] is None:
+                self.weather_info.set("An unexpected error occurred. Please try again later.")
+                logging.error("Could not retrieve the weather information.")
+                return
+
+            city, temperature_celsius, description, icon_code = result["weather"]
             temperature_fahrenheit = (temperature_celsius * 9/5) + 32
-            self.icon_image = tk.PhotoImage(data=icon_data)
-            self.icon_label.configure(image=self.icon_image)
+            self.icon_label.configure(image=self.get_icon_image(icon_code, result["icon_data"]))
 
             information = (
             f"The current temperature in {city} is {temperature_celsius:.1f}°C / {temperature_fahrenheit:.1f}°F.\n"
             f"Additional details: {description}."
             )
+            if result.get("recorded") is not None:
+                recorded = datetime.fromtimestamp(result["recorded"]).strftime("%d-%m-%Y %H:%M")
+                information += f"\nLast known weather, recorded {recorded}."
             self.weather_info.set(information)
-            self.show_forecast(latitude, longitude)
-        else:
-            self.weather_info.set("An unexpected error occurred. Please try again later.")
-            logging.error("Could not retrieve the weather information.")
+            self.show_forecast(result["forecast"])
+            if result["city"] and result["city"] in self.favourites.favourites:
+                self.favourites.render()
+
+    def show_last_known(self):
+        """Shows the last known weather of the location looked up most recently, without any network call."""
+        location = history.most_recent_location()
+        if location is None:
+            return
+        result = last_known_result(None, *location)
+        if result is not None:
+            self.display_weather(result, None)
+
+    def start_loading(self):
+        """Shows the loading indicator."""
+        self.weather_info.set("Loading...")
+        self.progress.grid(row=1, column=0, columnspan=2, pady=(0, 10))
+        self.progress.start(10)
+
+    def stop_loading(self):
+        """Hides the loading indicator."""
+        self.progress.stop()
+        self.progress.grid_remove()
+
+    def get_icon_image(self, icon_code, icon_data):
+        """
+        Returns the decoded image for a weather icon, decoding each icon code only once.
 
-    def show_forecast(self, latitude, longitude):
+        Args:
+            icon_code (str): The OpenWeatherMap icon code, such as "01d".
+            icon_data (bytes): The PNG data of the icon, or None if it could not be loaded.
+
+        Returns:
+            tk.PhotoImage: The decoded icon, or an empty string if it could not be loaded,
+            which clears the icon label.
+        """
+        if icon_code not in self.icon_images:
+            if icon_data is None:
+                return ""
+            try:
+                self.icon_images[icon_code] = tk.PhotoImage(data=icon_data)
+            except tk.TclError as e:
+                logging.error(f"Could not decode the weather icon: {e}")
+                return ""
+        return self.icon_images[icon_code]
+
+    def show_forecast(self, forecast_data):
         """
-        Retrieves and displays forecast information for the specified coordinates.
+        Displays forecast information.
 
         The forecast includes the date, temperature, and a brief weather description.
+
+        Args:
+            forecast_data (dict): The forecast returned by WeatherAPI.get_forecast, or None
+                if it could not be retrieved.
         """
-        weather_api = WeatherAPI()
-        forecast_data = weather_api.get_forecast(latitude, longitude)
-        if forecast_data:
-            # Clear previous forecast data
-            for row in self.forecast_tree.get_children():
-                self.forecast_tree.delete(row)
-
-            for date, (temperature_celsius, description) in forecast_data.items():
-                temperature_fahrenheit = (temperature_celsius * 9/5) + 32
-                self.forecast_tree.insert("", "end", values=(
-                    date, f"{temperature_celsius:.1f}°C / {temperature_fahrenheit:.1f}°F", description))
-        else:
-            self.weather_info.set(f"{self.weather_info.get()}\nCould not retrieve the forecast.")
-            logging.error("Could not retrieve the forecast information.")
+        with metrics.span("stage_seconds", stage="forecast_render"):
+            if forecast_data:
+                # Clear previous forecast data
+                for row in self.forecast_tree.get_children():
+                    self.forecast_tree.delete(row)
+
+                for date, (temperature_celsius, description) in forecast_data.items():
+                    temperature_fahrenheit = (temperature_celsius * 9/5) + 32
+                    self.forecast_tree.insert("", "end", values=(
+                        date, f"{temperature_celsius:.1f}°C / {temperature_fahrenheit:.1f}°F", description))
+            else:
+                self.weather_info.set(f"{self.weather_info.get()}\nCould not retrieve the forecast.")
+                logging.error("Could not retrieve the forecast information.")
 
     def get_coordinates(self):
         """Opens a website to help find coordinates."""
@@ -241,4 +573,43 @@ class Weather:
 
     def quit_app(self):
         """Closes the app."""
+        self.cancel_speculation()
+        self.runner.shutdown()
+        if self.scheduler is not None:
+            self.scheduler.stop()
         self.master.quit()
+
+def last_known_result(city, latitude, longitude):
+    """
+    Builds a lookup result from the history alone, without any network call.
+
+    Args:
+        city (str): The city name looked up, or None.
+        latitude (float): The latitude of the location.
+        longitude (float): The longitude of the location.
+
+    Returns:
+        dict: A result like the ones returned by Weather.fetch_weather, or None if
+        nothing was recorded for the location.
+    """
+    latest = history.latest_weather(latitude, longitude)
+    if latest is None:
+        return None
+    recorded, weather = latest
+    forecast = history.latest_forecast(latitude, longitude)
+
+    def offline(icon_code):
+        raise LookupError(f"Icon {icon_code} is not stored.")
+
+    try:
+        icon_data = WeatherAPI.icons.get(weather[3], offline)
+    except (LookupError, ValueError):
+        icon_data = None
+    return {
+        "city": city,
+        "coordinates": (latitude, longitude),
+        "weather": weather,
+        "icon_data": icon_data,
+        "forecast": forecast[1] if forecast is not None else None,
+        "recorded": recorded,
+    }
@@ -0,0 +1,494 @@
+"""
+An append-only local history of the weather and forecasts fetched for each location.
+"""
+import os
+import sys
+import json
+import mmap
+import time
+import zlib
+import struct
+import logging
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timezone
+from weather.config import get_file_path
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+HISTORY_DIRECTORY = "history"
+STRINGS_FILE = "strings.json"
+# How long observations are kept before compaction drops them
+DEFAULT_RETENTION = 365 * 24 * 60 * 60
+# How many rows the append log of a series may hold before it is compacted
+COMPACT_ROWS = 1024
+# Fetches repeated within these windows, the TTLs of the response cache, are the same
+# cached response again, so they are not recorded twice
+WEATHER_DEDUPE_WINDOW = 10 * 60
+FORECAST_DEDUPE_WINDOW = 60 * 60
+
+SEGMENT_MAGIC = b"WHIST1\n"
+SECONDS_PER_DAY = 24 * 60 * 60
+
+# The columns of each series. The first is the time the row is sorted and queried by;
+# "I" columns hold strings, stored once in the strings file and referenced by number.
+OBSERVATION_FIELDS = (("timestamp", "q"), ("temperature", "d"), ("city", "I"), ("description", "I"), ("icon", "I"))
+FORECAST_FIELDS = (("fetched", "q"), ("day", "q"), ("temperature", "d"), ("description", "I"))
+
+class Series:
+    """
+    One time series of fixed-width rows, kept in two files.
+
+    New rows are appended to an uncompressed log of fixed-width records, which is read
+    through a memory map and searched by binary search on the time column. Compaction
+    moves the log into a segment that stores each column as one zlib-compressed array,
+    with the time column delta-encoded, dropping rows older than the retention period.
+
+    Rows are expected to be appended in time order; compaction sorts any that are not.
+
+    Attributes:
+        path (str): The path of the series files, without their extension.
+        fields (tuple): The (name, typecode) of each column.
+    """
+
+    def __init__(self, path, fields):
+        """Initialises the series. Nothing is read until it is queried."""
+        self.path = path
+        self.fields = fields
+        self.row = struct.Struct("<" + "".join(typecode for _, typecode in fields))
+        self._segment = None
+        self._segment_mtime = None
+
+    @property
+    def log_path(self):
+        return f"{self.path}.log"
+
+    @property
+    def segment_path(self):
+        return f"{self.path}.seg"
+
+    def append(self, values):
+        """
+        Appends one row.
+
+        Args:
+            values (tuple): One value per column.
+
+        Returns:
+            int: The number of rows in the log after appending.
+        """
+        with open(self.log_path, "ab") as file:
+            file.write(self.row.pack(*values))
+            return file.tell() // self.row.size
+
+    def _read_log(self, start=None, end=None):
+        """Returns the log rows with a time from start to end inclusive, as a list of tuples."""
+        try:
+            with open(self.log_path, "rb") as file:
+                size = os.fstat(file.fileno()).st_size
+                count = size // self.row.size
+                if count == 0:
+                    return []
+                with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                    times = _LogTimes(data, self.row, count)
+                    first = 0 if start is None else bisect_left(times, start)
+                    last = count if end is None else bisect_right(times, end)
+                    return [self.row.unpack_from(data, index * self.row.size) for index in range(first, last)]
+        except FileNotFoundError:
+            return []
+
+    def _read_segment(self):
+        """Returns the columns of the segment, decompressing them only when the file changed."""
+        try:
+            mtime = os.stat(self.segment_path).st_mtime_ns
+        except FileNotFoundError:
+            return [array(typecode) for _, typecode in self.fields]
+        if mtime != self._segment_mtime:
+            with open(self.segment_path, "rb") as file:
+                data = file.read()
+            self._segment = decode_segment(data, self.fields)
+            self._segment_mtime = mtime
+        return self._segment
+
+    def query(self, start=None, end=None):
+        """
+        Returns the rows with a time from start to end inclusive, in time order.
+
+        Args:
+            start (float): The earliest time, or None for no lower bound.
+            end (float): The latest time, or None for no upper bound.
+
+        Returns:
+            list of array: One array per column.
+        """
+        columns = self._read_segment()
+        times = columns[0]
+        first = 0 if start is None else bisect_left(times, start)
+        last = len(times) if end is None else bisect_right(times, end)
+        result = [column[first:last] for column in columns]
+        for row in self._read_log(start, end):
+            for column, value in zip(result, row):
+                column.append(value)
+        return result
+
+    def last(self):
+        """
+        Returns the most recent row, or None if the series is empty.
+
+        Returns:
+            tuple: One value per column.
+        """
+        rows = self._read_log()
+        if rows:
+            return rows[-1]
+        columns = self._read_segment()
+        if not len(columns[0]):
+            return None
+        return tuple(column[-1] for column in columns)
+
+    def compact(self, cutoff=None):
+        """
+        Moves the log into the compressed segment, dropping rows older than cutoff and
+        exact duplicates.
+
+        Args:
+            cutoff (float): The earliest time kept, or None to keep every row.
+
+        Returns:
+            int: The number of rows in the segment.
+        """
+        rows = list(zip(*self._read_segment())) + self._read_log()
+        rows = sorted(set(row for row in rows if cutoff is None or row[0] >= cutoff))
+        columns = [array(typecode) for _, typecode in self.fields]
+        for row in rows:
+            for column, value in zip(columns, row):
+                column.append(value)
+
+        temp_path = f"{self.segment_path}.tmp"
+        with open(temp_path, "wb") as file:
+            file.write(encode_segment(columns))
+        os.replace(temp_path, self.segment_path)
+        # Truncating after the segment is in place means a crash can only duplicate
+        # rows, which the next compaction removes, never lose them
+        open(self.log_path, "wb").close()
+        return len(rows)
+
+class _LogTimes:
+    """A read-only sequence of the time column of a memory-mapped log, for bisect."""
+
+    def __init__(self, data, row, count):
+        self.data = data
+        self.row = row
+        self.count = count
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, index):
+        return struct.unpack_from("<q", self.data, index * self.row.size)[0]
+
+def _to_little_endian(column):
+    if sys.byteorder == "big":
+        column = array(column.typecode, column)
+        column.byteswap()
+    return column
+
+def encode_segment(columns):
+    """Returns the bytes of a segment holding the columns, the first delta-encoded."""
+    times = columns[0]
+    deltas = array(times.typecode, (times[index] - times[index - 1] if index else times[0] for index in range(len(times))))
+    parts = [SEGMENT_MAGIC, struct.pack("<I", len(times))]
+    for column in [deltas] + list(columns[1:]):
+        compressed = zlib.compress(_to_little_endian(column).tobytes(), 6)
+        parts.append(struct.pack("<I", len(compressed)))
+        parts.append(compressed)
+    return b"".join(parts)
+
+def decode_segment(data, fields):
+    """
+    Returns the columns stored in a segment.
+
+    Raises:
+        ValueError: If the data is not a valid segment.
+    """
+    if not data.startswith(SEGMENT_MAGIC):
+        raise ValueError("Not a history segment.")
+    offset = len(SEGMENT_MAGIC)
+    (count,) = struct.unpack_from("<I", data, offset)
+    offset += 4
+    columns = []
+    for _, typecode in fields:
+        (length,) = struct.unpack_from("<I", data, offset)
+        offset += 4
+        column = array(typecode)
+        column.frombytes(zlib.decompress(data[offset:offset + length]))
+        if sys.byteorder == "big":
+            column.byteswap()
+        if len(column) != count:
+            raise ValueError("Truncated history segment.")
+        columns.append(column)
+        offset += length
+    times = columns[0]
+    for index in range(1, len(times)):
+        times[index] += times[index - 1]
+    return columns
+
+class History:
+    """
+    The local history of the weather and forecasts of every location looked up.
+
+    Each location has an observation series, holding every current weather fetched,
+    and a forecast series, holding every forecast fetched, one row per forecast day.
+    Strings such as descriptions are stored once, in a shared strings file.
+
+    Locations are identified by their coordinates rounded to four decimal places, the
+    same precision as the response cache.
+
+    Attributes:
+        directory (str): The directory of the history files, resolved on first use if not given.
+        retention (float): How long, in seconds, rows are kept.
+    """
+
+    def __init__(self, directory=None, retention=DEFAULT_RETENTION, compact_rows=COMPACT_ROWS):
+        """Initialises the history. Nothing is read until it is first needed."""
+        self.directory = directory
+        self.retention = retention
+        self.compact_rows = compact_rows
+        self._series = {}
+        self._strings = None
+        self._string_ids = None
+        self._lock = threading.RLock()
+
+    def _path(self, name):
+        if self.directory is None:
+            self.directory = get_file_path(HISTORY_DIRECTORY, for_writing=True)
+        os.makedirs(self.directory, exist_ok=True)
+        return os.path.join(self.directory, name)
+
+    @staticmethod
+    def location_key(latitude, longitude):
+        """Returns the name of the files of a location."""
+        return f"{round(float(latitude), 4):+.4f}_{round(float(longitude), 4):+.4f}"
+
+    def _get_series(self, latitude, longitude, kind):
+        """Returns the "observations" or "forecasts" series of a location. Must be called with the lock held."""
+        key = (self.location_key(latitude, longitude), kind)
+        series = self._series.get(key)
+        if series is None:
+            fields = OBSERVATION_FIELDS if kind == "observations" else FORECAST_FIELDS
+            series = self._series[key] = Series(self._path(f"{key[0]}.{kind}"), fields)
+        return series
+
+    def _load_strings(self):
+        """Reads the strings file, once. Must be called with the lock held."""
+        if self._strings is not None:
+            return
+        try:
+            with open(self._path(STRINGS_FILE), "r", encoding="utf-8") as file:
+                self._strings = json.load(file)
+        except FileNotFoundError:
+            self._strings = []
+        except (IOError, ValueError) as e:
+            logging.warning(f"Ignoring unreadable history strings: {e}")
+            self._strings = []
+        self._string_ids = {string: index for index, string in enumerate(self._strings)}
+
+    def _string_id(self, string):
+        """Returns the number of a string, storing it if it is new. Must be called with the lock held."""
+        self._load_strings()
+        string_id = self._string_ids.get(string)
+        if string_id is None:
+            string_id = self._string_ids[string] = len(self._strings)
+            self._strings.append(string)
+            temp_path = self._path(f"{STRINGS_FILE}.tmp")
+            with open(temp_path, "w", encoding="utf-8") as file:
+                json.dump(self._strings, file, ensure_ascii=False)
+            os.replace(temp_path, self._path(STRINGS_FILE))
+        return string_id
+
+    def _string(self, string_id):
+        """Returns the string with a number. Must be called with the lock held."""
+        self._load_strings()
+        return self._strings[string_id] if string_id < len(self._strings) else ""
+
+    def _append(self, series, values):
+        """Appends a row, compacting the series when its log is full. Must be called with the lock held."""
+        if series.append(values) >= self.compact_rows:
+            series.compact(time.time() - self.retention)
+
+    def record_weather(self, latitude, longitude, weather, timestamp=None):
+        """
+        Records the current weather of a location.
+
+        A repeat of the last observation within WEATHER_DEDUPE_WINDOW seconds is not
+        recorded, as it is the same cached response looked up again.
+
+        Args:
+            latitude (float): The latitude of the location.
+            longitude (float): The longitude of the location.
+            weather (tuple): The city name, temperature, description and icon code, as
+                returned by WeatherAPI.fetch_weather.
+            timestamp (float): When the weather was observed, now if not given.
+
+        Returns:
+            bool: True if the observation was recorded.
+        """
+        timestamp = int(time.time() if timestamp is None else timestamp)
+        city, temperature, description, icon_code = weather
+        try:
+            with self._lock:
+                series = self._get_series(latitude, longitude, "observations")
+                values = (
+                    timestamp, float(temperature),
+                    self._string_id(city), self._string_id(description), self._string_id(icon_code),
+                )
+                last = series.last()
+                if last is not None and last[1:] == values[1:] and 0 <= timestamp - last[0] < WEATHER_DEDUPE_WINDOW:
+                    return False
+                self._append(series, values)
+                return True
+        except (IOError, ValueError, struct.error) as e:
+            logging.error(f"History error: {e}")
+            return False
+
+    def record_forecast(self, latitude, longitude, forecast, timestamp=None):
+        """
+        Records a forecast of a location, unless one was recorded in the last
+        FORECAST_DEDUPE_WINDOW seconds.
+
+        Args:
+            latitude (float): The latitude of the location.
+            longitude (float): The longitude of the location.
+            forecast (dict): The forecast, as returned by WeatherAPI.fetch_forecast.
+            timestamp (float): When the forecast was fetched, now if not given.
+
+        Returns:
+            bool: True if the forecast was recorded.
+        """
+        timestamp = int(time.time() if timestamp is None else timestamp)
+        try:
+            with self._lock:
+                series = self._get_series(latitude, longitude, "forecasts")
+                last = series.last()
+                if last is not None and 0 <= timestamp - last[0] < FORECAST_DEDUPE_WINDOW:
+                    return False
+                for date, (temperature, description) in forecast.items():
+                    day = int(datetime.strptime(date, "%d-%m-%Y").replace(tzinfo=timezone.utc).timestamp()) // SECONDS_PER_DAY
+                    self._append(series, (timestamp, day, float(temperature), self._string_id(description)))
+                return True
+        except (IOError, ValueError, struct.error) as e:
+            logging.error(f"History error: {e}")
+            return False
+
+    def observations(self, latitude, longitude, start=None, end=None):
+        """
+        Returns the weather recorded for a location between two times, in time order.
+
+        Args:
+            latitude (float): The latitude of the location.
+            longitude (float): The longitude of the location.
+            start (float): The earliest time, in seconds since the epoch, or None.
+            end (float): The latest time, in seconds since the epoch, or None.
+
+        Returns:
+            dict: The "timestamp" and "temperature" arrays, and the "city", "description"
+            and "icon" lists, with one entry per observation.
+        """
+        with self._lock:
+            columns = self._get_series(latitude, longitude, "observations").query(start, end)
+            timestamps, temperatures, cities, descriptions, icons = columns
+            return {
+                "timestamp": timestamps,
+                "temperature": temperatures,
+                "city": [self._string(string_id) for string_id in cities],
+                "description": [self._string(string_id) for string_id in descriptions],
+                "icon": [self._string(string_id) for string_id in icons],
+            }
+
+    def latest_weather(self, latitude, longitude):
+        """
+        Returns the last weather recorded for a location, without any network call.
+
+        Returns:
+            tuple: The time it was recorded and the weather tuple, as returned by
+            WeatherAPI.fetch_weather, or None if nothing was recorded.
+        """
+        try:
+            with self._lock:
+                last = self._get_series(latitude, longitude, "observations").last()
+                if last is None:
+                    return None
+                timestamp, temperature, city, description, icon_code = last
+                return timestamp, (self._string(city), temperature, self._string(description), self._string(icon_code))
+        except (IOError, ValueError) as e:
+            logging.error(f"History error: {e}")
+            return None
+
+    def latest_forecast(self, latitude, longitude):
+        """
+        Returns the last forecast recorded for a location, without any network call.
+
+        Returns:
+            tuple: The time it was fetched and the forecast dictionary, as returned by
+            WeatherAPI.fetch_forecast, or None if nothing was recorded.
+        """
+        try:
+            with self._lock:
+                series = self._get_series(latitude, longitude, "forecasts")
+                last = series.last()
+                if last is None:
+                    return None
+                fetched, days, temperatures, descriptions = series.query(last[0], last[0])
+                forecast = {
+                    datetime.fromtimestamp(day * SECONDS_PER_DAY, timezone.utc).strftime("%d-%m-%Y"):
+                        (temperature, self._string(description))
+                    for day, temperature, description in zip(days, temperatures, descriptions)
+                }
+                return last[0], forecast
+        except (IOError, ValueError) as e:
+            logging.error(f"History error: {e}")
+            return None
+
+    def most_recent_location(self):
+        """
+        Returns the location whose weather was recorded last, without reading any series.
+
+        Returns:
+            tuple: The (latitude, longitude) of the location, or None if nothing was recorded.
+        """
+        try:
+            with self._lock:
+                directory = self._path("")
+                newest, newest_time = None, None
+                for entry in os.scandir(directory):
+                    if entry.name.endswith((".observations.log", ".observations.seg")):
+                        modified = entry.stat().st_mtime
+                        if newest_time is None or modified > newest_time:
+                            newest, newest_time = entry.name, modified
+        except OSError as e:
+            logging.error(f"History error: {e}")
+            return None
+        if newest is None:
+            return None
+        latitude, longitude = newest.split(".observations")[0].split("_")
+        return float(latitude), float(longitude)
+
+    def compact(self):
+        """Compacts every series in the history directory, dropping rows past the retention period."""
+        cutoff = time.time() - self.retention
+        with self._lock:
+            stems = {
+                os.path.splitext(name)[0] for name in os.listdir(self._path(""))
+                if name.endswith((".log", ".seg"))
+            }
+            for stem in sorted(stems):
+                key, kind = stem.rsplit(".", 1)
+                fields = OBSERVATION_FIELDS if kind == "observations" else FORECAST_FIELDS
+                series = self._series.setdefault((key, kind), Series(self._path(stem), fields))
+                try:
+                    series.compact(cutoff)
+                except (IOError, ValueError) as e:
+                    logging.error(f"History error: {e}")
+
+history = History()
@@ -0,0 +1,116 @@
+"""
+Storage for the OpenWeatherMap weather icons.
+"""
+import os
+import re
+import logging
+import threading
+from weather.config import get_file_path
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+# Every icon OpenWeatherMap uses: nine conditions, each in a day and a night variant
+ICON_CODES = [
+    f"{condition}{period}"
+    for condition in ("01", "02", "03", "04", "09", "10", "11", "13", "50")
+    for period in ("d", "n")
+]
+
+ICON_CODE_PATTERN = re.compile(r"^\d{2}[dn]$")
+
+class IconStore:
+    """
+    A store that downloads each weather icon once and keeps it in memory and on disk.
+
+    The store does not know how to download an icon itself; callers pass a function
+    that takes an icon code and returns the PNG bytes.
+
+    Attributes:
+        directory (str): The directory the icons are saved in, resolved on first use
+            to an "icons" folder in the user data directory if not given.
+    """
+
+    def __init__(self, directory=None):
+        """Initialises an empty icon store."""
+        self.directory = directory
+        self._icons = {}
+        self._lock = threading.Lock()
+        self._code_locks = {}
+
+    def _icon_path(self, icon_code):
+        """Returns the file path an icon is saved to, creating the directory if needed."""
+        if self.directory is None:
+            self.directory = get_file_path("icons", for_writing=True)
+        os.makedirs(self.directory, exist_ok=True)
+        return os.path.join(self.directory, f"{icon_code}.png")
+
+    def _code_lock(self, icon_code):
+        """Returns the lock that serialises downloads of one icon."""
+        with self._lock:
+            return self._code_locks.setdefault(icon_code, threading.Lock())
+
+    def get(self, icon_code, download):
+        """
+        Returns the PNG data for an icon, downloading it only if it is not stored yet.
+
+        Args:
+            icon_code (str): The OpenWeatherMap icon code, such as "01d".
+            download (callable): A function that takes an icon code and returns its PNG bytes.
+
+        Returns:
+            bytes: The PNG data of the icon.
+
+        Raises:
+            ValueError: If the icon code is not a valid OpenWeatherMap icon code.
+            requests.exceptions.RequestException: If the icon has to be downloaded and
+            there is a network error.
+        """
+        if not ICON_CODE_PATTERN.match(icon_code):
+            raise ValueError(f"Invalid icon code: {icon_code!r}")
+
+        icon_data = self._icons.get(icon_code)
+        if icon_data is not None:
+            return icon_data
+
+        with self._code_lock(icon_code):
+            icon_data = self._icons.get(icon_code)
+            if icon_data is not None:
+                return icon_data
+
+            path = self._icon_path(icon_code)
+            try:
+                with open(path, "rb") as file:
+                    icon_data = file.read()
+            except IOError:
+                icon_data = download(icon_code)
+                try:
+                    with open(f"{path}.tmp", "wb") as file:
+                        file.write(icon_data)
+                    os.replace(f"{path}.tmp", path)
+                except IOError as e:
+                    logging.error(f"File error: {e}")
+
+            self._icons[icon_code] = icon_data
+            return icon_data
+
+    def prefetch(self, download, icon_codes=ICON_CODES):
+        """
+        Loads the given icons into the store on a background thread.
+
+        Args:
+            download (callable): A function that takes an icon code and returns its PNG bytes.
+            icon_codes (iterable of str): The icon codes to load, every known code by default.
+
+        Returns:
+            threading.Thread: The daemon thread doing the work.
+        """
+        def load_all():
+            for icon_code in icon_codes:
+                try:
+                    self.get(icon_code, download)
+                except Exception as e:
+                    logging.warning(f"Could not prefetch icon {icon_code}: {e}")
+
+        thread = threading.Thread(target=load_all, name="icon-prefetch", daemon=True)
+        thread.start()
+        return thread
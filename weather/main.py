@@ -1,11 +1,30 @@
-from weather.gui import Weather
-from weather.data import get_file_path
+import os
+import argparse
 import tkinter as tk
+from weather.config import get_file_path, get_flag
 
-def main():
+# Set by benchmarks/startup.py to quit as soon as the window is ready
+EXIT_AFTER_STARTUP = "WEATHER_EXIT_AFTER_STARTUP"
+# Set to profile every lookup, like the --profile flag
+PROFILE_ENV = "WEATHER_PROFILE"
+
+def main(argv=None):
     """Initialises the main window and starts the Tkinter main event loop."""
+    parser = argparse.ArgumentParser(prog="python -m weather.main", description="Show the weather in a window.")
+    parser.add_argument("--profile", action="store_true",
+                        help="record a CPU profile and memory snapshot of every lookup (also WEATHER_PROFILE=1)")
+    args = parser.parse_args(argv)
+
+    profiler = None
+    if args.profile or get_flag(PROFILE_ENV):
+        # Imported only when asked for, as the profilers slow start-up down, and started
+        # first, so the memory growth includes everything the app allocates
+        from weather.profiling import SessionProfiler
+        profiler = SessionProfiler()
+        profiler.start()
+
     root = tk.Tk()
-    Weather(root)
+    root.title("Weather Forecast")
 
     # Weather icons created by iconixar - Flaticon
     # https://www.flaticon.com/free-icons/weather
@@ -15,8 +34,33 @@ def main():
         root.iconphoto(True, icon)
     except Exception as e:
         print(f"Error loading icon: {e}")
-    
+
+    # Show the window before loading anything that talks to the network
+    root.update()
+
+    from weather.gui import Weather
+    from weather.api import WeatherAPI
+    from weather.scheduler import RefreshScheduler
+
+    # Keep the weather of the favourite cities fresh, so picking one is instant
+    scheduler = RefreshScheduler()
+    Weather(root, scheduler, profiler)
+    scheduler.start()
+
+    # Download the weather icons in the background, so lookups never wait for them
+    try:
+        WeatherAPI.default().prefetch_icons()
+    except ValueError as e:
+        print(f"Error prefetching icons: {e}")
+
+    if os.environ.get(EXIT_AFTER_STARTUP):
+        root.after_idle(root.quit)
+
     root.mainloop()
 
+    if profiler is not None:
+        profiler.stop()
+        print(f"Profiles and their summary were written to {profiler.directory}")
+
 if __name__ == "__main__":
     main()
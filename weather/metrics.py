@@ -0,0 +1,243 @@
+"""
+Lightweight timing spans, counters and latency histograms, exported as JSON or in the
+Prometheus text format.
+
+Metrics are off unless the WEATHER_METRICS or WEATHER_METRICS_FILE environment
+variable is set, or metrics.enable() is called. While off, every call returns at once
+without allocating. If WEATHER_METRICS_FILE is set, the metrics are written there when
+the process exits: in the Prometheus format if the file name ends in ".prom", as JSON
+otherwise.
+"""
+import os
+import json
+import time
+import atexit
+import logging
+import threading
+from bisect import bisect_left
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+# Upper bounds, in seconds, of the latency histogram buckets
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+PREFIX = "weather_"
+
+class _NullSpan:
+    """The span handed out while metrics are off; it does nothing."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+_NULL_SPAN = _NullSpan()
+
+class _Span:
+    """Times a block and records it in a histogram, counting any exception it raises."""
+
+    __slots__ = ("registry", "name", "labels", "start")
+
+    def __init__(self, registry, name, labels):
+        self.registry = registry
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.registry.observe(self.name, time.perf_counter() - self.start, **self.labels)
+        if exc_type is not None:
+            self.registry.increment(f"{self.name}_errors_total", error=exc_type.__name__, **self.labels)
+        return False
+
+class Histogram:
+    """
+    Counts observations into fixed buckets and keeps their count and sum.
+
+    Attributes:
+        buckets (tuple of float): The upper bounds of the buckets.
+        counts (list of int): The observations per bucket, plus one for larger values.
+        count (int): The number of observations.
+        sum (float): The total of the observations.
+    """
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        """Initialises a histogram with no observations."""
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        """Counts a value into the first bucket whose bound is not below it."""
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def snapshot(self):
+        """Returns the count, the sum and the cumulative count per bucket bound."""
+        cumulative, buckets = 0, {}
+        for bound, count in zip(self.buckets + ("+Inf",), self.counts):
+            cumulative += count
+            buckets[str(bound)] = cumulative
+        return {"count": self.count, "sum": self.sum, "buckets": buckets}
+
+class Registry:
+    """
+    A thread-safe store of counters and histograms, each identified by a name and labels.
+
+    Attributes:
+        enabled (bool): Whether anything is recorded.
+    """
+
+    def __init__(self, enabled=False):
+        """Initialises an empty registry."""
+        self.enabled = enabled
+        self._counters = {}
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def enable(self):
+        """Starts recording."""
+        self.enabled = True
+
+    def disable(self):
+        """Stops recording. What was recorded is kept."""
+        self.enabled = False
+
+    def increment(self, name, value=1, **labels):
+        """
+        Adds to a counter.
+
+        Args:
+            name (str): The counter name, such as "http_requests_total".
+            value (float): The amount to add.
+            **labels: The labels telling this series apart, such as endpoint="weather".
+        """
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, seconds, **labels):
+        """
+        Records a duration in a histogram.
+
+        Args:
+            name (str): The histogram name, such as "stage_seconds".
+            seconds (float): The duration.
+            **labels: The labels telling this series apart.
+        """
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(seconds)
+
+    def span(self, name, **labels):
+        """
+        Returns a context manager that records how long its block took in the histogram
+        name, and counts the exceptions it raised in name + "_errors_total".
+
+        Args:
+            name (str): The histogram name.
+            **labels: The labels telling this series apart, such as stage="geocode".
+
+        Returns:
+            A context manager.
+        """
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name, labels)
+
+    def reset(self):
+        """Forgets everything recorded."""
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    def snapshot(self):
+        """
+        Returns everything recorded.
+
+        Returns:
+            dict: "counters" and "histograms", each a list of series with their
+            "name", "labels" and "value".
+        """
+        with self._lock:
+            return {
+                "counters": [
+                    {"name": name, "labels": dict(labels), "value": value}
+                    for (name, labels), value in sorted(self._counters.items())
+                ],
+                "histograms": [
+                    {"name": name, "labels": dict(labels), "value": histogram.snapshot()}
+                    for (name, labels), histogram in sorted(self._histograms.items())
+                ],
+            }
+
+    def to_json(self):
+        """Returns the snapshot as a JSON document."""
+        return json.dumps(self.snapshot(), indent=2)
+
+    def to_prometheus(self):
+        """Returns everything recorded in the Prometheus text exposition format."""
+        snapshot = self.snapshot()
+        lines = []
+        declared = set()
+
+        def declare(name, kind):
+            if name not in declared:
+                declared.add(name)
+                lines.append(f"# TYPE {name} {kind}")
+
+        for series in snapshot["counters"]:
+            name = PREFIX + series["name"]
+            declare(name, "counter")
+            lines.append(f"{name}{format_labels(series['labels'])} {series['value']}")
+        for series in snapshot["histograms"]:
+            name = PREFIX + series["name"]
+            declare(name, "histogram")
+            value = series["value"]
+            for bound, count in value["buckets"].items():
+                lines.append(f"{name}_bucket{format_labels(dict(series['labels'], le=bound))} {count}")
+            lines.append(f"{name}_sum{format_labels(series['labels'])} {value['sum']}")
+            lines.append(f"{name}_count{format_labels(series['labels'])} {value['count']}")
+        return "\n".join(lines) + "\n"
+
+    def dump(self, path):
+        """
+        Writes everything recorded to a file, in the Prometheus format if its name ends
+        in ".prom", as JSON otherwise.
+
+        Args:
+            path (str): The file to write.
+        """
+        try:
+            with open(path, "w") as file:
+                file.write(self.to_prometheus() if path.endswith(".prom") else self.to_json())
+        except IOError as e:
+            logging.error(f"File error: {e}")
+
+def format_labels(labels):
+    """Returns labels in the Prometheus {name="value"} form, or "" if there are none."""
+    if not labels:
+        return ""
+    pairs = []
+    for name, value in sorted(labels.items()):
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        pairs.append(f'{name}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+metrics = Registry(enabled=bool(os.environ.get("WEATHER_METRICS") or os.environ.get("WEATHER_METRICS_FILE")))
+
+if os.environ.get("WEATHER_METRICS_FILE"):
+    atexit.register(metrics.dump, os.environ["WEATHER_METRICS_FILE"])
@@ -0,0 +1,105 @@
+"""
+Speculative lookups, started while a location is still being typed so that its weather
+is already cached when it is asked for.
+"""
+import threading
+from weather.api import WeatherAPI
+from weather.data import cached_coordinates, get_coordinates_from_city
+from weather.metrics import metrics
+from weather.ratelimit import TokenBucket
+
+# The most speculative network lookups started per minute, to protect the API quota
+SPECULATIONS_PER_MINUTE = 6
+
+class Speculator:
+    """
+    Fetches the weather of a location that may be looked up soon into the response cache.
+
+    Each speculation that needs the network takes a token from its own budget, which
+    refills at per_minute tokens a minute; when the budget is spent, speculations are
+    skipped rather than delayed. Locations that are already cached, or whose city is
+    known offline, cost nothing. A speculation superseded by a newer one, or cancelled,
+    stops before its next network request.
+
+    Attributes:
+        api_factory (callable): Returns the WeatherAPI the lookups go through.
+        budget (TokenBucket): The speculative lookups that may still be started.
+    """
+
+    def __init__(self, api_factory=WeatherAPI.default, per_minute=SPECULATIONS_PER_MINUTE):
+        """
+        Initialises the speculator.
+
+        Args:
+            api_factory (callable): Returns the WeatherAPI the lookups go through.
+            per_minute (int): The most speculative network lookups started per minute.
+        """
+        self.api_factory = api_factory
+        self.budget = TokenBucket(rate=per_minute / 60, capacity=per_minute)
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def start(self):
+        """
+        Supersedes any speculation in progress.
+
+        Returns:
+            int: The generation to pass to prefetch.
+        """
+        with self._lock:
+            self._generation += 1
+            return self._generation
+
+    def cancel(self):
+        """Stops any speculation in progress before its next network request."""
+        self.start()
+
+    def _current(self, generation):
+        """Returns whether a speculation has not been superseded."""
+        with self._lock:
+            return generation == self._generation
+
+    def _take(self, generation):
+        """Returns whether a speculation may send a network request, counting why not if it may not."""
+        if not self._current(generation):
+            metrics.increment("speculative_lookups_total", result="cancelled")
+            return False
+        if not self.budget.try_acquire():
+            metrics.increment("speculative_lookups_total", result="limited")
+            return False
+        return True
+
+    def prefetch(self, generation, city, latitude, longitude):
+        """
+        Geocodes a city and fetches the weather, icon and forecast of the location into
+        the cache, unless it is cached already. Runs on a worker thread.
+
+        Args:
+            generation (int): The generation returned by start.
+            city (str): The city name, used when the coordinates are None.
+            latitude (float): The latitude, or None to geocode the city.
+            longitude (float): The longitude, or None to geocode the city.
+
+        Returns:
+            str: What happened: "fetched", "cached", "not_found", "limited" or "cancelled".
+        """
+        if latitude is None or longitude is None:
+            coordinates = cached_coordinates(city)
+            if coordinates is None:
+                if not self._take(generation):
+                    return "limited" if self._current(generation) else "cancelled"
+                coordinates = get_coordinates_from_city(city)
+            latitude, longitude = coordinates
+            if latitude is None or longitude is None:
+                metrics.increment("speculative_lookups_total", result="not_found")
+                return "not_found"
+
+        api = self.api_factory()
+        if api.is_cached(latitude, longitude):
+            metrics.increment("speculative_lookups_total", result="cached")
+            return "cached"
+        if not self._take(generation):
+            return "limited" if self._current(generation) else "cancelled"
+        api.get_location_report(latitude, longitude)
+        metrics.increment("speculative_lookups_total", result="fetched")
+        return "fetched"
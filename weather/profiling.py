@@ -0,0 +1,367 @@
+"""
+A profiling mode for long GUI sessions, recording where each lookup spends its time
+and how much memory the process keeps between lookups.
+
+Profiling is off unless the WEATHER_PROFILE environment variable is 1, true or yes, or the app is
+started with --profile. Each lookup is then run under cProfile, on the worker thread
+that fetches it and on the main thread that renders it, and a tracemalloc snapshot is
+taken when it has been displayed. The profiles, the snapshots and a running summary
+are written to a folder of the session in the user data directory:
+
+    lookup-001.prof       load with pstats.Stats, or snakeviz
+    lookup-001.snapshot   load with tracemalloc.Snapshot.load
+    summary.txt           the top hot spots and memory growth of each lookup
+    summary.json          the same, for scripts
+
+Before Python 3.12 a cProfile profiler only sees the thread that started it, so work a
+stage hands to a thread pool is only profiled if it is submitted through carry(), as
+WeatherAPI.get_location_report does. From Python 3.12 it sees every thread.
+"""
+import os
+import io
+import sys
+import json
+import time
+import pstats
+import cProfile
+import logging
+import threading
+import tracemalloc
+from datetime import datetime
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from weather.config import get_file_path
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+PROFILES_FOLDER = "profiles"
+# The number of functions and source lines listed for each lookup in the summary
+TOP_ENTRIES = 15
+# How many frames of each allocation are kept; more make the snapshots slower and larger
+TRACE_FRAMES = 5
+
+# The profiling's own allocations, left out of the memory growth
+IGNORED_FILES = (tracemalloc.__file__, pstats.__file__, __file__)
+
+# From Python 3.12 a profiler sees every thread, and only one may run at a time in the
+# process; before that it only sees its own thread, and only one may run on each thread
+PROFILES_ALL_THREADS = sys.version_info >= (3, 12)
+_profiler_lock = threading.Lock()
+# The capture whose stage is running on each thread, and whether it is being profiled
+_local = threading.local()
+
+def format_size(size, signed=False):
+    """Returns a byte count as a short string such as "1.5 MiB", or "+1.5 MiB" if signed."""
+    sign = "-" if size < 0 else "+" if signed else ""
+    size = abs(size)
+    if size < 1024:
+        return f"{sign}{size} B"
+    for unit in ("KiB", "MiB", "GiB"):
+        size /= 1024
+        if size < 1024 or unit == "GiB":
+            return f"{sign}{size:.1f} {unit}"
+
+def describe_function(function):
+    """Returns a pstats function key as "path:line(name)", with the path relative to the working directory."""
+    filename, line, name = function
+    if filename.startswith(os.getcwd()):
+        filename = os.path.relpath(filename)
+    return f"{filename}:{line}({name})" if line else name
+
+class Capture:
+    """
+    The profile of one lookup, made of the stages it runs in, possibly on different threads.
+
+    Attributes:
+        label (str): What was looked up.
+        stages (dict): The seconds spent in each stage, keyed by its name.
+    """
+
+    def __init__(self, profiler, label):
+        """Initialises a capture with no stages. Use SessionProfiler.begin."""
+        self.profiler = profiler
+        self.label = label
+        self.stages = {}
+        self._profiles = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name):
+        """
+        Profiles a block of the lookup on the current thread. If another profile is
+        running, the block is only timed.
+
+        Args:
+            name (str): The name of the stage, such as "fetch".
+        """
+        start = time.perf_counter()
+        try:
+            with self.profile():
+                yield
+        finally:
+            with self._lock:
+                self.stages[name] = self.stages.get(name, 0) + time.perf_counter() - start
+
+    @contextmanager
+    def profile(self):
+        """
+        Profiles a block of the lookup on the current thread, without timing it as a
+        stage. Nothing is profiled if another profile is running.
+        """
+        acquired = not getattr(_local, "profiling", False) and (
+            not PROFILES_ALL_THREADS or _profiler_lock.acquire(blocking=False)
+        )
+        profile = cProfile.Profile() if acquired else None
+        previous = getattr(_local, "capture", None)
+        _local.capture = self
+        if profile is not None:
+            _local.profiling = True
+            profile.enable()
+        try:
+            yield
+        finally:
+            if profile is not None:
+                profile.disable()
+                _local.profiling = False
+                if PROFILES_ALL_THREADS:
+                    _profiler_lock.release()
+                with self._lock:
+                    self._profiles.append(profile)
+            _local.capture = previous
+
+    def wrap(self, name, function, finish=False):
+        """
+        Returns a function that runs another in a stage.
+
+        Args:
+            name (str): The name of the stage.
+            function (callable): The function to run.
+            finish (bool): Whether the lookup is complete once the function returns.
+
+        Returns:
+            callable: Takes the same arguments as function and returns its result.
+        """
+        def run(*args, **kwargs):
+            try:
+                with self.stage(name):
+                    return function(*args, **kwargs)
+            finally:
+                if finish:
+                    self.profiler.finish(self)
+        return run
+
+    def stats(self):
+        """
+        Returns the profiles of every stage combined.
+
+        Returns:
+            pstats.Stats: The combined profile, or None if no stage was profiled.
+        """
+        with self._lock:
+            if not self._profiles:
+                return None
+            stats = pstats.Stats(self._profiles[0], stream=io.StringIO())
+            for profile in self._profiles[1:]:
+                stats.add(profile)
+            return stats
+
+def carry(function):
+    """
+    Returns a function that is profiled with the lookup being profiled on the current
+    thread, wherever it runs. Wrap work submitted to a thread pool with it, as before
+    Python 3.12 the lookup's profile would not see it.
+
+    Args:
+        function (callable): The function to run on another thread.
+
+    Returns:
+        callable: Takes the same arguments as function and returns its result.
+    """
+    capture = getattr(_local, "capture", None)
+    if capture is None or PROFILES_ALL_THREADS:
+        return function
+
+    def run(*args, **kwargs):
+        with capture.profile():
+            return function(*args, **kwargs)
+    return run
+
+class SessionProfiler:
+    """
+    Records a CPU profile and an allocation snapshot for each lookup of a session, and
+    summarises their hot spots and the memory kept between lookups.
+
+    Attributes:
+        directory (str): The folder the profiles are written to, created by start().
+        top (int): The number of functions and source lines listed for each lookup.
+        lookups (list of dict): The summary of each finished lookup.
+    """
+
+    def __init__(self, directory=None, top=TOP_ENTRIES):
+        """
+        Initialises the profiler. Nothing is recorded until start() is called.
+
+        Args:
+            directory (str): The folder to write to, a new folder of the session under
+                the user data directory if not given.
+            top (int): The number of functions and source lines listed for each lookup.
+        """
+        self.directory = directory
+        self.top = top
+        self.lookups = []
+        self._snapshot = None
+        self._count = 0
+        # Comparing snapshots takes seconds in a large process, so it is kept off the main thread
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="weather-profiler")
+
+    def start(self):
+        """Creates the output folder and starts tracing allocations from now."""
+        if self.directory is None:
+            session = datetime.now().strftime("%Y%m%d-%H%M%S")
+            self.directory = get_file_path(os.path.join(PROFILES_FOLDER, session), for_writing=True)
+        os.makedirs(self.directory, exist_ok=True)
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(TRACE_FRAMES)
+        self._snapshot = tracemalloc.take_snapshot()
+        logging.info(f"Profiling lookups into {self.directory}")
+
+    def stop(self):
+        """Waits for the lookups being summarised, then stops tracing allocations."""
+        self._executor.shutdown(wait=True)
+        tracemalloc.stop()
+
+    def begin(self, label):
+        """
+        Starts the profile of a lookup.
+
+        Args:
+            label (str): What is looked up, such as the city name.
+
+        Returns:
+            Capture: The profile, whose stages are then run with Capture.stage or Capture.wrap.
+        """
+        return Capture(self, label)
+
+    def finish(self, capture):
+        """
+        Takes the allocation snapshot of a finished lookup, then writes it and the
+        lookup's profile, and adds the lookup to the summary, in the background.
+
+        Args:
+            capture (Capture): The profile of the lookup.
+
+        Returns:
+            concurrent.futures.Future: The summary of the lookup, a dict.
+        """
+        self._count += 1
+        snapshot = memory = None
+        if tracemalloc.is_tracing():
+            snapshot = tracemalloc.take_snapshot()
+            memory = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+        return self._executor.submit(self._summarise, self._count, capture, snapshot, memory)
+
+    def _summarise(self, number, capture, snapshot, memory):
+        """Writes the files of a lookup and returns its summary. Runs on the profiler's thread."""
+        name = os.path.join(self.directory, f"lookup-{number:03d}")
+        summary = {
+            "lookup": number,
+            "label": capture.label,
+            "stages": dict(capture.stages),
+            "hot_spots": [],
+            "memory": {},
+            "growth": [],
+        }
+
+        stats = capture.stats()
+        if stats is not None:
+            stats.dump_stats(f"{name}.prof")
+            rows = sorted(stats.stats.items(), key=lambda item: item[1][2], reverse=True)[:self.top]
+            summary["hot_spots"] = [
+                {
+                    "function": describe_function(function),
+                    "calls": calls,
+                    "own_seconds": own_time,
+                    "cumulative_seconds": cumulative_time,
+                }
+                for function, (_, calls, own_time, cumulative_time, _) in rows
+            ]
+
+        if snapshot is not None:
+            snapshot.dump(f"{name}.snapshot")
+            differences = [
+                difference for difference in snapshot.compare_to(self._snapshot, "lineno")
+                if difference.size_diff and difference.traceback[0].filename not in IGNORED_FILES
+            ]
+            current, peak = memory
+            summary["memory"] = {
+                "current_bytes": current,
+                "peak_bytes": peak,
+                "growth_bytes": sum(difference.size_diff for difference in differences),
+            }
+            summary["growth"] = [
+                {
+                    "line": f"{difference.traceback[0].filename}:{difference.traceback[0].lineno}",
+                    "size_bytes": difference.size_diff,
+                    "blocks": difference.count_diff,
+                }
+                for difference in differences[:self.top]
+            ]
+            self._snapshot = snapshot
+
+        self.lookups.append(summary)
+        self._write_summary()
+        return summary
+
+    def _write_summary(self):
+        """Writes the summary of every lookup so far. Runs on the profiler's thread."""
+        try:
+            with open(os.path.join(self.directory, "summary.json"), "w") as file:
+                json.dump({"lookups": self.lookups}, file, indent=2)
+            with open(os.path.join(self.directory, "summary.txt"), "w", encoding="utf-8") as file:
+                file.write(format_summary(self.lookups))
+        except IOError as e:
+            logging.error(f"File error: {e}")
+
+def format_summary(lookups):
+    """
+    Returns the summary of a session's lookups as text.
+
+    Args:
+        lookups (list of dict): The summaries returned by SessionProfiler.finish.
+
+    Returns:
+        str: The hot spots and memory growth of each lookup, then the growth over the session.
+    """
+    lines = []
+    for lookup in lookups:
+        stages = ", ".join(f"{name} {seconds:.3f} s" for name, seconds in lookup["stages"].items())
+        lines.append(f"Lookup {lookup['lookup']}: {lookup['label']} ({stages})")
+        if lookup["hot_spots"]:
+            lines.append("  Hot spots, by time spent in the function itself:")
+            lines.append(f"    {'own s':>8} {'cum. s':>8} {'calls':>7}  function")
+            for spot in lookup["hot_spots"]:
+                lines.append(
+                    f"    {spot['own_seconds']:8.4f} {spot['cumulative_seconds']:8.4f} {spot['calls']:7d}  {spot['function']}"
+                )
+        memory = lookup["memory"]
+        if memory:
+            lines.append(
+                f"  Traced memory: {format_size(memory['current_bytes'])} "
+                f"(peak {format_size(memory['peak_bytes'])}), "
+                f"{format_size(memory['growth_bytes'], signed=True)} since the previous lookup"
+            )
+            if lookup["growth"]:
+                lines.append("  Largest changes since the previous lookup:")
+                for line in lookup["growth"]:
+                    lines.append(f"    {format_size(line['size_bytes'], signed=True):>12} {line['blocks']:+7d} blocks  {line['line']}")
+        lines.append("")
+
+    with_memory = [lookup for lookup in lookups if lookup["memory"]]
+    if len(with_memory) > 1:
+        growth = sum(lookup["memory"]["growth_bytes"] for lookup in with_memory[1:])
+        lines.append(
+            f"Memory kept from lookup {with_memory[0]['lookup']} to lookup {with_memory[-1]['lookup']}: "
+            f"{format_size(growth, signed=True)}, {format_size(growth // (len(with_memory) - 1), signed=True)} a lookup"
+        )
+    return "\n".join(lines) + "\n"
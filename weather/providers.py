@@ -0,0 +1,417 @@
+"""
+The weather data providers WeatherAPI can fetch from, and the chain that hedges slow
+requests and fails over between them.
+
+Every provider answers in the shape of the OpenWeatherMap /data/2.5 responses, so the
+rest of the application parses one format whichever provider answered.
+"""
+import os
+import time
+import logging
+import threading
+import requests
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from weather.metrics import metrics
+from weather.ratelimit import CircuitBreaker
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+OPEN_METEO_BASE_URL = "https://api.open-meteo.com"
+# A comma-separated list of the providers to use, in order of preference
+PROVIDERS_ENV = "WEATHER_PROVIDERS"
+DEFAULT_PROVIDERS = "openweathermap"
+
+# A duplicate request is sent once the first has taken longer than this percentile of
+# recent response times, but only once there are enough of them to estimate it
+DEFAULT_HEDGE_PERCENTILE = 0.95
+HEDGE_MIN_SAMPLES = 20
+# Requests are never hedged sooner than this, in seconds, as duplicates cost API quota
+HEDGE_MIN_DELAY = 0.25
+LATENCY_WINDOW = 200
+DEFAULT_HEDGE_WORKERS = 16
+# The share of requests that may be hedged, and how many hedges may be sent in a row
+# once that budget has built up, so a slow provider is not sent twice the calls
+DEFAULT_HEDGE_BUDGET = 0.05
+HEDGE_BUDGET_BURST = 3
+
+# The errors after which the next provider is tried
+FAILOVER_ERRORS = (requests.exceptions.RequestException, ValueError, KeyError)
+
+# WMO weather interpretation codes, as used by Open-Meteo, to an OpenWeatherMap
+# description and icon, without its day or night suffix
+WMO_CODES = {
+    0: ("clear sky", "01"), 1: ("mainly clear", "02"), 2: ("partly cloudy", "03"), 3: ("overcast clouds", "04"),
+    45: ("fog", "50"), 48: ("depositing rime fog", "50"),
+    51: ("light drizzle", "09"), 53: ("drizzle", "09"), 55: ("heavy drizzle", "09"),
+    56: ("light freezing drizzle", "09"), 57: ("freezing drizzle", "09"),
+    61: ("light rain", "10"), 63: ("moderate rain", "10"), 65: ("heavy rain", "10"),
+    66: ("light freezing rain", "13"), 67: ("freezing rain", "13"),
+    71: ("light snow", "13"), 73: ("snow", "13"), 75: ("heavy snow", "13"), 77: ("snow grains", "13"),
+    80: ("light rain showers", "09"), 81: ("rain showers", "09"), 82: ("violent rain showers", "09"),
+    85: ("light snow showers", "13"), 86: ("heavy snow showers", "13"),
+    95: ("thunderstorm", "11"), 96: ("thunderstorm with hail", "11"), 99: ("thunderstorm with heavy hail", "11"),
+}
+
+class LatencyTracker:
+    """
+    A thread-safe window of the most recent response times of a provider.
+
+    Attributes:
+        window (int): The number of response times kept.
+    """
+
+    def __init__(self, window=LATENCY_WINDOW):
+        """Initialises an empty tracker."""
+        self.window = window
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._samples)
+
+    def record(self, seconds):
+        """Records a response time, in seconds."""
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, fraction):
+        """
+        Returns a percentile of the recorded response times.
+
+        Args:
+            fraction (float): The percentile, between 0 and 1.
+
+        Returns:
+            float: The response time, in seconds, or None if none is recorded.
+        """
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return None
+        return samples[min(len(samples) - 1, int(fraction * len(samples)))]
+
+class Provider:
+    """
+    A source of current weather and forecasts.
+
+    Subclasses implement fetch. Each provider tracks its own response times.
+
+    Attributes:
+        name (str): The name the provider is chosen and reported by.
+        latency (LatencyTracker): The recent response times of the provider.
+    """
+
+    name = None
+
+    def __init__(self):
+        """Initialises the provider's latency tracker."""
+        self.latency = LatencyTracker()
+
+    def fetch(self, api, endpoint, latitude, longitude):
+        """
+        Fetches a response from the provider.
+
+        Args:
+            api (WeatherAPI): The client whose session, retries and limits to use.
+            endpoint (str): The endpoint name, "weather" or "forecast".
+            latitude (float): The latitude of the location.
+            longitude (float): The longitude of the location.
+
+        Returns:
+            tuple: The response, in the shape of the OpenWeatherMap endpoint of the same
+            name, and the size of the response body in bytes.
+
+        Raises:
+            requests.exceptions.RequestException: If there is a network error.
+            ValueError: If the response is not valid JSON.
+            KeyError: If the response is missing a field.
+        """
+        raise NotImplementedError
+
+class OpenWeatherMapProvider(Provider):
+    """
+    The OpenWeatherMap data API. Its calls count against the API quota, wait for the
+    rate limiter and go through the circuit breaker of the WeatherAPI.
+
+    Attributes:
+        base_url (str): The base URL of the API, or None to use that of the WeatherAPI.
+    """
+
+    name = "openweathermap"
+
+    def __init__(self, base_url=None, name=None):
+        """Initialises the provider."""
+        super().__init__()
+        self.base_url = base_url
+        if name is not None:
+            self.name = name
+
+    def fetch(self, api, endpoint, latitude, longitude):
+        url = f"{self.base_url or api.base_url}/data/2.5/{endpoint}"
+        params = {"lat": latitude, "lon": longitude, "appid": api.api_key, "units": "metric"}
+        response = api.request(url, params)
+        return response.json(), len(response.content)
+
+class OpenMeteoProvider(Provider):
+    """
+    The Open-Meteo forecast API, which needs no API key. Its responses are converted
+    to the OpenWeatherMap format. It has a circuit breaker of its own, and its calls do
+    not count against the OpenWeatherMap quota.
+
+    Attributes:
+        base_url (str): The base URL of the API.
+        circuit_breaker (CircuitBreaker): Stops calling the API while it keeps failing.
+    """
+
+    name = "open-meteo"
+    CURRENT_FIELDS = "temperature_2m,relative_humidity_2m,wind_speed_10m,weather_code,is_day"
+    HOURLY_FIELDS = "temperature_2m,relative_humidity_2m,wind_speed_10m,precipitation_probability,weather_code,is_day"
+
+    def __init__(self, base_url=OPEN_METEO_BASE_URL):
+        """Initialises the provider."""
+        super().__init__()
+        self.base_url = base_url
+        self.circuit_breaker = CircuitBreaker(name="Open-Meteo")
+
+    def fetch(self, api, endpoint, latitude, longitude):
+        params = {"latitude": latitude, "longitude": longitude, "wind_speed_unit": "ms",
+                  "timeformat": "unixtime", "timezone": "auto"}
+        if endpoint == "weather":
+            params["current"] = self.CURRENT_FIELDS
+        else:
+            params.update(hourly=self.HOURLY_FIELDS, forecast_days=6)
+        self.circuit_breaker.check()
+        try:
+            response = api.request(f"{self.base_url}/v1/forecast", params, metered=False, kind=self.name)
+        except requests.exceptions.RequestException:
+            self.circuit_breaker.record_failure()
+            raise
+        self.circuit_breaker.record_success()
+        data = response.json()
+        convert = self.to_weather if endpoint == "weather" else self.to_forecast
+        return convert(data, latitude, longitude), len(response.content)
+
+    @staticmethod
+    def describe(code, is_day):
+        """Returns the OpenWeatherMap weather entry of a WMO weather code."""
+        description, icon = WMO_CODES.get(code, ("unknown", "03"))
+        return [{"description": description, "icon": icon + ("d" if is_day else "n")}]
+
+    @classmethod
+    def to_weather(cls, data, latitude, longitude):
+        """Converts an Open-Meteo current weather response to a /data/2.5/weather one."""
+        current = data["current"]
+        return {
+            "coord": {"lat": latitude, "lon": longitude},
+            "main": {"temp": current["temperature_2m"], "humidity": current.get("relative_humidity_2m", 0)},
+            "wind": {"speed": current.get("wind_speed_10m", 0)},
+            "weather": cls.describe(current["weather_code"], current.get("is_day", 1)),
+            "dt": current["time"],
+        }
+
+    @classmethod
+    def to_forecast(cls, data, latitude, longitude):
+        """Converts an Open-Meteo hourly forecast to a three-hourly /data/2.5/forecast response."""
+        hourly = data["hourly"]
+        items = []
+        for index in range(0, len(hourly["time"]), 3):
+            if hourly["temperature_2m"][index] is None:
+                continue
+            items.append({
+                "dt": hourly["time"][index],
+                "main": {"temp": hourly["temperature_2m"][index],
+                         "humidity": hourly["relative_humidity_2m"][index] or 0},
+                "wind": {"speed": hourly["wind_speed_10m"][index] or 0},
+                "pop": (hourly["precipitation_probability"][index] or 0) / 100,
+                "weather": cls.describe(hourly["weather_code"][index], hourly["is_day"][index]),
+            })
+        return {"list": items, "city": {"coord": {"lat": latitude, "lon": longitude},
+                                        "timezone": data.get("utc_offset_seconds", 0)}}
+
+PROVIDER_TYPES = {provider.name: provider for provider in (OpenWeatherMapProvider, OpenMeteoProvider)}
+
+class ProviderChain:
+    """
+    Fetches from a list of providers in order of preference, hedging slow requests and
+    failing over when a provider errors.
+
+    When the first provider has not answered within hedge_percentile of its recent
+    response times, a duplicate request is sent to the next provider, or to the same one
+    if it is the only one, and whichever answers first is used. The wait starts when the
+    request is sent, not when it is queued, and only hedge_budget of the requests are
+    hedged. When a request fails, the next provider not tried yet is asked instead.
+
+    Attributes:
+        providers (list of Provider): The providers, in order of preference.
+        hedge_percentile (float): The percentile of response times after which a
+            duplicate request is sent, or None to never send one.
+        min_samples (int): How many response times the first provider must have
+            before requests are hedged.
+        min_delay (float): The shortest time, in seconds, to wait before hedging.
+        hedge_budget (float): The share of requests that may be hedged.
+    """
+
+    _executor = None
+    _executor_lock = threading.Lock()
+
+    def __init__(self, providers, hedge_percentile=DEFAULT_HEDGE_PERCENTILE, min_samples=HEDGE_MIN_SAMPLES,
+                 min_delay=HEDGE_MIN_DELAY, hedge_budget=DEFAULT_HEDGE_BUDGET):
+        """Initialises the chain."""
+        if not providers:
+            raise ValueError("At least one provider is needed.")
+        self.providers = list(providers)
+        self.hedge_percentile = hedge_percentile
+        self.min_samples = min_samples
+        self.min_delay = min_delay
+        self.hedge_budget = hedge_budget
+        # Each request adds hedge_budget of a hedge, up to HEDGE_BUDGET_BURST, and each hedge takes one
+        self._hedge_credit = HEDGE_BUDGET_BURST
+        self._hedge_lock = threading.Lock()
+
+    @classmethod
+    def from_environment(cls, strict=True):
+        """
+        Returns a chain of the providers named in the WEATHER_PROVIDERS environment
+        variable, by default OpenWeatherMap alone.
+
+        Args:
+            strict (bool): Whether an unknown provider is an error. If not, it is logged
+                and left out, and OpenWeatherMap is used if no known provider is left.
+
+        Raises:
+            ValueError: If a provider is not known and strict is True.
+        """
+        names = [name.strip() for name in os.environ.get(PROVIDERS_ENV, DEFAULT_PROVIDERS).split(",") if name.strip()]
+        unknown = [name for name in names if name not in PROVIDER_TYPES]
+        if unknown:
+            message = f"Unknown weather providers: {', '.join(unknown)}. Choose from {', '.join(PROVIDER_TYPES)}."
+            if strict:
+                raise ValueError(message)
+            logging.warning(f"{message} Ignoring them.")
+            names = [name for name in names if name in PROVIDER_TYPES] or [DEFAULT_PROVIDERS]
+        return cls([PROVIDER_TYPES[name]() for name in names])
+
+    @classmethod
+    def get_executor(cls):
+        """Returns the thread pool hedged requests run on, creating it on first use."""
+        with cls._executor_lock:
+            if cls._executor is None:
+                cls._executor = ThreadPoolExecutor(max_workers=DEFAULT_HEDGE_WORKERS, thread_name_prefix="weather-hedge")
+            return cls._executor
+
+    def hedge_delay(self):
+        """
+        Returns how long to wait for the first provider before sending a duplicate request.
+
+        Returns:
+            float: The delay in seconds, or None if requests are not hedged yet.
+        """
+        latency = self.providers[0].latency
+        if self.hedge_percentile is None or len(latency) < self.min_samples:
+            return None
+        return max(self.min_delay, latency.percentile(self.hedge_percentile))
+
+    def _take_hedge(self):
+        """Returns whether the hedge budget allows another hedge, taking it if so."""
+        with self._hedge_lock:
+            if self._hedge_credit < 1:
+                return False
+            self._hedge_credit -= 1
+            return True
+
+    def stats(self):
+        """
+        Returns the recent response times of each provider.
+
+        Returns:
+            dict: The number of "samples" and the "p50" and "p95" response times in
+            seconds, or None if unknown, by provider name.
+        """
+        return {
+            provider.name: {
+                "samples": len(provider.latency),
+                "p50": provider.latency.percentile(0.5),
+                "p95": provider.latency.percentile(0.95),
+            }
+            for provider in self.providers
+        }
+
+    def _call(self, provider, api, endpoint, latitude, longitude):
+        """Fetches from one provider, recording its response time and outcome."""
+        start = time.perf_counter()
+        try:
+            with metrics.span("provider_seconds", provider=provider.name):
+                result = provider.fetch(api, endpoint, latitude, longitude)
+        except FAILOVER_ERRORS:
+            metrics.increment("provider_requests_total", provider=provider.name, result="error")
+            raise
+        provider.latency.record(time.perf_counter() - start)
+        metrics.increment("provider_requests_total", provider=provider.name, result="ok")
+        return result
+
+    def _fetch_in_turn(self, providers, api, endpoint, latitude, longitude, error=None):
+        """Asks each provider in turn until one answers, raising the last error if none does."""
+        for provider in providers:
+            if error is not None:
+                logging.warning(f"Failing over to {provider.name} after: {error}")
+                metrics.increment("provider_failovers_total", provider=provider.name)
+            try:
+                return self._call(provider, api, endpoint, latitude, longitude)
+            except FAILOVER_ERRORS as e:
+                error = e
+        raise error
+
+    def fetch(self, api, endpoint, latitude, longitude):
+        """
+        Fetches a response from the first provider able to give one.
+
+        Args:
+            api (WeatherAPI): The client whose session, retries and limits to use.
+            endpoint (str): The endpoint name, "weather" or "forecast".
+            latitude (float): The latitude of the location.
+            longitude (float): The longitude of the location.
+
+        Returns:
+            tuple: The response, in the shape of the OpenWeatherMap endpoint of the same
+            name, and the size of the response body in bytes.
+
+        Raises:
+            requests.exceptions.RequestException: If every provider failed with a network error.
+            ValueError: If the last response tried is not valid JSON.
+            KeyError: If the last response tried is missing a field.
+        """
+        with self._hedge_lock:
+            self._hedge_credit = min(HEDGE_BUDGET_BURST, self._hedge_credit + self.hedge_budget)
+        delay = self.hedge_delay()
+        if delay is None:
+            return self._fetch_in_turn(self.providers, api, endpoint, latitude, longitude)
+
+        remaining = self.providers[1:]
+        first = self.providers[0]
+        # The pool is shared by every caller, so the wait for the first provider is only
+        # started once its request has left the queue
+        started = threading.Event()
+
+        def call_first():
+            started.set()
+            return self._call(first, api, endpoint, latitude, longitude)
+
+        executor = self.get_executor()
+        futures = {executor.submit(call_first)}
+        started.wait()
+        done, _ = wait(futures, timeout=delay)
+        if not done and self._take_hedge():
+            hedge = remaining.pop(0) if remaining else first
+            metrics.increment("hedged_requests_total", provider=hedge.name)
+            futures.add(executor.submit(self._call, hedge, api, endpoint, latitude, longitude))
+
+        error = None
+        while futures:
+            done, futures = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    return future.result()
+                except FAILOVER_ERRORS as e:
+                    error = e
+        return self._fetch_in_turn(remaining, api, endpoint, latitude, longitude, error)
@@ -0,0 +1,340 @@
+"""
+Rate limiting, retries and failure handling for calls to the OpenWeatherMap API.
+"""
+import os
+import json
+import time
+import asyncio
+import random
+import logging
+import threading
+from weather.config import get_file_path
+import requests
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+# The limits of the free OpenWeatherMap plan
+CALLS_PER_MINUTE = 60
+CALLS_PER_MONTH = 1_000_000
+
+USAGE_FILE = "usage.json"
+
+class CircuitOpenError(requests.exceptions.RequestException):
+    """Raised instead of calling the API while the circuit breaker is open."""
+
+class TokenBucket:
+    """
+    A thread-safe token bucket that spaces out calls to stay under a rate limit.
+
+    The bucket holds at most capacity tokens and refills at rate tokens per second.
+    Each call takes one token, waiting for it if the bucket is empty.
+
+    Attributes:
+        rate (float): The number of tokens added per second.
+        capacity (float): The maximum number of tokens, which is the largest burst allowed.
+    """
+
+    def __init__(self, rate=CALLS_PER_MINUTE / 60, capacity=CALLS_PER_MINUTE, clock=time.monotonic, sleep=time.sleep):
+        """Initialises a full bucket."""
+        self.rate = rate
+        self.capacity = capacity
+        self.clock = clock
+        self.sleep = sleep
+        self._tokens = capacity
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        """Adds the tokens earned since the last update. Must be called with the lock held."""
+        now = self.clock()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def _reserve(self):
+        """Takes a token, possibly in advance, and returns how long to wait before using it."""
+        with self._lock:
+            self._refill()
+            self._tokens -= 1
+            return 0 if self._tokens >= 0 else -self._tokens / self.rate
+
+    def try_acquire(self):
+        """
+        Takes a token if one is available now, without waiting.
+
+        Returns:
+            bool: True if a token was taken.
+        """
+        with self._lock:
+            self._refill()
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+    def acquire(self):
+        """
+        Takes a token, blocking until one is available.
+
+        Returns:
+            float: How long, in seconds, the call waited.
+        """
+        wait = self._reserve()
+        if wait > 0:
+            self.sleep(wait)
+        return wait
+
+    async def acquire_async(self):
+        """
+        Takes a token, waiting for one without blocking the event loop.
+
+        Returns:
+            float: How long, in seconds, the call waited.
+        """
+        wait = self._reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+        return wait
+
+class RetryPolicy:
+    """
+    Decides whether and when to retry a failed request, using exponential backoff
+    with full jitter, or the delay the server asked for in a Retry-After header.
+
+    Attributes:
+        max_retries (int): The maximum number of retries after the first attempt.
+        base_delay (float): The backoff of the first retry, in seconds, before jitter.
+        max_delay (float): The longest delay between two attempts, in seconds.
+    """
+
+    RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+    def __init__(self, max_retries=3, base_delay=0.5, max_delay=30):
+        """Initialises the policy."""
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def should_retry(self, attempt, status_code=None):
+        """
+        Returns whether to retry after a failed attempt.
+
+        Args:
+            attempt (int): The number of the failed attempt, starting at 0.
+            status_code (int): The HTTP status of the response, or None after a connection error.
+
+        Returns:
+            bool: True if the request should be sent again.
+        """
+        if attempt >= self.max_retries:
+            return False
+        return status_code is None or status_code in self.RETRY_STATUSES
+
+    def delay(self, attempt, retry_after=None):
+        """
+        Returns how long to wait before the next attempt.
+
+        Args:
+            attempt (int): The number of the failed attempt, starting at 0.
+            retry_after (str): The value of the Retry-After header, if any.
+
+        Returns:
+            float: The delay in seconds.
+        """
+        requested = parse_retry_after(retry_after)
+        if requested is not None:
+            return min(requested, self.max_delay)
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+def parse_retry_after(value):
+    """
+    Parses a Retry-After header, given either in seconds or as an HTTP date.
+
+    Args:
+        value (str): The header value, or None.
+
+    Returns:
+        float: The number of seconds to wait, or None if the header is missing or invalid.
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+class CircuitBreaker:
+    """
+    Stops calling an upstream service that keeps failing, so callers fail fast.
+
+    After failure_threshold consecutive failures the breaker opens and every call is
+    refused for reset_timeout seconds. Then a single trial call is let through: if it
+    succeeds the breaker closes again, otherwise it stays open for another period.
+
+    Attributes:
+        failure_threshold (int): The number of consecutive failures that opens the breaker.
+        reset_timeout (float): How long, in seconds, the breaker stays open.
+        name (str): The name of the service, used in messages.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30, clock=time.monotonic, name="OpenWeatherMap"):
+        """Initialises a closed breaker."""
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.name = name
+        self.clock = clock
+        self._failures = 0
+        self._opened_at = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        """str: "closed", "open" or "half-open"."""
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            if self.clock() - self._opened_at >= self.reset_timeout:
+                return "half-open"
+            return "open"
+
+    def check(self):
+        """
+        Raises if a call must not be made right now.
+
+        Raises:
+            CircuitOpenError: If the breaker is open, or half-open with a trial call running.
+        """
+        with self._lock:
+            if self._opened_at is None:
+                return
+            if self.clock() - self._opened_at >= self.reset_timeout and not self._trial_running:
+                self._trial_running = True
+                return
+        raise CircuitOpenError(f"The {self.name} API is unavailable; not calling it for now.")
+
+    def record_success(self):
+        """Records a successful call, closing the breaker."""
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_running = False
+
+    def record_failure(self):
+        """Records a failed call, opening the breaker once the threshold is reached."""
+        with self._lock:
+            self._failures += 1
+            if self._trial_running or self._failures >= self.failure_threshold:
+                if self._opened_at is None or self._trial_running:
+                    logging.warning(f"Too many failed {self.name} API calls; pausing calls to the API.")
+                self._opened_at = self.clock()
+            self._trial_running = False
+
+class UsageCounter:
+    """
+    Counts API calls per calendar month and keeps the count in the user data directory,
+    so the monthly budget can be tracked across runs.
+
+    The count is written every flush_every calls and by flush(). The counter of
+    WeatherAPI is flushed when the interpreter exits; flush any other counter when done.
+
+    Attributes:
+        path (str): The path to the usage file, resolved on first use if not given.
+        monthly_limit (int): The number of calls allowed per month.
+        flush_every (int): How many calls are counted between two writes.
+    """
+
+    def __init__(self, path=None, monthly_limit=CALLS_PER_MONTH, flush_every=25):
+        """Initialises the counter. The file is not read until the first call is counted."""
+        self.path = path
+        self.monthly_limit = monthly_limit
+        self.flush_every = flush_every
+        self._month = None
+        self._calls = 0
+        self._unsaved = 0
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def current_month():
+        """Returns the current UTC month as "YYYY-MM"."""
+        return datetime.now(timezone.utc).strftime("%Y-%m")
+
+    def _load(self):
+        """Reads the usage file, once. Must be called with the lock held."""
+        if self._loaded:
+            return
+        if self.path is None:
+            self.path = get_file_path(USAGE_FILE, for_writing=True)
+        try:
+            with open(self.path, "r") as file:
+                usage = json.load(file)
+            self._month, self._calls = usage["month"], usage["calls"]
+        except FileNotFoundError:
+            pass
+        except (IOError, ValueError, KeyError) as e:
+            logging.warning(f"Ignoring unreadable usage file: {e}")
+        self._loaded = True
+
+    def _roll_over(self):
+        """Starts a new count when the month changes. Must be called with the lock held."""
+        month = self.current_month()
+        if self._month != month:
+            self._month = month
+            self._calls = 0
+
+    def record(self, calls=1):
+        """
+        Counts calls made to the API.
+
+        Args:
+            calls (int): The number of calls to count.
+        """
+        with self._lock:
+            self._load()
+            self._roll_over()
+            self._calls += calls
+            self._unsaved += calls
+            if self._unsaved >= self.flush_every:
+                self._save()
+
+    def _save(self):
+        """Atomically writes the usage file. Must be called with the lock held."""
+        temp_path = f"{self.path}.tmp"
+        try:
+            with open(temp_path, "w") as file:
+                json.dump({"month": self._month, "calls": self._calls}, file)
+            os.replace(temp_path, self.path)
+            self._unsaved = 0
+        except IOError as e:
+            logging.error(f"File error: {e}")
+
+    def flush(self):
+        """Writes any calls counted since the last write."""
+        with self._lock:
+            if self._unsaved:
+                self._save()
+
+    def snapshot(self):
+        """
+        Returns the usage of the current month.
+
+        Returns:
+            dict: The "month", the "calls" made, the "monthly_limit", the "remaining"
+            calls and the "fraction_used" of the budget.
+        """
+        with self._lock:
+            self._load()
+            self._roll_over()
+            return {
+                "month": self._month,
+                "calls": self._calls,
+                "monthly_limit": self.monthly_limit,
+                "remaining": max(0, self.monthly_limit - self._calls),
+                "fraction_used": self._calls / self.monthly_limit,
+            }
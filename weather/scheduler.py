@@ -0,0 +1,261 @@
+"""
+Background refreshing of the weather of favourite cities.
+"""
+import time
+import heapq
+import logging
+import sqlite3
+import calendar
+import threading
+from datetime import datetime, timezone
+from weather.api import WeatherAPI, CACHE_TTLS
+from weather.data import favourites_store, get_coordinates_from_city, normalise_city
+from weather.history import history
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+# Refreshing more often than the weather cache expires would only return the cached response
+MIN_INTERVAL = CACHE_TTLS["weather"]
+MAX_INTERVAL = 2 * 60 * 60
+# How much an interval grows when the weather did not change, and shrinks when it did
+BACKOFF_FACTOR = 1.5
+# The most the intervals are stretched when the month's API budget is being used too fast
+MAX_BUDGET_FACTOR = 8
+
+def month_elapsed_fraction(now=None):
+    """
+    Returns how much of the current UTC month has passed.
+
+    Args:
+        now (datetime): The current time, for testing.
+
+    Returns:
+        float: A fraction between 0 and 1.
+    """
+    now = now or datetime.now(timezone.utc)
+    days_in_month = calendar.monthrange(now.year, now.month)[1]
+    seconds = (now.day - 1) * 86400 + now.hour * 3600 + now.minute * 60 + now.second
+    return seconds / (days_in_month * 86400)
+
+class RefreshScheduler:
+    """
+    Prefetches and periodically refreshes the weather and forecast of every favourite city,
+    so picking one shows fresh data from the cache straight away.
+
+    Each city has its own refresh interval. It shrinks, down to min_interval, when the
+    weather changed since the last refresh, and grows, up to max_interval, when it did
+    not. All intervals are stretched when the API calls made this month are running
+    ahead of the monthly budget.
+
+    Attributes:
+        store (FavouritesStore): The favourites whose weather is refreshed, and where
+            the fetched weather and coordinates are kept.
+        min_interval (float): The shortest refresh interval, in seconds.
+        max_interval (float): The longest refresh interval, in seconds.
+    """
+
+    def __init__(self, store=favourites_store, api_factory=WeatherAPI.default, min_interval=MIN_INTERVAL,
+                 max_interval=MAX_INTERVAL, clock=time.monotonic):
+        """Initialises the scheduler. Nothing is fetched until start() or run_pending() is called."""
+        self.store = store
+        self.api_factory = api_factory
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.clock = clock
+        self._queue = []
+        self._intervals = {}
+        self._names = {}
+        # Each time a city is added it gets a new generation, and queue entries from an
+        # earlier generation are dropped, so removing and adding a city again never
+        # leaves it with two refresh chains
+        self._generations = {}
+        self._next_generation = 0
+        self._condition = threading.Condition()
+        self._stopped = False
+        self._thread = None
+
+    def start(self):
+        """
+        Schedules every favourite for an immediate refresh and starts the background thread.
+
+        Returns:
+            threading.Thread: The daemon thread doing the work.
+        """
+        try:
+            for city in self.store.names():
+                self.add(city)
+        except sqlite3.Error as e:
+            logging.error(f"Database error: {e}")
+        self._thread = threading.Thread(target=self._run, name="favourites-refresh", daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def stop(self):
+        """Stops the background thread after its current refresh."""
+        with self._condition:
+            self._stopped = True
+            self._condition.notify()
+
+    def add(self, city):
+        """
+        Schedules a city for an immediate refresh, if it is not scheduled already.
+
+        Args:
+            city (str): The name of the city.
+        """
+        key = normalise_city(city)
+        with self._condition:
+            if key in self._intervals:
+                return
+            self._intervals[key] = self.min_interval
+            self._names[key] = city
+            self._next_generation += 1
+            self._generations[key] = self._next_generation
+            heapq.heappush(self._queue, (self.clock(), key, self._next_generation))
+            self._condition.notify()
+
+    def remove(self, city):
+        """
+        Stops refreshing a city.
+
+        Args:
+            city (str): The name of the city.
+        """
+        key = normalise_city(city)
+        with self._condition:
+            self._intervals.pop(key, None)
+            self._names.pop(key, None)
+            self._generations.pop(key, None)
+
+    def interval(self, city):
+        """
+        Returns the current refresh interval of a city, before budget stretching.
+
+        Args:
+            city (str): The name of the city.
+
+        Returns:
+            float: The interval in seconds, or None if the city is not scheduled.
+        """
+        with self._condition:
+            return self._intervals.get(normalise_city(city))
+
+    def budget_factor(self):
+        """
+        Returns how much to stretch the refresh intervals to stay within the monthly budget.
+
+        Returns:
+            float: 1 when the share of the budget used is no more than the share of the month
+            gone, otherwise the ratio of the two, capped at MAX_BUDGET_FACTOR.
+        """
+        used = WeatherAPI.usage.snapshot()["fraction_used"]
+        elapsed = max(month_elapsed_fraction(), 0.01)
+        if used <= elapsed:
+            return 1
+        return min(MAX_BUDGET_FACTOR, used / elapsed)
+
+    def run_pending(self):
+        """
+        Refreshes every city that is due, then schedules its next refresh. A city whose
+        refresh raises is scheduled again after max_interval, and the error is raised.
+
+        Returns:
+            float: The number of seconds until the next refresh is due, or None if no
+            city is scheduled.
+        """
+        while True:
+            with self._condition:
+                if not self._queue:
+                    return None
+                due, key, generation = self._queue[0]
+                wait = due - self.clock()
+                if wait > 0:
+                    return wait
+                heapq.heappop(self._queue)
+                if self._generations.get(key) != generation:
+                    continue
+                city = self._names[key]
+
+            # None if the refresh raised, which backs the city off to max_interval rather
+            # than leaving it out of the queue for good
+            changed = None
+            try:
+                changed = self.refresh(city)
+            finally:
+                self._reschedule(key, generation, changed)
+
+    def _reschedule(self, key, generation, changed):
+        """Schedules the next refresh of a city after one has run, if it is still scheduled."""
+        budget_factor = self.budget_factor()
+        with self._condition:
+            if self._generations.get(key) != generation:
+                return
+            interval = self._intervals[key]
+            if changed is None:
+                interval = self.max_interval
+            elif changed:
+                interval = max(self.min_interval, interval / BACKOFF_FACTOR)
+            else:
+                interval = min(self.max_interval, interval * BACKOFF_FACTOR)
+            self._intervals[key] = interval
+            heapq.heappush(self._queue, (self.clock() + interval * budget_factor, key, generation))
+
+    def refresh(self, city):
+        """
+        Fetches the weather and forecast of a favourite city and keeps them in the store.
+
+        Args:
+            city (str): The name of the city.
+
+        Returns:
+            bool: True if the temperature, description or icon changed since the last
+            refresh, or the city had no data yet.
+        """
+        try:
+            favourite = self.store.get(city)
+            if favourite is None:
+                self.remove(city)
+                return False
+            latitude, longitude = favourite.latitude, favourite.longitude
+            if latitude is None or longitude is None:
+                latitude, longitude = get_coordinates_from_city(city)
+                if latitude is None or longitude is None:
+                    return False
+                self.store.set_coordinates(city, latitude, longitude)
+
+            report = self.api_factory().get_location_report(latitude, longitude)
+            if report["weather"] is None:
+                return False
+            self.store.set_data(city, {"weather": report["weather"], "forecast": report["forecast"]})
+            history.record_weather(latitude, longitude, report["weather"])
+            if report["forecast"] is not None:
+                history.record_forecast(latitude, longitude, report["forecast"])
+        except sqlite3.Error as e:
+            logging.error(f"Database error: {e}")
+            return False
+
+        previous = (favourite.last_data or {}).get("weather")
+        if previous is None:
+            return True
+        _, temperature, description, icon_code = report["weather"]
+        _, previous_temperature, previous_description, previous_icon_code = previous
+        return (
+            round(temperature * 2) != round(previous_temperature * 2)
+            or description != previous_description
+            or icon_code != previous_icon_code
+        )
+
+    def _run(self):
+        """Refreshes cities as they fall due until stopped."""
+        while True:
+            try:
+                wait = self.run_pending()
+            except Exception as e:
+                logging.error(f"Unexpected error: {e}")
+                wait = self.min_interval
+            with self._condition:
+                if self._stopped:
+                    return
+                self._condition.wait(wait)
+                if self._stopped:
+                    return
@@ -0,0 +1,271 @@
+"""
+A local HTTP service that answers many clients from one shared cache, so each location
+costs at most one upstream call per cache TTL however many clients ask for it.
+
+Usage:
+    python -m weather.server --port 8080
+
+Endpoints, all answering GET with JSON:
+    /weather?lat=51.5&lon=-0.12   or   /weather?city=London
+    /forecast?lat=51.5&lon=-0.12  or   /forecast?city=London
+    /geocode?city=London
+    /stats
+    /metrics   (in the Prometheus text format)
+"""
+import json
+import asyncio
+import logging
+import argparse
+import requests
+from concurrent.futures import ThreadPoolExecutor
+from aiohttp import web
+from weather.api import WeatherAPI
+from weather.data import geocode_city, normalise_city
+from weather.ratelimit import CircuitOpenError
+from weather.metrics import metrics
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8080
+# The number of blocking upstream calls that may run at once
+DEFAULT_WORKERS = 32
+
+class Coalescer:
+    """
+    Lets concurrent callers asking for the same key share one in-flight call.
+
+    Attributes:
+        calls (int): Calls actually started.
+        coalesced (int): Callers that joined a call already in flight.
+    """
+
+    def __init__(self):
+        """Initialises a coalescer with nothing in flight. Must be used from one event loop."""
+        self.calls = 0
+        self.coalesced = 0
+        self._in_flight = {}
+
+    async def run(self, key, start):
+        """
+        Returns the result of the call in flight for key, starting it if there is none.
+
+        Args:
+            key (hashable): Identifies equivalent calls.
+            start (callable): Takes no arguments and returns an awaitable; only called
+                when no call for key is in flight.
+
+        Returns:
+            The result of the call.
+
+        Raises:
+            Exception: Whatever the call raised, to every caller sharing it.
+        """
+        future = self._in_flight.get(key)
+        if future is None:
+            self.calls += 1
+            future = asyncio.ensure_future(start())
+            self._in_flight[key] = future
+            future.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        else:
+            self.coalesced += 1
+        # One caller going away must not cancel the call for the others
+        return await asyncio.shield(future)
+
+class WeatherServer:
+    """
+    Serves the weather, forecasts and coordinates over HTTP.
+
+    Requests are handled on the event loop. The upstream calls go through a shared
+    WeatherAPI, and so its response cache, rate limiter and circuit breaker, on a
+    thread pool. Identical requests that arrive while one is in flight wait for it
+    instead of calling the API again.
+
+    Attributes:
+        api (WeatherAPI): The client used for upstream calls.
+        coalescer (Coalescer): Merges concurrent identical upstream calls.
+    """
+
+    def __init__(self, api=None, workers=DEFAULT_WORKERS):
+        """
+        Initialises the server.
+
+        Args:
+            api (WeatherAPI): The client used for upstream calls, WeatherAPI.default() if not given.
+            workers (int): The number of upstream calls that may run at once.
+        """
+        self.api = api or WeatherAPI.default()
+        self.api.get_session(workers)
+        self.coalescer = Coalescer()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="weather-server")
+
+    def make_app(self):
+        """
+        Returns the aiohttp application serving the endpoints.
+
+        Returns:
+            aiohttp.web.Application: The application.
+        """
+        app = web.Application()
+        app.add_routes([
+            web.get("/weather", self.handle_weather),
+            web.get("/forecast", self.handle_forecast),
+            web.get("/geocode", self.handle_geocode),
+            web.get("/stats", self.handle_stats),
+            web.get("/metrics", self.handle_metrics),
+        ])
+        app.on_cleanup.append(self._shutdown)
+        return app
+
+    async def _shutdown(self, app):
+        """Stops the thread pool when the application is cleaned up."""
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    async def _call(self, key, fn, *args):
+        """Runs a blocking function on the thread pool, sharing the call with identical requests."""
+        loop = asyncio.get_running_loop()
+        return await self.coalescer.run(key, lambda: loop.run_in_executor(self._executor, fn, *args))
+
+    async def geocode(self, city):
+        """
+        Returns the coordinates of a city.
+
+        Raises:
+            aiohttp.web.HTTPNotFound: If the city could not be found.
+            aiohttp.web.HTTPServiceUnavailable: If the circuit breaker is open.
+            aiohttp.web.HTTPBadGateway: If the geocoding call failed.
+        """
+        latitude, longitude = await self.upstream(("geocode", normalise_city(city)), geocode_city, city)
+        if latitude is None or longitude is None:
+            raise error_response(web.HTTPNotFound, f"Could not find the coordinates of {city}.")
+        return latitude, longitude
+
+    async def coordinates(self, request):
+        """
+        Returns the coordinates a request asks about, from its lat and lon or its city.
+
+        Raises:
+            aiohttp.web.HTTPBadRequest: If the query is missing or invalid.
+            aiohttp.web.HTTPNotFound: If the city could not be found.
+            aiohttp.web.HTTPServiceUnavailable: If the circuit breaker is open.
+            aiohttp.web.HTTPBadGateway: If the geocoding call failed.
+        """
+        query = request.query
+        if "city" in query:
+            city = query["city"].strip()
+            if not city:
+                raise error_response(web.HTTPBadRequest, "The city must not be empty.")
+            return await self.geocode(city)
+        try:
+            latitude, longitude = float(query["lat"]), float(query["lon"])
+        except KeyError:
+            raise error_response(web.HTTPBadRequest, "Give either city, or lat and lon.")
+        except ValueError:
+            raise error_response(web.HTTPBadRequest, "lat and lon must be numbers.")
+        if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+            raise error_response(web.HTTPBadRequest, "lat must be within ±90 and lon within ±180.")
+        return latitude, longitude
+
+    async def fetch(self, endpoint, fn, latitude, longitude):
+        """
+        Runs an upstream fetch for a location, turning its errors into HTTP errors.
+
+        Raises:
+            aiohttp.web.HTTPServiceUnavailable: If the circuit breaker is open.
+            aiohttp.web.HTTPBadGateway: If the upstream call failed.
+        """
+        return await self.upstream(WeatherAPI.cache_key(endpoint, latitude, longitude), fn, latitude, longitude)
+
+    async def upstream(self, key, fn, *args):
+        """
+        Runs a call to the OpenWeatherMap API on the thread pool, sharing it with identical
+        requests and turning its errors into HTTP errors.
+
+        Raises:
+            aiohttp.web.HTTPServiceUnavailable: If the circuit breaker is open.
+            aiohttp.web.HTTPBadGateway: If the upstream call failed.
+        """
+        try:
+            return await self._call(key, fn, *args)
+        except CircuitOpenError as e:
+            raise error_response(web.HTTPServiceUnavailable, str(e))
+        except requests.exceptions.RequestException as e:
+            logging.error(f"Network error: {e}")
+            raise error_response(web.HTTPBadGateway, "The OpenWeatherMap API could not be reached.")
+        except (ValueError, KeyError) as e:
+            logging.error(f"Data error: {e}")
+            raise error_response(web.HTTPBadGateway, "The OpenWeatherMap API sent an invalid response.")
+
+    async def handle_weather(self, request):
+        """Answers /weather with the current weather of a location."""
+        latitude, longitude = await self.coordinates(request)
+        city, temperature, description, icon_code = await self.fetch(
+            "weather", self.api.fetch_weather, latitude, longitude
+        )
+        return web.json_response({
+            "latitude": latitude,
+            "longitude": longitude,
+            "city": city,
+            "temperature": temperature,
+            "description": description,
+            "icon": icon_code,
+        })
+
+    async def handle_forecast(self, request):
+        """Answers /forecast with the five-day forecast of a location."""
+        latitude, longitude = await self.coordinates(request)
+        forecast = await self.fetch("forecast", self.api.fetch_forecast, latitude, longitude)
+        return web.json_response({
+            "latitude": latitude,
+            "longitude": longitude,
+            "forecast": [
+                {"date": date, "temperature": temperature, "description": description}
+                for date, (temperature, description) in forecast.items()
+            ],
+        })
+
+    async def handle_geocode(self, request):
+        """Answers /geocode with the coordinates of a city."""
+        city = request.query.get("city", "").strip()
+        if not city:
+            raise error_response(web.HTTPBadRequest, "Give the city to look up.")
+        latitude, longitude = await self.geocode(city)
+        return web.json_response({"city": city, "latitude": latitude, "longitude": longitude})
+
+    async def handle_stats(self, request):
+        """Answers /stats with the cache, coalescing, API usage and provider latency counters."""
+        return web.json_response({
+            "cache": self.api.cache.stats(),
+            "upstream_calls": self.coalescer.calls,
+            "coalesced": self.coalescer.coalesced,
+            "usage": self.api.usage.snapshot(),
+            "circuit_breaker": self.api.circuit_breaker.state,
+            "providers": self.api.providers.stats(),
+        })
+
+    async def handle_metrics(self, request):
+        """Answers /metrics with the recorded metrics, in the Prometheus text format."""
+        return web.Response(text=metrics.to_prometheus(), content_type="text/plain")
+
+def error_response(error_class, message):
+    """Returns an aiohttp HTTP error with a JSON body, ready to be raised."""
+    return error_class(text=json.dumps({"error": message}), content_type="application/json")
+
+def main(argv=None):
+    """Runs the server until interrupted."""
+    parser = argparse.ArgumentParser(prog="python -m weather.server", description="Serve the weather over HTTP.")
+    parser.add_argument("--host", default=DEFAULT_HOST, help=f"address to listen on (default: {DEFAULT_HOST})")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help=f"port to listen on (default: {DEFAULT_PORT})")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS,
+                        help=f"upstream calls that may run at once (default: {DEFAULT_WORKERS})")
+    args = parser.parse_args(argv)
+    metrics.enable()
+
+    try:
+        server = WeatherServer(workers=args.workers)
+    except ValueError as e:
+        parser.exit(2, f"Error: {e}\n")
+    web.run_app(server.make_app(), host=args.host, port=args.port)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,206 @@
+"""
+Geohash bucketing of coordinates, for finding cached responses near a location.
+"""
+import math
+import threading
+from collections import OrderedDict
+
+GEOHASH_ALPHABET = "0123456789bcdefghjkmnpqrstuvwxyz"
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+# Responses for points this close together are served for one another by default
+DEFAULT_RADIUS_KM = 1.0
+# Geohashes of five characters, about 4.9 km square at the equator, suit radii up to this
+DEFAULT_MAX_RADIUS_KM = 4.0
+DEFAULT_MAX_POINTS = 4096
+
+def normalise_coordinates(latitude, longitude):
+    """
+    Brings coordinates into their canonical form, so equivalent ones share a cache key.
+
+    Latitudes are not clamped, so an invalid one is still rejected by the API.
+
+    Args:
+        latitude (float): The latitude.
+        longitude (float): The longitude, wrapped into [-180, 180).
+
+    Returns:
+        tuple: The (latitude, longitude) as floats.
+    """
+    latitude = float(latitude)
+    longitude = (float(longitude) + 180.0) % 360.0 - 180.0
+    return latitude, longitude
+
+def geohash(latitude, longitude, precision):
+    """
+    Encodes coordinates as a geohash.
+
+    Args:
+        latitude (float): The latitude.
+        longitude (float): The longitude.
+        precision (int): The number of characters.
+
+    Returns:
+        str: The geohash of the cell holding the point.
+    """
+    latitude_range = [-90.0, 90.0]
+    longitude_range = [-180.0, 180.0]
+    characters = []
+    bits = 0
+    value = 0
+    even = True
+    while len(characters) < precision:
+        interval, coordinate = (longitude_range, longitude) if even else (latitude_range, latitude)
+        middle = (interval[0] + interval[1]) / 2
+        value <<= 1
+        if coordinate >= middle:
+            value |= 1
+            interval[0] = middle
+        else:
+            interval[1] = middle
+        even = not even
+        bits += 1
+        if bits == 5:
+            characters.append(GEOHASH_ALPHABET[value])
+            bits = 0
+            value = 0
+    return "".join(characters)
+
+def cell_size(precision):
+    """
+    Returns the size of a geohash cell in degrees.
+
+    Returns:
+        tuple: The (height in degrees of latitude, width in degrees of longitude).
+    """
+    bits = precision * 5
+    longitude_bits = (bits + 1) // 2
+    latitude_bits = bits // 2
+    return 180.0 / 2 ** latitude_bits, 360.0 / 2 ** longitude_bits
+
+def precision_for_radius(radius_km):
+    """
+    Returns the longest geohash whose cells are at least radius_km tall and wide at the
+    equator, so that a cell and its eight neighbours cover any circle of that radius
+    centred in the cell.
+    """
+    precision = 1
+    while precision < 12:
+        height, width = cell_size(precision + 1)
+        if min(height, width) * KM_PER_DEGREE < radius_km:
+            break
+        precision += 1
+    return precision
+
+def distance_km(latitude1, longitude1, latitude2, longitude2):
+    """Returns the great-circle distance between two points, in kilometres."""
+    phi1, phi2 = math.radians(latitude1), math.radians(latitude2)
+    delta_phi = phi2 - phi1
+    delta_lambda = math.radians(longitude2 - longitude1)
+    a = math.sin(delta_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(delta_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+class SpatialIndex:
+    """
+    A thread-safe index of points, bucketed by geohash, that finds the nearest point
+    within a radius by searching a cell and its eight neighbours.
+
+    Points are kept per namespace, such as an endpoint name, so that weather and
+    forecast responses are indexed separately. When more than max_points are held,
+    the oldest are dropped.
+
+    Near the poles, where cells narrow, a search may miss points that are within the
+    radius; it never returns one that is not.
+
+    Attributes:
+        max_radius_km (float): The largest radius searches are exact for.
+        precision (int): The geohash length of the buckets.
+        max_points (int): The maximum number of points held.
+    """
+
+    def __init__(self, max_radius_km=DEFAULT_MAX_RADIUS_KM, max_points=DEFAULT_MAX_POINTS):
+        """Initialises an empty index."""
+        self.max_radius_km = max_radius_km
+        self.precision = precision_for_radius(max_radius_km)
+        self.max_points = max_points
+        self._cells = {}
+        self._points = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._points)
+
+    def add(self, namespace, latitude, longitude):
+        """
+        Adds a point.
+
+        Args:
+            namespace (hashable): The group the point belongs to.
+            latitude (float): The latitude of the point.
+            longitude (float): The longitude of the point.
+        """
+        point = (namespace, latitude, longitude)
+        cell = (namespace, geohash(latitude, longitude, self.precision))
+        with self._lock:
+            if point in self._points:
+                self._points.move_to_end(point)
+                return
+            self._points[point] = cell
+            self._cells.setdefault(cell, set()).add((latitude, longitude))
+            while len(self._points) > self.max_points:
+                self._discard(*self._points.popitem(last=False))
+
+    def remove(self, namespace, latitude, longitude):
+        """Removes a point, if it is held."""
+        point = (namespace, latitude, longitude)
+        with self._lock:
+            cell = self._points.pop(point, None)
+            if cell is not None:
+                self._discard(point, cell)
+
+    def _discard(self, point, cell):
+        """Removes a point from its cell. Must be called with the lock held."""
+        members = self._cells.get(cell)
+        if members is not None:
+            members.discard(point[1:])
+            if not members:
+                del self._cells[cell]
+
+    def nearest(self, namespace, latitude, longitude, radius_km, exclude=()):
+        """
+        Returns the point nearest to a location, if one is within the radius.
+
+        Args:
+            namespace (hashable): The group to search.
+            latitude (float): The latitude of the location.
+            longitude (float): The longitude of the location.
+            radius_km (float): The search radius, capped at max_radius_km.
+            exclude (collection of tuple): Points to leave out of the search.
+
+        Returns:
+            tuple: The (latitude, longitude) of the nearest point, or None.
+        """
+        height, width = cell_size(self.precision)
+        cells = set()
+        for row in (-1, 0, 1):
+            for column in (-1, 0, 1):
+                neighbour = normalise_coordinates(min(90.0, max(-90.0, latitude + row * height)),
+                                                  longitude + column * width)
+                cells.add((namespace, geohash(*neighbour, self.precision)))
+        best, best_distance = None, min(radius_km, self.max_radius_km)
+        with self._lock:
+            for cell in cells:
+                for point in self._cells.get(cell, ()):
+                    if point in exclude:
+                        continue
+                    distance = distance_km(latitude, longitude, *point)
+                    if distance <= best_distance:
+                        best, best_distance = point, distance
+        return best
+
+    def clear(self):
+        """Removes every point."""
+        with self._lock:
+            self._cells.clear()
+            self._points.clear()
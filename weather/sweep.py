@@ -0,0 +1,362 @@
+"""
+Fetches the current weather at every point of a latitude/longitude grid, sharded
+across worker processes, into a resumable columnar output directory.
+
+Usage:
+    python -m weather.sweep 49.9 -8.2 58.7 1.8 --step 0.25 --output uk-sweep
+    python -m weather.sweep 49.9 -8.2 58.7 1.8 --step 0.25 --output uk-sweep --processes 8 --rate 600
+"""
+import os
+import re
+import sys
+import json
+import time
+import logging
+import argparse
+import multiprocessing
+from array import array
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from weather.api import WeatherAPI, API_BASE_URL, DEFAULT_POOL_SIZE
+from weather.history import encode_segment, decode_segment
+from weather.ratelimit import TokenBucket, UsageCounter, CALLS_PER_MINUTE
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+MANIFEST_FILE = "sweep.json"
+DEFAULT_PROCESSES = 4
+# How many fetched points a worker holds before writing them out as a chunk. A run that
+# is interrupted loses at most this many points per worker.
+DEFAULT_CHUNK_SIZE = 256
+CHUNK_PATTERN = re.compile(r"shard-(\d+)-(\d+)\.seg$")
+
+# The columns of every chunk. The first is the grid index of the point; "I" columns
+# hold strings, stored once per shard in its strings file and referenced by number.
+SWEEP_FIELDS = (
+    ("index", "q"), ("latitude", "d"), ("longitude", "d"), ("temperature", "d"),
+    ("city", "I"), ("description", "I"), ("icon", "I"), ("fetched", "q"),
+)
+STRING_FIELDS = {"city", "description", "icon"}
+
+# The outcome of a sweep: the points in the grid, those fetched by this run, those
+# already fetched by an earlier run, and those that failed and are left for the next.
+SweepSummary = namedtuple("SweepSummary", ["points", "fetched", "skipped", "failed"])
+
+# What a worker process needs to sweep its shard
+ShardJob = namedtuple("ShardJob", ["directory", "bounds", "step", "shard", "shards", "base_url",
+                                   "rate", "concurrency", "chunk_size"])
+
+def grid_points(south, west, north, east, step):
+    """
+    Yields the points of a grid over a bounding box, row by row from the south-west corner.
+
+    Args:
+        south (float): The latitude of the southern edge.
+        west (float): The longitude of the western edge.
+        north (float): The latitude of the northern edge.
+        east (float): The longitude of the eastern edge.
+        step (float): The spacing of the points, in degrees.
+
+    Yields:
+        tuple: The grid index (int), latitude (float) and longitude (float) of each point.
+    """
+    rows = int((north - south) / step + 1e-9) + 1
+    columns = int((east - west) / step + 1e-9) + 1
+    for row in range(rows):
+        for column in range(columns):
+            yield row * columns + column, round(south + row * step, 6), round(west + column * step, 6)
+
+def validate_bounds(south, west, north, east, step):
+    """
+    Checks that a bounding box and step describe a grid.
+
+    Raises:
+        ValueError: If they do not.
+    """
+    if not (-90 <= south <= north <= 90):
+        raise ValueError("The latitudes must satisfy -90 <= south <= north <= 90.")
+    if not (-180 <= west <= east <= 180):
+        raise ValueError("The longitudes must satisfy -180 <= west <= east <= 180.")
+    if step <= 0:
+        raise ValueError("The step must be positive.")
+
+def _write_atomically(path, data):
+    """Writes bytes to a file, so that it is either complete or absent."""
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "wb") as file:
+        file.write(data)
+    os.replace(temp_path, path)
+
+def _chunks(directory):
+    """Returns the shard, chunk number and path of every chunk in an output directory, in order."""
+    found = []
+    for name in os.listdir(directory):
+        match = CHUNK_PATTERN.match(name)
+        if match:
+            found.append((int(match.group(1)), int(match.group(2)), os.path.join(directory, name)))
+    return sorted(found)
+
+def _read_chunk(path):
+    """Returns the columns of a chunk, or None if it cannot be read."""
+    try:
+        with open(path, "rb") as file:
+            return decode_segment(file.read(), SWEEP_FIELDS)
+    except (IOError, ValueError) as e:
+        logging.warning(f"Ignoring unreadable sweep chunk {path}: {e}")
+        return None
+
+def _strings_path(directory, shard):
+    return os.path.join(directory, f"shard-{shard:03d}.strings.json")
+
+def _load_strings(directory, shard):
+    """Returns the strings of a shard, in the order they are numbered."""
+    try:
+        with open(_strings_path(directory, shard), "r", encoding="utf-8") as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return []
+
+class _ShardWriter:
+    """Collects the points fetched by one worker and writes them out in chunks."""
+
+    def __init__(self, directory, shard, chunk_size):
+        self.directory = directory
+        self.shard = shard
+        self.chunk_size = chunk_size
+        self.strings = _load_strings(directory, shard)
+        self.string_ids = {string: index for index, string in enumerate(self.strings)}
+        self.new_strings = False
+        self.next_chunk = 1 + max((number for other, number, _ in _chunks(directory) if other == shard), default=-1)
+        self.rows = []
+
+    def _string_id(self, string):
+        string_id = self.string_ids.get(string)
+        if string_id is None:
+            string_id = self.string_ids[string] = len(self.strings)
+            self.strings.append(string)
+            self.new_strings = True
+        return string_id
+
+    def add(self, index, latitude, longitude, weather, fetched):
+        """Adds a fetched point, writing a chunk when enough have been collected."""
+        city, temperature, description, icon = weather
+        self.rows.append((
+            index, latitude, longitude, float(temperature),
+            self._string_id(city), self._string_id(description), self._string_id(icon), int(fetched),
+        ))
+        if len(self.rows) >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        """Writes the collected points as a chunk, after the strings they refer to."""
+        if not self.rows:
+            return
+        if self.new_strings:
+            data = json.dumps(self.strings, ensure_ascii=False).encode("utf-8")
+            _write_atomically(_strings_path(self.directory, self.shard), data)
+            self.new_strings = False
+        self.rows.sort()
+        columns = [array(typecode, values) for (_, typecode), values in zip(SWEEP_FIELDS, zip(*self.rows))]
+        path = os.path.join(self.directory, f"shard-{self.shard:03d}-{self.next_chunk:06d}.seg")
+        _write_atomically(path, encode_segment(columns))
+        self.next_chunk += 1
+        self.rows = []
+
+def _completed(directory):
+    """Returns the grid indices of the points already written to an output directory."""
+    done = set()
+    for _, _, path in _chunks(directory):
+        columns = _read_chunk(path)
+        if columns is not None:
+            done.update(columns[0])
+    return done
+
+def sweep_shard(job):
+    """
+    Fetches the points of one shard that are not in the output yet. Runs in a worker process.
+
+    The shard holds every point whose grid index leaves a remainder of job.shard when
+    divided by job.shards. The worker gets an equal share of the rate budget.
+
+    Args:
+        job (ShardJob): The shard to sweep.
+
+    Returns:
+        tuple: The number of points fetched, skipped because they were already in the
+        output, and failed, and the number of API calls made.
+    """
+    WeatherAPI.rate_limiter = TokenBucket(rate=job.rate / 60 / job.shards, capacity=max(1, job.rate // job.shards))
+    WeatherAPI.usage = UsageCounter(path=os.path.join(job.directory, f"shard-{job.shard:03d}.usage.json"))
+    calls_before = WeatherAPI.usage.snapshot()["calls"]
+    # Neighbouring points must not be answered with each other's responses
+    api = WeatherAPI(base_url=job.base_url, nearby_radius=0)
+
+    done = _completed(job.directory)
+    indices = {}
+    skipped = 0
+    for index, latitude, longitude in grid_points(*job.bounds, job.step):
+        if index % job.shards != job.shard:
+            continue
+        if index in done:
+            skipped += 1
+        else:
+            indices[(latitude, longitude)] = index
+    del done
+
+    writer = _ShardWriter(job.directory, job.shard, job.chunk_size)
+    fetched = failed = 0
+    try:
+        for result in api.get_weather_many(indices, max_concurrency=job.concurrency, dedupe=False):
+            if result.error is not None:
+                failed += 1
+                logging.warning(f"Could not fetch {result.location}: {result.error}")
+                continue
+            writer.add(indices[result.location], *result.location, result.data, time.time())
+            fetched += 1
+    finally:
+        writer.flush()
+        WeatherAPI.usage.flush()
+    return fetched, skipped, failed, WeatherAPI.usage.snapshot()["calls"] - calls_before
+
+def sweep(south, west, north, east, step, directory, processes=DEFAULT_PROCESSES,
+          concurrency=DEFAULT_POOL_SIZE, rate=CALLS_PER_MINUTE, chunk_size=DEFAULT_CHUNK_SIZE,
+          base_url=API_BASE_URL):
+    """
+    Fetches the current weather at every point of a grid that is not in the output
+    directory yet, so an interrupted sweep can be resumed by running it again.
+
+    The grid is split into one shard per worker process, and each worker fetches its
+    points concurrently, writing them out in compressed columnar chunks as it goes.
+    Points that fail are left out, to be retried by the next run.
+
+    Args:
+        south (float): The latitude of the southern edge.
+        west (float): The longitude of the western edge.
+        north (float): The latitude of the northern edge.
+        east (float): The longitude of the eastern edge.
+        step (float): The spacing of the points, in degrees.
+        directory (str): The output directory, created if needed.
+        processes (int): The number of worker processes.
+        concurrency (int): The number of points each worker fetches at once.
+        rate (float): The number of API calls per minute allowed across all workers.
+        chunk_size (int): How many points a worker writes out at a time.
+        base_url (str): The base URL of the data endpoints.
+
+    Returns:
+        SweepSummary: The number of points in the grid, fetched, skipped and failed.
+
+    Raises:
+        ValueError: If the grid is invalid, or the directory holds a different sweep.
+    """
+    validate_bounds(south, west, north, east, step)
+    os.makedirs(directory, exist_ok=True)
+    manifest = {"bounds": [south, west, north, east], "step": step}
+    manifest_path = os.path.join(directory, MANIFEST_FILE)
+    try:
+        with open(manifest_path, "r") as file:
+            if json.load(file) != manifest:
+                raise ValueError(f"{directory} holds a sweep of a different grid.")
+    except FileNotFoundError:
+        _write_atomically(manifest_path, json.dumps(manifest).encode("utf-8"))
+
+    jobs = [
+        ShardJob(directory, (south, west, north, east), step, shard, processes, base_url, rate, concurrency, chunk_size)
+        for shard in range(processes)
+    ]
+    # Workers are spawned rather than forked, so none inherits the parent's open connections
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=processes, mp_context=context) as executor:
+        results = list(executor.map(sweep_shard, jobs))
+
+    fetched, skipped, failed, calls = (sum(column) for column in zip(*results))
+    WeatherAPI.usage.record(calls)
+    return SweepSummary(fetched + skipped + failed, fetched, skipped, failed)
+
+def read_sweep(directory):
+    """
+    Reads the points written to a sweep output directory.
+
+    Args:
+        directory (str): The output directory.
+
+    Returns:
+        dict: The "index", "latitude", "longitude", "temperature" and "fetched" arrays,
+        and the "city", "description" and "icon" lists, ordered by grid index.
+    """
+    rows = []
+    strings = {}
+    for shard, _, path in _chunks(directory):
+        columns = _read_chunk(path)
+        if columns is None:
+            continue
+        if shard not in strings:
+            strings[shard] = _load_strings(directory, shard)
+        for row in zip(*columns):
+            rows.append(tuple(
+                strings[shard][value] if name in STRING_FIELDS else value
+                for (name, _), value in zip(SWEEP_FIELDS, row)
+            ))
+    rows.sort()
+    columns = zip(*rows) if rows else ([] for _ in SWEEP_FIELDS)
+    return {
+        name: list(values) if name in STRING_FIELDS else array(typecode, values)
+        for (name, typecode), values in zip(SWEEP_FIELDS, columns)
+    }
+
+def build_parser():
+    """Returns the argument parser of the command."""
+    parser = argparse.ArgumentParser(
+        prog="python -m weather.sweep",
+        description="Fetch the weather at every point of a grid, resuming where an earlier run stopped.",
+    )
+    for edge in ("south", "west", "north", "east"):
+        parser.add_argument(edge, type=float, help=f"the {edge}ern edge of the bounding box, in degrees")
+    parser.add_argument("--step", type=float, required=True,
+                        help="the spacing of the grid, in degrees")
+    parser.add_argument("-o", "--output", required=True,
+                        help="the directory the results and checkpoints are written to")
+    parser.add_argument("-p", "--processes", type=int, default=DEFAULT_PROCESSES,
+                        help=f"worker processes (default: {DEFAULT_PROCESSES})")
+    parser.add_argument("-j", "--concurrency", type=int, default=DEFAULT_POOL_SIZE,
+                        help=f"points fetched at once by each worker (default: {DEFAULT_POOL_SIZE})")
+    parser.add_argument("--rate", type=float, default=CALLS_PER_MINUTE,
+                        help=f"API calls per minute across all workers (default: {CALLS_PER_MINUTE})")
+    return parser
+
+def main(argv=None):
+    """
+    Runs the command.
+
+    Args:
+        argv (list of str): The arguments, sys.argv[1:] by default.
+
+    Returns:
+        int: 0 if every point was fetched, 1 if any failed, 2 on a usage or configuration error.
+    """
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.processes < 1 or args.concurrency < 1:
+        parser.error("--processes and --concurrency must be at least 1")
+    if args.rate <= 0:
+        parser.error("--rate must be positive")
+    try:
+        validate_bounds(args.south, args.west, args.north, args.east, args.step)
+        WeatherAPI.get_api_key()
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 2
+
+    try:
+        summary = sweep(args.south, args.west, args.north, args.east, args.step, args.output,
+                        processes=args.processes, concurrency=args.concurrency, rate=args.rate)
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 2
+    except KeyboardInterrupt:
+        return 130
+    print(f"{summary.points} points: {summary.fetched} fetched, {summary.skipped} already done, "
+          f"{summary.failed} failed", file=sys.stderr)
+    return 1 if summary.failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
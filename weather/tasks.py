@@ -0,0 +1,120 @@
+"""
+Runs blocking work off the Tkinter main thread.
+"""
+import queue
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+DEFAULT_WORKERS = 4
+# How often, in milliseconds, the main thread checks for finished work
+POLL_INTERVAL = 50
+
+class BackgroundRunner:
+    """
+    Runs functions on a thread pool and hands their results back on the Tkinter main thread.
+
+    Work is submitted on a named channel. Submitting again on the same channel supersedes
+    the previous task: it is cancelled if it has not started yet, and its result is
+    discarded if it has, so a stale result can never overwrite a newer one. Results are
+    collected in a queue that the main thread polls with master.after, because Tkinter
+    widgets must only be touched from the main thread.
+
+    Attributes:
+        master (tk.Misc): The widget whose event loop receives the results.
+        executor (ThreadPoolExecutor): The pool the work runs on.
+    """
+
+    def __init__(self, master, max_workers=DEFAULT_WORKERS, poll_interval=POLL_INTERVAL):
+        """
+        Initialises the runner and its worker pool.
+
+        Args:
+            master (tk.Misc): The widget whose event loop receives the results.
+            max_workers (int): The number of worker threads.
+            poll_interval (int): How often, in milliseconds, to check for results.
+        """
+        self.master = master
+        self.poll_interval = poll_interval
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="weather-worker")
+        self._results = queue.Queue()
+        self._generations = {}
+        self._futures = {}
+        self._polling = False
+
+    def submit(self, channel, function, callback, *args):
+        """
+        Runs a function in the background and passes its outcome to a callback on the
+        main thread, superseding any earlier task on the same channel.
+
+        Args:
+            channel (str): The name of the channel, such as "lookup".
+            function (callable): The function to run on a worker thread.
+            callback (callable): Called on the main thread with (result, error), where
+                error is the exception raised by the function or None.
+            *args: The arguments passed to the function.
+
+        Returns:
+            int: The generation of the task, which increases with every submission on the channel.
+        """
+        self.cancel(channel)
+        generation = self._generations[channel]
+        future = self.executor.submit(function, *args)
+        self._futures[channel] = future
+        future.add_done_callback(lambda done: self._results.put((channel, generation, done, callback)))
+        if not self._polling:
+            self._polling = True
+            self.master.after(self.poll_interval, self._poll)
+        return generation
+
+    def cancel(self, channel):
+        """
+        Cancels the task on a channel, so its result is never delivered.
+
+        Args:
+            channel (str): The name of the channel.
+        """
+        self._generations[channel] = self._generations.get(channel, 0) + 1
+        future = self._futures.pop(channel, None)
+        if future is not None:
+            future.cancel()
+
+    def is_pending(self, channel):
+        """
+        Returns whether a task on a channel has not delivered its result yet.
+
+        Args:
+            channel (str): The name of the channel.
+
+        Returns:
+            bool: True if a task is queued or running on the channel.
+        """
+        return channel in self._futures
+
+    def _poll(self):
+        """Delivers finished results on the main thread and schedules the next check."""
+        while True:
+            try:
+                channel, generation, future, callback = self._results.get_nowait()
+            except queue.Empty:
+                break
+            if future.cancelled() or generation != self._generations.get(channel):
+                continue
+            del self._futures[channel]
+            error = future.exception()
+            try:
+                callback(None if error else future.result(), error)
+            except Exception as e:
+                logging.error(f"Unexpected error: {e}")
+
+        if self._futures:
+            self.master.after(self.poll_interval, self._poll)
+        else:
+            self._polling = False
+
+    def shutdown(self):
+        """Cancels every pending task and stops the worker pool without waiting."""
+        for channel in list(self._futures):
+            self.cancel(channel)
+        self.executor.shutdown(wait=False, cancel_futures=True)